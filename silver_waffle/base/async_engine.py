@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import random
+import requests
+import aiohttp
+import ccxt.async_support
+
+
+class AsyncMarketDataEngine:
+    """Multiplexes all the polling of an ExchangeClient (books, balances and global prices) on a single asyncio event
+    loop, running on its own thread. At most max_concurrency requests are in flight at the same time.
+
+    It's used instead of the per pair and per currency threads when the client is created with async_engine=True:
+
+    client = ExchangeClient('binance', async_engine=True, max_concurrency=20)
+
+    Books and balances are fetched with ccxt.async_support, or with aiohttp by the native adapters that implement
+    async_get_book. Everything else (like the global price feeds) runs in the loop's executor."""
+
+    def __init__(self, exchange_client, max_concurrency=10):
+        self.exchange_client = exchange_client
+        self.max_concurrency = max_concurrency
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.ccxt_client = None
+        self._semaphore = None
+        self._thread = None
+        self._tasks = {}
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._start_lock:
+            if self.is_running:
+                return
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        self._started.wait()
+
+    def stop(self):
+        if not self.is_running:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._setup())
+        self._started.set()
+        self.loop.run_forever()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(connector=connector)
+        ccxt_client = getattr(self.exchange_client, 'ccxt_client', None)
+        if ccxt_client is not None:
+            self.ccxt_client = getattr(ccxt.async_support, ccxt_client.id)({'apiKey': ccxt_client.apiKey,
+                                                                            'secret': ccxt_client.secret,
+                                                                            'enableRateLimit': True})
+
+    async def _shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+        await self.session.close()
+        if self.ccxt_client is not None:
+            await self.ccxt_client.close()
+
+    def _watch(self, key, coroutine_function, pair_or_currency):
+        self.start()
+
+        def create_task():
+            if key not in self._tasks:
+                self._tasks[key] = self.loop.create_task(coroutine_function(pair_or_currency))
+        self.loop.call_soon_threadsafe(create_task)
+
+    def watch_book(self, pair):
+        self._watch(('book', pair), self._book_loop, pair)
+
+    def watch_balances(self):
+        self._watch(('balances', self.exchange_client), self._balances_loop, self.exchange_client)
+
+    def watch_global_price(self, currency):
+        self._watch(('global_price', currency), self._global_price_loop, currency)
+
+    def unwatch(self, pair_or_currency):
+        def cancel_tasks():
+            for key in [key for key in self._tasks if key[1] is pair_or_currency]:
+                self._tasks.pop(key).cancel()
+        if self.is_running:
+            self.loop.call_soon_threadsafe(cancel_tasks)
+
+    async def run_blocking(self, function, *args):
+        """Runs a blocking function in the loop's executor"""
+        return await self.loop.run_in_executor(None, function, *args)
+
+    async def get_json(self, url, timeout=5, **kwargs):
+        async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def _book_loop(self, pair):
+        client = self.exchange_client
+        await asyncio.sleep(random.uniform(0, client._update_book_sleep_time))
+        while True:
+            delay = client._get_book_poll_delay(pair)
+            if delay is None:
+                try:
+                    async with self._semaphore:
+                        book = await client.async_get_book(pair, self)
+                    delay = client.scheduler.observe(pair, pair.orderbook.update(book) is not None)
+                except Exception as e:
+                    print(f"{client}: couldn't update the book of {pair}: {e!r}")
+                    delay = client.scheduler.cadence(pair)
+            await asyncio.sleep(delay)
+
+    async def _balances_loop(self, client):
+        await asyncio.sleep(random.uniform(0, client._update_balance_sleep_time))
+        while True:
+            active = any(currency.has_an_active_pair() for currency in list(client.currencies))
+            if client.read_only is False and active:
+                try:
+                    async with self._semaphore:
+                        balances = await client.async_get_balances(self)
+                    client.balance_refresher.apply(balances)
+                except Exception as e:
+                    print(f"{client}: couldn't update the balances: {e!r}")
+            await asyncio.sleep(client._update_balance_sleep_time)
+
+    async def _global_price_loop(self, currency):
+        await asyncio.sleep(random.uniform(20, 80))
+        while True:
+            try:
+                async with self._semaphore:
+                    await self.run_blocking(self.exchange_client._update_global_price, currency)
+            except (requests.exceptions.HTTPError, UnboundLocalError):
+                pass
+            await asyncio.sleep(120)
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import Future
+from time import time
+from silver_waffle.base.exchange import ee
+
+
+class BalanceRefresher:
+    """Fetches the balances of every currency of an exchange with a single request and hands them out to each
+    Currency.
+
+    Concurrent calls to refresh() are collapsed: if a request is already in flight, the callers wait for its result
+    instead of sending a new one."""
+
+    def __init__(self, exchange_client):
+        self.exchange_client = exchange_client
+        self.balances = {}  # lowercase symbol -> (available, locked)
+        self.last_update = 0
+        self.requests = 0
+        self._in_flight = None
+        self._lock = threading.Lock()
+
+    def refresh(self, max_age=0):
+        """Updates the balance of every currency of the exchange and returns the balances by symbol.
+
+        If the last update is younger than max_age seconds, no request is made."""
+        with self._lock:
+            if max_age and time() - self.last_update < max_age:
+                return self.balances
+            future = self._in_flight
+            is_leader = future is None
+            if is_leader:
+                future = self._in_flight = Future()
+        if not is_leader:
+            return future.result()
+
+        try:
+            self.requests += 1
+            balances = self.apply(self.exchange_client.get_balances())
+            future.set_result(balances)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight = None
+        return balances
+
+    def apply(self, balances):
+        """Sets the balance of every currency of the exchange from a {symbol: (available, locked)} dictionary"""
+        if balances is None:
+            return self.balances
+        self.balances = {symbol.lower(): balance for symbol, balance in balances.items()}
+        self.last_update = time()
+        for currency in list(self.exchange_client.currencies):
+            currency._set_balance(self.get_balance(currency))
+        ee.emit('updated_balance')
+        return self.balances
+
+    def get_balance(self, currency):
+        """Returns the last known (available, locked) balance of a currency"""
+        return self.balances.get(currency.symbol.lower(), (0, 0))
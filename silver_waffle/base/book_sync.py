@@ -0,0 +1,100 @@
+import threading
+from silver_waffle.base.side import ASK, BID
+
+
+class BookSynchronizer:
+    """Keeps a pair's orderbook up to date from a stream of sequenced diffs, instead of replacing the whole book on
+    every message.
+
+    fetch_snapshot has to return a dictionary with the same format as ExchangeClient.get_book plus a 'sequence' key.
+    Feeds that send diffs per order (like Bitso's diff-orders) also have to include an 'orders' key containing
+    (order_id, side, price, amount) tuples, so that the synchronizer knows which level each order belongs to.
+
+    Whenever a sequence number is skipped the book is considered stale and it gets rebuilt from a new snapshot."""
+
+    def __init__(self, pair, fetch_snapshot):
+        self.pair = pair
+        self._fetch_snapshot = fetch_snapshot
+        self.sequence = None
+        self.resyncs = 0
+        self.max_resync_attempts = 3
+        self._orders = {}  # order_id -> (side, price, amount)
+        self._levels = {ASK: {}, BID: {}}  # price -> [amount, number of orders]
+        self._lock = threading.Lock()
+
+    @property
+    def is_synced(self):
+        return self.sequence is not None
+
+    def resync(self):
+        """Rebuilds the book from a snapshot. Returns the sequence number of the snapshot"""
+        snapshot = self._fetch_snapshot()
+        self.resyncs += 1
+        self._orders = {}
+        self._levels = {ASK: {}, BID: {}}
+        if 'orders' in snapshot:
+            for order_id, side, price, amount in snapshot['orders']:
+                self._add_order(order_id, side, float(price), float(amount))
+        self.pair.orderbook.update({ASK: snapshot[ASK], BID: snapshot[BID]})
+        self.sequence = int(snapshot['sequence'])
+        return self.sequence
+
+    def on_level_diff(self, sequence, changes):
+        """Handles a message containing absolute (side, price, amount) level changes"""
+        with self._lock:
+            if self._accept(sequence):
+                self.pair.orderbook.apply_changes(changes)
+
+    def on_order_diff(self, sequence, changes):
+        """Handles a message containing (order_id, side, price, amount) order changes. An amount of 0 means that the
+        order was removed from the book"""
+        with self._lock:
+            if self._accept(sequence):
+                level_changes = []
+                for order_id, side, price, amount in changes:
+                    level_changes += self._remove_order(order_id)
+                    if float(amount) > 0:
+                        level_changes += self._add_order(order_id, side, float(price), float(amount))
+                self.pair.orderbook.apply_changes(level_changes)
+
+    def _accept(self, sequence):
+        """Returns True if the diff with the given sequence number has to be applied to the book"""
+        sequence = int(sequence)
+        if self.sequence is not None:
+            if sequence <= self.sequence:
+                return False  # already contained in the book
+            if sequence == self.sequence + 1:
+                self.sequence = sequence
+                return True
+            self.sequence = None  # we missed at least one message
+
+        for _ in range(self.max_resync_attempts):
+            snapshot_sequence = self.resync()
+            if sequence <= snapshot_sequence:
+                return False
+            if sequence == snapshot_sequence + 1:
+                self.sequence = sequence
+                return True
+        # The snapshot keeps lagging behind the feed, we'll try again with the next message
+        self.sequence = None
+        return False
+
+    def _add_order(self, order_id, side, price, amount):
+        self._orders[order_id] = (side, price, amount)
+        level = self._levels[side].setdefault(price, [0, 0])
+        level[0] += amount
+        level[1] += 1
+        return [(side, price, level[0])]
+
+    def _remove_order(self, order_id):
+        try:
+            side, price, amount = self._orders.pop(order_id)
+        except KeyError:
+            return []
+        level = self._levels[side][price]
+        level[0] -= amount
+        level[1] -= 1
+        if level[1] <= 0:
+            del self._levels[side][price]
+            return [(side, price, 0)]
+        return [(side, price, level[0])]
@@ -0,0 +1,91 @@
+import heapq
+import itertools
+import threading
+import time as _time
+
+
+class Clock:
+    """Wall clock. It's the clock used unless set_clock is called"""
+
+    def time(self):
+        return _time.time()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+
+class _Sleeper:
+    def __init__(self):
+        self.woken = False
+
+
+class VirtualClock(Clock):
+    """Clock that only moves when advance() is called, so that code that sleeps (like the strategies) runs as fast as
+    the events it reacts to can be replayed.
+
+    Every call to sleep() blocks until the clock is advanced past its deadline. advance() wakes the sleepers in order
+    of deadline and, before moving on, waits until each thread it woke is sleeping again, so the threads see the
+    same sequence of events that they would see in real time. A thread that doesn't go back to sleep within
+    idle_timeout (wall clock) seconds is not waited for anymore. advance() must not be called from a thread that
+    sleeps on this clock."""
+
+    def __init__(self, start=0, idle_timeout=1):
+        self.idle_timeout = idle_timeout
+        self._now = start
+        self._sleepers = []  # heap of (deadline, sequence, _Sleeper)
+        self._awake = 0  # threads that were woken up and haven't gone back to sleep
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._condition = threading.Condition()
+
+    def time(self):
+        return self._now
+
+    def sleep(self, seconds):
+        sleeper = _Sleeper()
+        with self._condition:
+            heapq.heappush(self._sleepers, (self._now + max(0, seconds), next(self._counter), sleeper))
+            if getattr(self._local, 'awake', False):
+                self._awake = max(0, self._awake - 1)
+                self._condition.notify_all()
+            self._condition.wait_for(lambda: sleeper.woken)
+            self._local.awake = True
+
+    def advance(self, to):
+        """Moves the clock to the timestamp to, waking up every thread whose deadline is reached"""
+        with self._condition:
+            while self._sleepers and self._sleepers[0][0] <= to:
+                deadline, _, sleeper = heapq.heappop(self._sleepers)
+                self._now = max(self._now, deadline)
+                sleeper.woken = True
+                self._awake += 1
+                self._condition.notify_all()
+                if not self._condition.wait_for(lambda: self._awake == 0, self.idle_timeout):
+                    self._awake = 0
+            self._now = max(self._now, to)
+
+    @property
+    def sleepers(self):
+        return len(self._sleepers)
+
+
+_clock = Clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Replaces the clock used by time() and sleep(). Returns the previous one"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def time():
+    return _clock.time()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
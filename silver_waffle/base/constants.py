@@ -1,5 +1,11 @@
 STABLECOIN_SYMBOLS = ['USDC', 'DAI', 'USDT', 'BUSD', 'TUSD', 'PAX', 'VAI']
 
+# Published REST limits of the native adapters as (requests per second, burst). The ccxt exchanges use the
+# rateLimit that ccxt ships for them
+RATE_LIMITS = {'bitso': (1, 60),  # 60 requests per minute
+               'buda': (2, 20),  # 120 requests per minute
+               'cryptomarket': (5, 10)}
+
 FREE_RPC_ENDPOINTS = ['https://api.mycryptoapi.com/eth',
                       'https://nodes.mewapi.io/rpc/eth',
                       'https://mainnet-nethermind.blockscout.com/',
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import queue
+import threading
+from collections import Counter, deque
+from time import monotonic
+from pymitter import EventEmitter
+
+
+class ListenerStats:
+    def __init__(self):
+        self.handled = 0
+        self.dropped = 0  # events discarded because the queue of the listener was full
+        self.coalesced = 0  # events replaced by a newer one before being handled
+        self.errors = 0
+        self.total_latency = 0  # seconds from emit() to the end of the handler
+        self.max_latency = 0
+
+    @property
+    def average_latency(self):
+        return self.total_latency / self.handled if self.handled else 0
+
+    def __repr__(self):
+        return f'ListenerStats(handled={self.handled}, dropped={self.dropped}, coalesced={self.coalesced}, ' \
+               f'errors={self.errors}, average_latency={self.average_latency:.4f}, max_latency={self.max_latency:.4f})'
+
+
+class _ListenerQueue:
+    """Pending events of a listener. Coalesced events keep their place in the queue, but carry the latest arguments"""
+
+    def __init__(self, func):
+        self.func = func
+        self.keys = deque()
+        self.events = {}  # key -> (arguments, keyword arguments, emit time, is a coroutine function)
+        self.scheduled = False
+        self.stats = ListenerStats()
+
+
+class EventBus(EventEmitter):
+    """Drop-in replacement of pymitter's EventEmitter that doesn't run the listeners on the thread that emits.
+
+    Each listener has its own queue, and a pool of workers threads runs them, so a slow listener doesn't hold back
+    the websocket or the polling threads, nor the other listeners. A listener still gets its events one at a time
+    and in order. The events in coalesce (by default 'book_changed') are merged per first argument (the pair): if
+    a listener hasn't handled a book_changed of a pair yet, a new one takes its place, so it only gets the latest
+    version. If the last argument of both events has a merge() method (like BookChange), the pending one is merged
+    with the new one, so nothing that happened in between is lost. Queues hold up to max_queue_size events, the
+    oldest ones are dropped after that. Listeners registered with a ttl are removed after ttl events, like in
+    pymitter.
+
+    stats() reports what was handled, dropped and coalesced, and how long it took, and emitted() how many times
+    each event was emitted. flush() waits until every queue is empty. With synchronous=True, it behaves like the
+    plain EventEmitter."""
+
+    def __init__(self, workers=4, max_queue_size=1000, coalesce=('book_changed',), synchronous=False, **kwargs):
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.coalesce = set(coalesce)
+        self.synchronous = synchronous
+        self._queues = {}
+        self._ready = queue.Queue()
+        self._threads = []
+        self._pending = 0
+        self._counter = itertools.count()
+        self._emitted = Counter()
+        self._condition = threading.Condition()
+
+    def _emit(self, event, *args, **kwargs):
+        with self._condition:
+            self._emitted[event] += 1
+        if self.synchronous:
+            return super()._emit(event, *args, **kwargs)
+        listeners = self._event_tree.find_listeners(event)
+        if event != self.new_listener_event:
+            listeners.extend(self._any_listeners)
+        now = monotonic()
+        for listener in sorted(listeners, key=lambda listener: listener.time):
+            with self._condition:
+                # pymitter decrements the ttl when it calls the listener, here it's done when the event is queued
+                if listener.ttl == 0:
+                    continue
+                if listener.ttl > 0:
+                    listener.ttl -= 1
+                expired = listener.ttl == 0
+            if expired:
+                self.off(listener.event, func=listener.func)
+            key = self._coalescing_key(event, args)
+            self._enqueue(listener.func, key, (args, kwargs, now, listener.is_coroutine or listener.is_async_callable))
+        return []
+
+    def _coalescing_key(self, event, args):
+        if event not in self.coalesce or not args:
+            return next(self._counter)
+        try:
+            hash(args[0])
+            return event, args[0]
+        except TypeError:
+            return event, id(args[0])
+
+    @staticmethod
+    def _merge(pending_args, args):
+        if pending_args and args and hasattr(pending_args[-1], 'merge') and hasattr(args[-1], 'merge'):
+            return args[:-1] + (pending_args[-1].merge(args[-1]),)
+        return args
+
+    def _enqueue(self, func, key, item):
+        with self._condition:
+            listener_queue = self._queues.get(func)
+            if listener_queue is None:
+                listener_queue = self._queues[func] = _ListenerQueue(func)
+            if key in listener_queue.events:
+                # Keep the time of the first emit, so the latency reflects how long the listener lagged behind
+                pending = listener_queue.events[key]
+                listener_queue.events[key] = (self._merge(pending[0], item[0]), item[1]) + pending[2:]
+                listener_queue.stats.coalesced += 1
+                return
+            if len(listener_queue.keys) >= self.max_queue_size:
+                del listener_queue.events[listener_queue.keys.popleft()]
+                listener_queue.stats.dropped += 1
+                self._pending -= 1
+            listener_queue.keys.append(key)
+            listener_queue.events[key] = item
+            self._pending += 1
+            if not listener_queue.scheduled:
+                listener_queue.scheduled = True
+                self._ready.put(listener_queue)
+            self._start_workers()
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self.__event_worker_daemon__, name=f'event_worker_{len(self._threads)}')
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    def __event_worker_daemon__(self):
+        while True:
+            listener_queue = self._ready.get()
+            with self._condition:
+                key = listener_queue.keys.popleft()
+                args, kwargs, emitted_at, is_coroutine = listener_queue.events.pop(key)
+            try:
+                result = listener_queue.func(*args, **kwargs)
+                if is_coroutine:
+                    asyncio.run(result)
+            except Exception as e:
+                listener_queue.stats.errors += 1
+                print(f'Listener {getattr(listener_queue.func, "__name__", listener_queue.func)} failed: {e!r}')
+            latency = monotonic() - emitted_at
+            with self._condition:
+                listener_queue.stats.handled += 1
+                listener_queue.stats.total_latency += latency
+                listener_queue.stats.max_latency = max(listener_queue.stats.max_latency, latency)
+                if listener_queue.keys:
+                    self._ready.put(listener_queue)
+                else:
+                    listener_queue.scheduled = False
+                self._pending -= 1
+                self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until every emitted event has been handled. Returns False if the timeout expired first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def stats(self):
+        """Returns {listener: ListenerStats}"""
+        with self._condition:
+            return {listener_queue.func: listener_queue.stats for listener_queue in self._queues.values()}
+
+    def emitted(self):
+        """Returns {event: times it was emitted}"""
+        with self._condition:
+            return dict(self._emitted)
+
+    @property
+    def pending(self):
+        """Events that were emitted but not handled yet"""
+        return self._pending
+
+    def queue_sizes(self):
+        """Returns a (listener, ListenerStats, events queued) tuple per listener"""
+        with self._condition:
+            return [(listener_queue.func, listener_queue.stats, len(listener_queue.keys))
+                    for listener_queue in self._queues.values()]
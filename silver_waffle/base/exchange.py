@@ -1,13 +1,19 @@
 from __future__ import annotations
-from pymitter import EventEmitter
-import threading
+from collections import namedtuple
+import numpy as np
 import money
 import cryptocompare
 import silver_waffle.ui as ui
 from silver_waffle.base.side import ASK, BID
 from silver_waffle.base.constants import STABLECOIN_SYMBOLS
-from silver_waffle.utilities import truncate, get_truth, _is_symbol_a_cryptocurrency
+from silver_waffle.utilities import truncate, _is_symbol_a_cryptocurrency
 from silver_waffle.base.exchange_rate_feeds import get_chainlink_price, get_ars_criptoya
+from silver_waffle.base.price_cache import price_cache
+from silver_waffle.base.events import EventBus
+from silver_waffle.base.recorder import active_recorders, ORDER_CREATED, ORDER_CANCELLED
+from silver_waffle.base.clock import time as clock_time
+from silver_waffle.base.locks import InstrumentedLock, acquire_all
+from silver_waffle.base.metrics import book_updates, book_changes, pair_labels
 import google_currency
 import json
 import re
@@ -15,20 +21,28 @@ import ccxt
 # We change money's currency regex in order for it to support a wider range of tickers
 money.money.REGEX_CURRENCY_CODE = re.compile("^[A-Z]{2,10}$")
 
-thread_lock = threading.Lock()
-ee = EventEmitter()
+ee = EventBus()
 google_currency.logger.disabled = True
 binance_oracle = ccxt.binance()
 
 
 class Order:
+    __slots__ = ('side', 'order_id', 'price', 'amount', 'pair', '_total')
+
     def __init__(self, price, side, amount, order_id=None, pair=None):
         self.side = side
         self.order_id = order_id
         self.price = float(price)
         self.amount = float(amount)
-        self.total = float(truncate(float(price) * float(amount), 4))
         self.pair = pair
+        self._total = None
+
+    @property
+    def total(self):
+        """price * amount truncated to 4 decimals. It's computed the first time it's accessed"""
+        if self._total is None:
+            self._total = float(truncate(self.price * self.amount, 4))
+        return self._total
 
     def __nonzero__(self):
         return self.amount
@@ -43,71 +57,323 @@ class Order:
         return other.price < self.price
 
 
-class OrderbookSide:
-    def __init__(self, side, pair):
+class OrderResult(namedtuple('OrderResult', ['request', 'order', 'error'])):
+    """Outcome of one order of a batch operation. request is what was asked for (the Order to cancel, or the
+    (pair, amount, side, limit_price) tuple to place), order is the resulting Order (None for market orders) and error
+    is the exception raised, or None if it succeeded"""
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _levels_to_arrays(levels):
+    """Parses a list of {'price': ..., 'amount': ...} levels into two contiguous float64 arrays"""
+    count = len(levels)
+    prices = np.fromiter((float(level['price']) for level in levels), dtype=np.float64, count=count)
+    amounts = np.fromiter((float(level['amount']) for level in levels), dtype=np.float64, count=count)
+    return prices, amounts
+
+
+def _fingerprint(prices, amounts, depth=None):
+    """Cheap digest of the first depth levels of a side, used to detect changes without comparing level by level"""
+    return hash((prices[:depth].tobytes(), amounts[:depth].tobytes()))
+
+
+class BookChange:
+    """Describes what changed in an orderbook. It's sent along with every 'book_changed' event:
+
+    @ee.on('book_changed')
+    def handler(pair, change):
+        if change.best_bid_moved or change.best_ask_moved:
+            ...
+
+    changed_levels is a list of (side, price, new_amount) tuples, where a new_amount of 0 means that the level was
+    removed. It's only computed if a listener asks for it."""
+
+    def __init__(self, pair, version, previous, current, depth=None, changed_levels=None):
+        self.pair = pair
+        self.version = version
+        self.depth = depth
+        self._previous = previous
+        self._current = current
+        self._changed_levels = changed_levels
+
+    @staticmethod
+    def _top(levels):
+        prices, amounts = levels
+        return (float(prices[0]), float(amounts[0])) if prices is not None and len(prices) else None
+
+    def _best_price(self, levels):
+        top = self._top(levels)
+        return top[0] if top else None
+
+    @property
+    def best_ask_moved(self):
+        return self._best_price(self._previous[ASK]) != self._best_price(self._current[ASK])
+
+    @property
+    def best_bid_moved(self):
+        return self._best_price(self._previous[BID]) != self._best_price(self._current[BID])
+
+    @property
+    def top_of_book_changed(self):
+        """True if the price or the amount of the best ask or best bid changed"""
+        return any(self._top(self._previous[side]) != self._top(self._current[side]) for side in [ASK, BID])
+
+    @property
+    def changed_levels(self):
+        if self._changed_levels is None:
+            changed_levels = []
+            for side in [ASK, BID]:
+                (old_prices, old_amounts), (new_prices, new_amounts) = self._previous[side], self._current[side]
+                old = {} if old_prices is None else dict(zip(old_prices[:self.depth].tolist(),
+                                                             old_amounts[:self.depth].tolist()))
+                new = dict(zip(new_prices[:self.depth].tolist(), new_amounts[:self.depth].tolist()))
+                for price, amount in new.items():
+                    if old.get(price) != amount:
+                        changed_levels.append((side, price, amount))
+                for price in old.keys() - new.keys():
+                    changed_levels.append((side, price, 0))
+            self._changed_levels = changed_levels
+        return self._changed_levels
+
+    def merge(self, newer):
+        """Returns a BookChange that goes from the book before this change to the book after newer"""
+        return BookChange(self.pair, newer.version, self._previous, newer._current, depth=newer.depth)
+
+    def __repr__(self):
+        return f'BookChange(pair={self.pair.ticker}, version={self.version}, ' \
+               f'best_ask_moved={self.best_ask_moved}, best_bid_moved={self.best_bid_moved})'
+
+
+class SideSnapshot:
+    """Immutable state of one side of an orderbook, stored as two parallel read-only float64 arrays (price and
+    amount).
+
+    Asks are sorted by ascending price and bids by descending price, as returned by the exchanges. Order objects are
+    only created when they are accessed through indexing or iteration. version is increased every time the side
+    changes and timestamp is the time (on the silver_waffle.base.clock clock) when the snapshot was taken."""
+    __slots__ = ('side', 'pair', 'prices', 'amounts', 'version', 'timestamp', '_cumulative_amounts', '_fingerprints')
+
+    def __init__(self, side, pair, prices, amounts, version=0, timestamp=None, fingerprints=None):
         self.side = side
         self.pair = pair
-        self._idx = 0
-        self._orders = None
+        self.prices = prices
+        self.amounts = amounts
+        self.version = version
+        self.timestamp = timestamp
+        self._cumulative_amounts = None
+        self._fingerprints = fingerprints if fingerprints is not None else {}
+
+    @property
+    def _orders(self):
+        if self.prices is None:
+            return None
+        return [{'price': price, 'amount': amount} for price, amount in zip(self.prices.tolist(),
+                                                                            self.amounts.tolist())]
+
+    @property
+    def cumulative_amounts(self):
+        """Running total of the amounts, computed once per snapshot"""
+        if self._cumulative_amounts is None and self.amounts is not None:
+            self._cumulative_amounts = np.cumsum(self.amounts)
+        return self._cumulative_amounts
+
+    @property
+    def levels(self):
+        return self.prices, self.amounts
+
+    def _make_order(self, i):
+        return Order(float(self.prices[i]), self.side, float(self.amounts[i]), pair=self.pair)
 
     def __getitem__(self, i):
         # we lazily create the Order objects to save CPU cycles
         if isinstance(i, slice):
-            return [Order(order['price'], self.side, order['amount'], pair=self.pair) for order in self._orders[i]]
+            return [Order(price, self.side, amount, pair=self.pair)
+                    for price, amount in zip(self.prices[i].tolist(), self.amounts[i].tolist())]
         else:
-            order = self._orders[i]
-            return Order(order['price'], self.side, order['amount'], pair=self.pair)
+            return self._make_order(i)
 
     def __len__(self):
-        return len(self._orders)
+        return len(self.prices)
 
     def __iter__(self):
-        self._idx = 0
-        return self
+        for price, amount in zip(self.prices.tolist(), self.amounts.tolist()):
+            yield Order(price, self.side, amount, pair=self.pair)
 
-    def __next__(self):
-        try:
-            order = self._orders[self._idx]
-            self._idx += 1
-            return Order(order['price'], self.side, order['amount'])
-        except IndexError:
-            self._idx = 0
-            raise StopIteration  # Done iterating.
+    def __bool__(self):
+        return self.prices is not None and len(self.prices) > 0
+
+    def fingerprint(self, depth=None):
+        """Digest of the first depth levels (or of the whole side if depth is None), computed once per snapshot"""
+        if depth not in self._fingerprints:
+            self._fingerprints[depth] = _fingerprint(self.prices, self.amounts, depth)
+        return self._fingerprints[depth]
+
+    def _level_index(self, price):
+        """Returns the position where price is (or would be inserted) and whether that level already exists"""
+        count = len(self.prices)
+        if self.side == ASK:
+            idx = int(np.searchsorted(self.prices, price, side='left'))
+        else:
+            idx = count - int(np.searchsorted(self.prices[::-1], price, side='right'))
+        return idx, idx < count and self.prices[idx] == price
+
+    def _index_of_order_above(self, amount_threshold):
+        if not self:
+            return None
+        mask = self.amounts >= amount_threshold / self.pair.base.global_price
+        if self.pair.orders[self.side]:
+            mask &= self.prices != self.pair.orders[self.side][0].price
+        idx = int(np.argmax(mask))
+        return idx if mask[idx] else None
+
+    def _count_up_until(self, price_threshold):
+        if not self:
+            return 0
+        if self.side == ASK:
+            return int(np.searchsorted(self.prices, price_threshold, side='left'))
+        return int(np.searchsorted(-self.prices, -price_threshold, side='left'))
+
+    def get_order_above(self, amount_threshold):
+        """ Returns the first order found with an amount higher than amount_threshold, excluding your own orders"""
+        idx = self._index_of_order_above(amount_threshold)
+        if idx is not None:
+            return self._make_order(idx)
+
+    def get_orders_up_until(self, price_threshold):
+        """ Returns all the orders found with a price higher or lower (depends on the side) than price_threshold"""
+        return self[:self._count_up_until(price_threshold)]
+
+    def get_amount_up_until(self, price_threshold):
+        """ Returns the sum of the amounts of the orders that get_orders_up_until would return"""
+        count = self._count_up_until(price_threshold)
+        return float(self.cumulative_amounts[count - 1]) if count else 0
+
+    def get_depth_for_amount(self, amount):
+        """ Returns how many levels have to be consumed to fill the given amount"""
+        if not self:
+            return 0
+        return min(int(np.searchsorted(self.cumulative_amounts, amount, side='left')) + 1, len(self))
+
+
+class OrderbookSide:
+    """One side of an orderbook. Its state is a SideSnapshot that is replaced (never modified) every time the side
+    changes, so readers don't need a lock: every method reads the snapshot that is current when it's called, and
+    iterating goes over the snapshot that was current when the iteration started, no matter how many times the book
+    is updated meanwhile. Code that needs several consistent reads should take the snapshot once:
+
+    asks = pair.orderbook[ASK].snapshot
+    best, depth = asks[0], asks.get_depth_for_amount(10)"""
+    def __init__(self, side, pair):
+        self.side = side
+        self.pair = pair
+        self.version = 0
+        self._snapshot = SideSnapshot(side, pair, None, None)
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _publish(self, prices, amounts, fingerprints=None):
+        prices.setflags(write=False)
+        amounts.setflags(write=False)
+        self.version += 1
+        self._snapshot = SideSnapshot(self.side, self.pair, prices, amounts, self.version, clock_time(), fingerprints)
+
+    @property
+    def _orders(self):
+        return self._snapshot._orders
+
+    @property
+    def prices(self):
+        return self._snapshot.prices
+
+    @property
+    def amounts(self):
+        return self._snapshot.amounts
+
+    @property
+    def cumulative_amounts(self):
+        return self._snapshot.cumulative_amounts
+
+    @property
+    def levels(self):
+        return self._snapshot.levels
+
+    def __getitem__(self, i):
+        return self._snapshot[i]
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __iter__(self):
+        return iter(self._snapshot)
 
     def __repr__(self):
-        ui.print_side(self)
+        ui.print_side(self._snapshot)
         return ''
 
     def __bool__(self):
-        return True if self._orders else False
-
-    def check_if_book_changed(self, new_book):
-        if self._orders:
-            if not any(x != y for x, y in zip(self._orders, new_book)):  # if book data is equal
-                return False
+        return bool(self._snapshot)
+
+    def fingerprint(self, depth=None):
+        return self._snapshot.fingerprint(depth)
+
+    def check_if_book_changed(self, new_book, depth=None):
+        """Returns True if the first depth levels of new_book are different from the current ones"""
+        snapshot = self._snapshot
+        if snapshot.prices is not None:
+            prices, amounts = new_book if isinstance(new_book, tuple) else _levels_to_arrays(new_book)
+            if len(prices) == len(snapshot.prices) or depth is not None:
+                if _fingerprint(prices, amounts, depth) == snapshot.fingerprint(depth):
+                    return False
         return True
 
-    def set_orders(self, book):
-        self._orders = book
+    def set_orders(self, book, fingerprints=None):
+        prices, amounts = book if isinstance(book, tuple) else _levels_to_arrays(book)
+        self._publish(prices, amounts, fingerprints)
+
+    def set_level(self, price, amount):
+        """Sets the amount resting at price, inserting the level if it's new and removing it if amount is 0.
+        Returns True if the side changed"""
+        snapshot = self._snapshot
+        if snapshot.prices is None:
+            snapshot = SideSnapshot(self.side, self.pair, np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+        price = float(price)
+        amount = float(amount)
+        idx, exists = snapshot._level_index(price)
+        prices, amounts = snapshot.prices, snapshot.amounts
+        if exists:
+            if amount > 0:
+                if amounts[idx] == amount:
+                    return False
+                amounts = amounts.copy()
+                amounts[idx] = amount
+            else:
+                prices = np.delete(prices, idx)
+                amounts = np.delete(amounts, idx)
+        elif amount > 0:
+            prices = np.insert(prices, idx, price)
+            amounts = np.insert(amounts, idx, amount)
+        else:
+            return False
+        self._publish(prices, amounts)
+        return True
 
     def get_order_above(self, amount_threshold):
-        """ Returns the first order found with an amount higher than amount_threshold, excluding your own orders"""
-        for order in self:
-            if order.amount < amount_threshold / self.pair.base.global_price:
-                continue
-            if self.pair.orders[self.side] and order.price == self.pair.orders[self.side][0].price:
-                continue
-            return order
+        return self._snapshot.get_order_above(amount_threshold)
 
     def get_orders_up_until(self, price_threshold):
-        """ Returns all the orders found with a price higher or lower (depends on the side) than price_threshold"""
-        results = []
-        for order in self:
-            if get_truth(order.price, '<' if self.side == ASK else '>', price_threshold):
-                results.append(order)
-            else:
-                break
-        return results
+        return self._snapshot.get_orders_up_until(price_threshold)
+
+    def get_amount_up_until(self, price_threshold):
+        return self._snapshot.get_amount_up_until(price_threshold)
+
+    def get_depth_for_amount(self, amount):
+        return self._snapshot.get_depth_for_amount(amount)
 
 
 class Orderbook:
@@ -115,6 +381,11 @@ class Orderbook:
         self.orders = {ASK: OrderbookSide(ASK, pair), BID: OrderbookSide(BID, pair), 'updated_id': None}
         self.pair = pair
         self._check_book = True
+        self.version = 0
+        self._snapshot = self._take_snapshot()
+        # Only the first change_detection_depth levels are taken into account to decide if the book changed
+        self.change_detection_depth = None
+        self._updates_metric = self._changes_metric = None  # children of book_updates and book_changes
 
     def get_orders_above(self, amount_threshold):
         results = {ASK: self.orders[ASK].get_order_above(amount_threshold),
@@ -127,16 +398,8 @@ class Orderbook:
 
         midpoint = first_bid.price + (first_ask.price - first_bid.price)/2
 
-        orders = {ASK: self.orders[ASK].get_orders_up_until(midpoint * (1 + percentage_from_midpoint)),
-                  BID: self.orders[BID].get_orders_up_until(midpoint * (1 - percentage_from_midpoint))}
-
-        results = {ASK: None, BID: None}
-        for side in [ASK, BID]:
-            total_amount = 0
-            for order in orders[side]:
-                total_amount += order.amount
-            results[side] = total_amount
-        return results
+        return {ASK: self.orders[ASK].get_amount_up_until(midpoint * (1 + percentage_from_midpoint)),
+                BID: self.orders[BID].get_amount_up_until(midpoint * (1 - percentage_from_midpoint))}
 
     def get_spread(self, amount_threshold=0):
         first_ask = self.orders[ASK].get_order_above(amount_threshold)
@@ -164,34 +427,104 @@ class Orderbook:
     def __bool__(self):
         return bool(self.orders[ASK]) and bool(self.orders[BID])
 
+    def _levels(self):
+        return {ASK: self.orders[ASK].levels, BID: self.orders[BID].levels}
+
+    def _take_snapshot(self):
+        return {ASK: self.orders[ASK].snapshot, BID: self.orders[BID].snapshot, 'version': self.version}
+
+    @property
+    def snapshot(self):
+        """{ASK: SideSnapshot, BID: SideSnapshot, 'version': version} as of the last update. Unlike reading
+        orderbook[ASK] and orderbook[BID] one after the other, both sides are always from the same update"""
+        return self._snapshot
+
+    def _record(self):
+        for recorder in active_recorders:
+            recorder.record_book(self.pair, self.version, self.orders[ASK].levels, self.orders[BID].levels)
+
+    def _count_update(self, changed):
+        if self._updates_metric is None:
+            labels = pair_labels(self.pair)
+            self._updates_metric, self._changes_metric = book_updates.labels(*labels), book_changes.labels(*labels)
+        self._updates_metric.inc()
+        if changed:
+            self._changes_metric.inc()
+
     def update(self, book):
+        """Replaces the book. If it changed, the version is increased and a 'book_changed' event is emitted along
+        with a BookChange. Returns the BookChange, or None if nothing changed"""
         if not (ASK in book and BID in book):
             raise ValueError('Mising data in book')
+        asks = _levels_to_arrays(book[ASK])
+        bids = _levels_to_arrays(book[BID])
         if self._check_book is True:
-            ask_changed = self.orders[ASK].check_if_book_changed(book[ASK])
-            bid_changed = self.orders[BID].check_if_book_changed(book[BID])
-
+            depth = self.change_detection_depth
+            ask_changed = self.orders[ASK].check_if_book_changed(asks, depth=depth)
+            bid_changed = self.orders[BID].check_if_book_changed(bids, depth=depth)
+            self._count_update(ask_changed or bid_changed)
+
+            previous = self._levels()
+            for side, levels, changed in [(ASK, asks, ask_changed), (BID, bids, bid_changed)]:
+                if changed:
+                    self.orders[side].set_orders(levels)
+                elif depth is not None:
+                    # Only the first depth levels are the same, so the rest still has to be replaced. Their
+                    # fingerprint doesn't change, so it's kept for the next poll
+                    self.orders[side].set_orders(levels, fingerprints={depth: self.orders[side].fingerprint(depth)})
             if ask_changed or bid_changed:
-                self.orders[ASK].set_orders(book[ASK])
-                self.orders[BID].set_orders(book[BID])
-                ee.emit('book_changed', self.pair)
+                self.version += 1
+                self._snapshot = self._take_snapshot()
+                self._record()
+                change = BookChange(self.pair, self.version, previous, self._levels(), depth=depth)
+                ee.emit('book_changed', self.pair, change)
+                return change
+            elif depth is not None:
+                self._snapshot = self._take_snapshot()
         elif self._check_book is False:
-            self.orders[ASK].set_orders(book[ASK])
-            self.orders[BID].set_orders(book[BID])
+            self._count_update(True)
+            self.orders[ASK].set_orders(asks)
+            self.orders[BID].set_orders(bids)
+            self._snapshot = self._take_snapshot()
+            self._record()
+
+    def apply_changes(self, changes):
+        """Applies a list of (side, price, amount) level changes in place. An amount of 0 removes the level.
+
+        Emits a 'book_changed' event if any level was modified. Returns the BookChange, or None if nothing changed"""
+        previous = self._levels()
+        changed_levels = [(side, float(price), float(amount)) for side, price, amount in changes
+                          if self.orders[side].set_level(price, amount)]
+        self._count_update(changed_levels)
+        if changed_levels:
+            self.version += 1
+            self._snapshot = self._take_snapshot()
+            self._record()
+            change = BookChange(self.pair, self.version, previous, self._levels(), changed_levels=changed_levels)
+            ee.emit('book_changed', self.pair, change)
+            return change
 
 
 class Currency:
+    __slots__ = ('name', 'exchange_client', 'symbol', '_balance', 'global_price', 'empty_value', 'quote_pairs',
+                 'base_pairs', '_exchange_rate_last_update', '_hash', 'lock')
+
     def __init__(self, *, name, symbol, exchange_client):
         if not name:
             raise ValueError('invalid name')
         self.name = name
+        # Currencies are dictionary keys in most loops, so the hash is only computed once
+        self._hash = hash(name)
         self.exchange_client = exchange_client
         self.symbol = symbol
+        # Held while trading with the balance of the currency, see Pair.trading_lock
+        self.lock = InstrumentedLock(f"currency:{getattr(exchange_client, 'name', None)}:{symbol}")
         self._balance = {'available_balance':None, 'locked_balance': None, 'total_balance': None}
         # self.update_balance()
         self.global_price = 0
-        self.update_balance()
-        self.update_global_price()
+        if not exchange_client.deferred_initialization:
+            self.update_balance(max_age=exchange_client._update_balance_sleep_time)
+            self.update_global_price()
         self.empty_value = money.Money(20, currency='USD')
         self.quote_pairs = []  # pairs where this currency is quote
         self.base_pairs = []  # pairs where this currency is base
@@ -212,13 +545,18 @@ class Currency:
         available_balance = money.Money(available_balance, currency=currency)
         self._balance = {'available_balance': available_balance, 'locked_balance': locked_balance,
                          'total_balance': locked_balance + available_balance}
+        for recorder in active_recorders:
+            recorder.record_balance(self, new_balance[0], new_balance[1])
 
-    def update_balance(self, currency=None):
+    def update_balance(self, currency=None, max_age=0):
+        """Updates the balance of this currency. Since the balances of the whole account are fetched at once, every
+        other currency of the exchange gets updated as well. No request is made if the balances are younger than
+        max_age seconds"""
         if self.exchange_client.read_only is True:
             return
-        new_balance = self.exchange_client.get_balance(self)
-        self._set_balance(new_balance, currency=currency)
-        ee.emit("updated_balance")
+        balance_refresher = self.exchange_client.balance_refresher
+        balance_refresher.refresh(max_age=max_age)
+        self._set_balance(balance_refresher.get_balance(self), currency=currency)
 
     def subscribe(self):
         pass
@@ -239,8 +577,10 @@ class Currency:
         return False
 
     def update_global_price(self):
+        """Sets the global price from the process wide price cache, which is shared with the currencies of the other
+        exchanges. It's only looked up if it isn't cached yet"""
         try:
-            self.global_price = self.get_global_price()
+            self.global_price = price_cache.get(self.symbol, self.get_global_price)
         except Exception:
             self.global_price = 0
 
@@ -279,21 +619,27 @@ class Currency:
         return self.name
 
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
-        return self.name == other.name
+        return self is other or self.name == other.name
 
     def __ne__(self, other):
         return not (self == other)
 
 
 class Pair:
+    __slots__ = ('exchange_client', 'base', 'quote', 'orderbook', 'minimum_step', 'orders', 'status', 'ticker',
+                 '_hash', 'lock')
+
     def __init__(self, *, exchange_client: ExchangeClient, ticker: int, quote: Currency, base: Currency,
                  minimum_step: float):
         self.exchange_client = exchange_client
         self.base = base
         self.quote = quote
+        # Pairs are dictionary keys in the polling loops (socket_functionality, threads, the scheduler), so the hash
+        # is only computed once
+        self._hash = hash(f"{quote.name}{base.name}")
         self.orderbook = Orderbook(self)
         base.base_pairs.append(self)
         quote.quote_pairs.append(self)
@@ -301,6 +647,7 @@ class Pair:
         self.orders = {ASK: [], BID: []}
         self.status = {ASK: False, BID: False}
         self.ticker = ticker
+        self.lock = InstrumentedLock(f"pair:{getattr(exchange_client, 'name', None)}:{ticker}")
 
         # self.update_active_orders()
         # self.cancel_orders(ASK)
@@ -335,10 +682,19 @@ class Pair:
     def toggle_side_status(self, side: Side):
         self.set_side_status(side, False if self.status[side] is True else True)
 
-    def update_active_orders(self):
-        """Updates the current active orders in the self.orders attribute"""
+    def trading_lock(self):
+        """Context manager that holds the locks of the pair and of both of its currencies, so trading actions on
+        pairs that don't share a currency run concurrently"""
+        return acquire_all(self.lock, self.base.lock, self.quote.lock)
+
+    def update_active_orders(self, force=False):
+        """Updates the current active orders in the self.orders attribute. If the orders of the pair are being
+        streamed (see OrderTracker), they are already up to date, so they are only polled if force is True"""
         if self.exchange_client.read_only is True:
             return
+        tracker = getattr(self.exchange_client, 'order_tracker', None)
+        if not force and tracker is not None and tracker.is_streaming(self):
+            return
         result = self.exchange_client.get_active_orders(self)
         self.orders[ASK] = sorted(result[ASK])
         self.orders[BID] = sorted(result[BID])
@@ -349,7 +705,8 @@ class Pair:
         assert amount and side and limit_price
         order = self.exchange_client.create_order(self, amount, side, limit_price=limit_price)
         if order:
-            self.orders[order.side].append(order)
+            order = self._add_order(order)
+            self._record_order(ORDER_CREATED, order.side, order.price, order.amount, order.order_id)
             return order
 
     def create_market_order(self, amount=None, side=None):
@@ -357,23 +714,71 @@ class Pair:
             return
         assert amount and side
         self.exchange_client.create_order(self, amount, side)
+        self._record_order(ORDER_CREATED, side, None, amount)
+
+    def _add_order(self, order):
+        """Adds an order that was just created to self.orders, unless the order stream already added it. Returns the
+        order that is in self.orders"""
+        tracker = getattr(self.exchange_client, 'order_tracker', None)
+        if tracker is not None:
+            return tracker.add(self, order)
+        self.orders[order.side].append(order)
+        return order
 
     def cancel_order(self, order):
         if self.exchange_client.read_only is True:
             return
         self.exchange_client.cancel_order(order)
+        self._record_order(ORDER_CANCELLED, order.side, order.price, order.amount, order.order_id)
         try:
             self.orders[order.side].remove(order)
         except ValueError:
             pass
 
-    def cancel_orders(self, side):
-        """Cancels all the orders of the given side"""
+    def _record_order(self, kind, side, price, amount, order_id=None):
+        for recorder in active_recorders:
+            recorder.record_order(kind, self, side, price, amount, order_id)
+
+    def cancel_orders(self, side=None):
+        """Cancels all the orders of the given side (of both sides if side is None) with as few requests as the
+        exchange allows, see ExchangeClient.cancel_orders. Returns an OrderResult per order, the ones that failed are
+        kept in self.orders"""
         if self.exchange_client.read_only is True:
-            return
-        while self.orders[side]:
-            for order in self.orders[side]:
-                self.cancel_order(order)
+            return []
+        sides = [side] if side is not None else [ASK, BID]
+        orders = [order for each_side in sides for order in self.orders[each_side]]
+        if not orders:
+            return []
+        if side is None:
+            results = self.exchange_client.cancel_all_orders(self, orders)
+        else:
+            results = self.exchange_client.cancel_orders(orders)
+        self._forget_cancelled(results)
+        return results
+
+    def _forget_cancelled(self, results):
+        for result in results:
+            if result.ok:
+                order = result.order
+                self._record_order(ORDER_CANCELLED, order.side, order.price, order.amount, order.order_id)
+                try:
+                    self.orders[order.side].remove(order)
+                except ValueError:
+                    pass
+
+    def create_limit_orders(self, orders):
+        """Places several limit orders, given as (amount, side, limit_price) tuples, at once. Returns an OrderResult
+        per order"""
+        if self.exchange_client.read_only is True:
+            return []
+        results = self.exchange_client.create_orders([(self, amount, side, limit_price)
+                                                      for amount, side, limit_price in orders])
+        for result in results:
+            if result.ok and result.order:
+                self._add_order(result.order)
+                self._record_order(ORDER_CREATED, result.order.side, result.order.price, result.order.amount,
+                                   result.order.order_id)
+        return results
 
     def _change_side(self, new_status):
         self.set_side_status(ASK, new_status, _launch_event=False)
@@ -390,10 +795,10 @@ class Pair:
         self.orderbook.update(self.exchange_client.get_book(self))
 
     def __hash__(self):
-        return hash(f"{self.quote.name}{self.base.name}")
+        return self._hash
 
     def __eq__(self, other):
-        return (self.quote.name, self.base.name) == (other.quote.name, self.base.name)
+        return self is other or (self.quote.name, self.base.name) == (other.quote.name, other.base.name)
 
     def __ne__(self, other):
         return not (self == other)
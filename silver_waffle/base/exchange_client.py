@@ -1,9 +1,24 @@
 # from abc import ABC, abstractmethod
-from time import sleep, time
+from time import sleep, time, monotonic
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import sys
 from silver_waffle.base.side import ASK, BID
-from silver_waffle.base.exchange import Order, Currency, Pair
+from silver_waffle.base.exchange import Order, OrderResult, Currency, Pair
+from silver_waffle.base.book_sync import BookSynchronizer
+from silver_waffle.base.order_stream import OrderTracker, CcxtOrderStream
+from silver_waffle.base.metrics import metrics, request_latency
+from silver_waffle.base.async_engine import AsyncMarketDataEngine
+from silver_waffle.base.balance_refresher import BalanceRefresher
+from silver_waffle.base.price_cache import price_cache
+from silver_waffle.base.market_cache import market_cache
+from silver_waffle.base.registry import Registry, global_registry
+from silver_waffle.base.scheduler import PollScheduler
+from silver_waffle.base.exchange_rate_feeds import chainlink
+from silver_waffle.base.constants import STABLECOIN_SYMBOLS, RATE_LIMITS
+from silver_waffle.base.rate_limiter import RateLimiter, rate_limited, PRIORITY_ORDERS, PRIORITY_ACCOUNT, \
+    PRIORITY_MARKET_DATA
+from silver_waffle.utilities import _is_symbol_a_cryptocurrency
 from silver_waffle.credentials import Credential
 import silver_waffle.credentials
 from random import randint
@@ -18,13 +33,15 @@ number_of_attempts = 10
 
 class ExchangeClient:
     all_currencies = []
+    INITIALIZATION_STAGES = ['markets', 'currencies', 'balances', 'prices', 'subscriptions']
     CCXT_QUOTE_KEYS = ['quote', 'quoteAsset', 'quote_currency']
     CCXT_BASE_KEYS = ['base', 'baseAsset', 'base_currency']
     CCXT_TICKSIZE_KEYS = ['tickSize', 'price_tick', 'minimum_order_amount']
 
     def __init__(self, exchange: str = None, websockets_client=None,
                  socket_settings={'book': True, 'orders': True, 'transactions': True},
-                 whitelist=None, creds={}, read_only=None, auto_initialize=True, auto_detect_credentials=True):
+                 whitelist=None, creds={}, read_only=None, auto_initialize=True, auto_detect_credentials=True,
+                 async_engine=False, max_concurrency=10):
         if exchange is not None:
             try:
                 if creds:
@@ -55,51 +72,166 @@ class ExchangeClient:
                     return getattr(module, exchange.lower().capitalize())()
                 except (ModuleNotFoundError, AttributeError):
                     raise ValueError('Exchange not found')
+        else:
+            # Native adapters (silver_waffle.exchanges) don't use ccxt and tell us if they have credentials
+            self.read_only = True if read_only is None else read_only
         self.creds = creds
         self.websockets_client = websockets_client
-        self.name = exchange
+        self.name = exchange if exchange is not None else getattr(self, 'name', type(self).__name__)
         self._update_book_sleep_time = 1
         self._update_balance_sleep_time = 7
         self.pairs = set()
-        self.pairs_by_ticker = {}
         self.pairs_to_always_update = set()
-        self.currencies_by_symbol = {}
+        self.registry = Registry()
         self.currencies = set()
-        self._rate_limits_timestamps = {}
-        self.cooldown = 2
+        self.rate_limiter = self._create_rate_limiter()
+        # How many order requests the batch operations (cancel_orders, create_orders) send at the same time when the
+        # exchange doesn't have a batch endpoint
+        self.max_order_concurrency = 5
+        # Decides how often each book is polled, see PollScheduler
+        self.scheduler = PollScheduler(self, initial_interval=self._update_book_sleep_time)
         self.threads = {}
         self.update_book_if_balance_is_empty = True
         self._whitelist = whitelist
         self._socket_settings = socket_settings
         self.socket_functionality = {}
+        self.book_synchronizers = {}
+        # Keeps Pair.orders up to date from the private order and fill streams, see _start_order_stream
+        self.order_tracker = OrderTracker(self)
+        self.order_stream = None
+        self.balance_refresher = BalanceRefresher(self)
+        self.deferred_initialization = False
+        self.initialization_timings = {}
+        self._market_definitions = []
+        # Market definitions are read from disk (see MarketCache) unless this is False
+        self.use_market_cache = True
+        self._initialized_currencies = []
+        # If async_engine is True, all the polling is multiplexed on a single event loop instead of one thread per
+        # pair and currency
+        self.engine = AsyncMarketDataEngine(self, max_concurrency=max_concurrency) if async_engine else None
+        metrics.add_collector(self._collect_metrics)
         if auto_initialize:
             self.initialize()
 
-    def initialize(self):
-        currencies, pairs = self.get_list_of_currencies_and_pairs(whitelist=self._whitelist)
+    def _create_rate_limiter(self):
+        """Returns a RateLimiter with the published limits of the exchange, see RATE_LIMITS"""
+        if str(self.name).lower() in RATE_LIMITS:
+            rate, burst = RATE_LIMITS[str(self.name).lower()]
+            return RateLimiter(rate, burst)
+        ccxt_client = getattr(self, 'ccxt_client', None)
+        if ccxt_client is not None and ccxt_client.rateLimit:
+            rate = 1000 / ccxt_client.rateLimit
+            return RateLimiter(rate, burst=max(1, rate * 10))
+        return None
+
+    def _collect_metrics(self, registry):
+        """Copies the state of the rate limiter and of the order stream into the metrics, see MetricsRegistry"""
+        name = str(self.name)
+        if self.rate_limiter is not None:
+            registry.gauge('silver_waffle_rate_limit_utilization', 'Share of the request rate used in the last '
+                           'window', ['exchange']).labels(name).set(self.rate_limiter.utilization())
+            registry.gauge('silver_waffle_rate_limit_tokens', 'Requests left in the bucket of the rate limiter',
+                           ['exchange']).labels(name).set(self.rate_limiter.tokens)
+        registry.gauge('silver_waffle_streamed_pairs', 'Pairs whose orders are kept up to date by a stream',
+                       ['exchange']).labels(name).set(len(self.order_tracker.streaming))
+        registry.counter('silver_waffle_order_updates_total', 'Order updates received from the order streams',
+                         ['exchange']).labels(name).value = self.order_tracker.updates
+        registry.counter('silver_waffle_fills_total', 'Fills received from the order streams',
+                         ['exchange']).labels(name).value = self.order_tracker.fills
 
+    def initialize(self):
+        """Loads the markets of the exchange and starts polling them. It runs every stage of INITIALIZATION_STAGES in
+        order, see run_initialization_stage"""
+        for stage in self.INITIALIZATION_STAGES:
+            self.run_initialization_stage(stage)
+
+    def run_initialization_stage(self, stage, executor=None):
+        """Runs one of the INITIALIZATION_STAGES and stores how many seconds it took in self.initialization_timings.
+        If an executor is given, the stages that make several independent requests run them in it"""
+        start = time()
+        getattr(self, f'_initialize_{stage}')(executor)
+        self.initialization_timings[stage] = time() - start
+        return self.initialization_timings[stage]
+
+    def _initialize_markets(self, executor=None):
+        self._market_definitions = self.get_cached_market_definitions()
+
+    def _initialize_currencies(self, executor=None):
+        # The currencies don't fetch their balance and price on creation, the next stages do it in bulk
+        self.deferred_initialization = True
+        try:
+            currencies, pairs = self._build_currencies_and_pairs(self._market_definitions, whitelist=self._whitelist)
+        finally:
+            self.deferred_initialization = False
         for pair in pairs:
             self._register_pair_and_currencies(pair, socket_settings=self._socket_settings)
-            if self.read_only is False:
-                for currency in [pair.base, pair.quote]:
-                    if not (currency in self.threads and self.threads[currency]):
-                        self._launch_thread(self.__update_balance_daemon__, currency)
+        self._initialized_currencies = currencies
         self.all_currencies += currencies
         for currency in currencies:
-            currency_count = 0
-            for all_currency in self.all_currencies:
-                if currency.symbol.lower() == all_currency.symbol.lower():
-                    currency_count += 1
-
-            if currency_count == 1:
-                self._launch_thread(self.__update_global_price_daemon__, currency)
+            global_registry.register_currency(currency)
+
+    def _initialize_balances(self, executor=None):
+        if self.read_only is False:
+            self.balance_refresher.refresh()
+
+    def _initialize_prices(self, executor=None):
+        price_cache.enable_persistence()
+        self._prefetch_chainlink_prices(self._initialized_currencies)
+        if executor is None:
+            for currency in self._initialized_currencies:
+                currency.update_global_price()
+        else:
+            list(executor.map(Currency.update_global_price, self._initialized_currencies))
+
+    @staticmethod
+    def _prefetch_chainlink_prices(currencies):
+        """Looks up the Chainlink price of every cryptocurrency that isn't in the price cache with a single batch
+        request, instead of one request per currency"""
+        symbols = {currency.symbol.upper() for currency in currencies}
+        symbols = [symbol for symbol in symbols if _is_symbol_a_cryptocurrency(symbol)
+                   and symbol not in STABLECOIN_SYMBOLS and price_cache.peek(symbol) is None]
+        if not symbols:
+            return
+        try:
+            prices = chainlink.get_prices(symbols)
+        except ConnectionError as e:
+            print(f"Couldn't prefetch the Chainlink prices: {e!r}")
+            return
+        for symbol, price in prices.items():
+            price_cache.set(symbol, price)
+
+    def _initialize_subscriptions(self, executor=None):
+        if self.read_only is False:
+            self._poll_balances()
+        for currency in self._initialized_currencies:
+            # Only one global price daemon is needed per symbol, even if several exchanges list it. It belongs to the
+            # first currency registered with that symbol
+            if global_registry.group(currency.symbol)[0] is currency:
+                self._poll_global_price(currency)
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_MARKET_DATA)
     def get_book(self, pair):
         """Returns a dictionary containing the buy and sell orders.
 
         return format: {ASK: list_of_asks, BID: list_of_bids}"""
-        book = self.ccxt_client.fetch_order_book(pair.ticker)
+        return self._parse_ccxt_book(self.ccxt_client.fetch_order_book(pair.ticker))
+
+    @retry(stop=stop_after_attempt(number_of_attempts))
+    async def async_get_book(self, pair, engine):
+        """Same as get_book, but awaitable. It's used by the AsyncMarketDataEngine"""
+        if engine.ccxt_client is None:
+            return await engine.run_blocking(self.get_book, pair)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.async_acquire(PRIORITY_MARKET_DATA)
+        start = monotonic()
+        try:
+            return self._parse_ccxt_book(await engine.ccxt_client.fetch_order_book(pair.ticker))
+        finally:
+            request_latency.labels(str(self.name), 'async_get_book').observe(monotonic() - start)
+
+    @staticmethod
+    def _parse_ccxt_book(book):
         asks = [{'amount': x[1], 'price': x[0]} for x in book['asks']]
         bids = [{'amount': x[1], 'price': x[0]} for x in book['bids']]
 
@@ -108,13 +240,40 @@ class ExchangeClient:
     @retry(stop=stop_after_attempt(number_of_attempts))
     def get_balance(self, currency):
         """Returns the available and locked balance of a currency, in that order"""
-        balances = self.ccxt_client.fetch_balance()
+        balances = self.get_balances()
         try:
-            return balances[currency.symbol]['free'], balances[currency.symbol]['used']
+            return balances[currency.symbol]
         except KeyError:
             return 0, 0
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
+    def get_balances(self):
+        """Returns the available and locked balance of every currency of the account with a single request.
+
+        return format: {symbol: (available_balance, locked_balance)}"""
+        return self._parse_ccxt_balances(self.ccxt_client.fetch_balance())
+
+    @retry(stop=stop_after_attempt(number_of_attempts))
+    async def async_get_balances(self, engine):
+        """Same as get_balances, but awaitable. It's used by the AsyncMarketDataEngine"""
+        if engine.ccxt_client is None:
+            return await engine.run_blocking(self.get_balances)
+        if self.rate_limiter is not None:
+            await self.rate_limiter.async_acquire(PRIORITY_ACCOUNT)
+        start = monotonic()
+        try:
+            return self._parse_ccxt_balances(await engine.ccxt_client.fetch_balance())
+        finally:
+            request_latency.labels(str(self.name), 'async_get_balances').observe(monotonic() - start)
+
+    @staticmethod
+    def _parse_ccxt_balances(balances):
+        return {symbol: (balance['free'], balance['used']) for symbol, balance in balances.items()
+                if isinstance(balance, dict) and 'free' in balance and 'used' in balance}
+
+    @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
     def get_active_orders(self, pair):
         orders = self.ccxt_client.fetch_open_orders(symbol=pair.ticker)
         result = {ASK: [], BID: []}
@@ -124,12 +283,14 @@ class ExchangeClient:
         return result
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ORDERS)
     def cancel_order(self, order):
         try:
             self.ccxt_client.cancel_order(order.order_id, order.pair.ticker)
         except ccxt.base.errors.ArgumentsRequired:
             print(order.pair.ticker)
 
+    @rate_limited(PRIORITY_ORDERS)
     def create_order(self, pair, amount, side, limit_price=None):
         if limit_price is None:
             if side is ASK:
@@ -143,32 +304,152 @@ class ExchangeClient:
                 order = self.ccxt_client.create_limit_buy_order(pair.ticker, amount, limit_price)
             return Order(limit_price, side, amount, pair=pair, order_id=order['id'])
 
+    def _has(self, feature):
+        """True if the ccxt client of the exchange has the given feature (like 'cancelOrders')"""
+        ccxt_client = getattr(self, 'ccxt_client', None)
+        return ccxt_client is not None and bool(ccxt_client.has.get(feature))
+
+    def map_concurrently(self, function, items):
+        """Calls function(item) for every item, up to max_order_concurrency at a time. Returns a (result, exception)
+        tuple per item, in the same order"""
+        def call(item):
+            try:
+                return function(item), None
+            except Exception as e:
+                return None, e
+        items = list(items)
+        if len(items) <= 1:
+            return [call(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(len(items), self.max_order_concurrency)) as executor:
+            return list(executor.map(call, items))
+
+    def cancel_orders(self, orders):
+        """Cancels several orders and returns an OrderResult per order, in the same order.
+
+        If the exchange has a batch endpoint (ccxt's cancelOrders), it takes one request per pair. Otherwise, or if
+        the batch request fails, the orders are cancelled with up to max_order_concurrency requests at a time"""
+        orders = list(orders)
+        results = {}
+        if self._has('cancelOrders'):
+            orders_by_pair = {}
+            for order in orders:
+                orders_by_pair.setdefault(order.pair, []).append(order)
+            for pair, pair_orders in orders_by_pair.items():
+                try:
+                    self._cancel_orders_batch(pair, [order.order_id for order in pair_orders])
+                except Exception:
+                    continue  # cancelled one by one below
+                for order in pair_orders:
+                    results[id(order)] = OrderResult(order, order, None)
+        pending = [order for order in orders if id(order) not in results]
+        for order, (_, error) in zip(pending, self.map_concurrently(self.cancel_order, pending)):
+            results[id(order)] = OrderResult(order, order, error)
+        return [results[id(order)] for order in orders]
+
+    @rate_limited(PRIORITY_ORDERS)
+    def _cancel_orders_batch(self, pair, order_ids):
+        self.ccxt_client.cancel_orders(order_ids, pair.ticker)
+
+    def cancel_all_orders(self, pair, orders):
+        """Cancels every open order of pair, in a single request if the exchange has ccxt's cancelAllOrders.
+        orders are the open orders that are known, an OrderResult is returned for each of them"""
+        orders = list(orders)
+        if self._has('cancelAllOrders'):
+            try:
+                self._cancel_all_orders(pair)
+                return [OrderResult(order, order, None) for order in orders]
+            except Exception:
+                pass
+        return self.cancel_orders(orders)
+
+    @rate_limited(PRIORITY_ORDERS)
+    def _cancel_all_orders(self, pair):
+        self.ccxt_client.cancel_all_orders(pair.ticker)
+
+    def create_orders(self, order_requests):
+        """Places several orders, given as (pair, amount, side, limit_price) tuples (limit_price None for a market
+        order). Returns an OrderResult per request, in the same order.
+
+        If the exchange has a batch endpoint (ccxt's createOrders), they are sent in one request. Otherwise, or if the
+        batch request fails, they are placed with up to max_order_concurrency requests at a time"""
+        order_requests = list(order_requests)
+        if self._has('createOrders') and order_requests:
+            try:
+                return self._create_orders_batch(order_requests)
+            except Exception:
+                pass
+        outcomes = self.map_concurrently(lambda request: self.create_order(*request), order_requests)
+        return [OrderResult(request, order, error) for request, (order, error) in zip(order_requests, outcomes)]
+
+    @rate_limited(PRIORITY_ORDERS)
+    def _create_orders_batch(self, order_requests):
+        responses = self.ccxt_client.create_orders([
+            {'symbol': pair.ticker, 'type': 'market' if limit_price is None else 'limit',
+             'side': 'sell' if side is ASK else 'buy', 'amount': amount, 'price': limit_price}
+            for pair, amount, side, limit_price in order_requests])
+        results = []
+        for (pair, amount, side, limit_price), response in zip(order_requests, responses):
+            if not response.get('id') or response.get('status') == 'rejected':
+                results.append(OrderResult((pair, amount, side, limit_price), None,
+                                           ccxt.InvalidOrder(response.get('info'))))
+            elif limit_price is None:
+                results.append(OrderResult((pair, amount, side, limit_price), None, None))
+            else:
+                results.append(OrderResult((pair, amount, side, limit_price),
+                                           Order(limit_price, side, amount, pair=pair, order_id=response['id']), None))
+        return results
+
     def subscribe(self, pair):
         self._register_pair_and_currencies(pair)
         self.__start_threads__(pair)
+        self._start_order_stream(pair)
 
     def unsubscribe(self, pair):
-        pass
+        self._stop_order_stream(pair)
+
+    def _order_stream_settings(self, pair):
+        """Returns whether the orders and the fills ('transactions') of pair should be streamed"""
+        settings = self.socket_functionality.get(pair) or self._socket_settings or {}
+        return bool(settings.get('orders')), bool(settings.get('transactions'))
+
+    def _start_order_stream(self, pair):
+        """Streams the orders and fills of pair into self.order_tracker, if socket_settings asks for it and the
+        exchange can do it. This implementation uses ccxt.pro (watch_orders and watch_my_trades), the exchanges with
+        their own private socket override it"""
+        orders, transactions = self._order_stream_settings(pair)
+        if self.read_only is True or not (orders or transactions) or self.order_tracker.is_streaming(pair):
+            return
+        if self.order_stream is None:
+            if not CcxtOrderStream.is_supported(self):
+                return
+            self.order_stream = CcxtOrderStream(self)
+        self.order_tracker.amounts_from_fills = transactions and not orders
+        self.order_stream.watch(pair, orders=orders, transactions=transactions)
+        self.order_tracker.start(pair)
+
+    def _stop_order_stream(self, pair):
+        if self.order_stream is not None:
+            self.order_stream.unwatch(pair)
+        self.order_tracker.stop(pair)
 
     @retry(stop=stop_after_attempt(number_of_attempts))
-    def get_list_of_currencies_and_pairs(self, whitelist=None):
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_market_definitions(self):
+        """Returns the markets of the exchange as a list of dictionaries with the keys 'ticker', 'base', 'quote',
+        'minimum_step' and 'active'. 'base_name' and 'quote_name' can be included to name the currencies"""
         markets = self.ccxt_client.fetch_markets()
-        list_of_currencies = set([])
-        list_of_pairs = []
+        definitions = []
         for pair in markets:
-            if pair['active'] is False:
-                continue
+            quote_symbol, base_symbol = pair['quote'], pair['base']
             for quote_key, base_key in zip(self.CCXT_QUOTE_KEYS, self.CCXT_BASE_KEYS):
                 try:
                     quote_symbol = pair['info'][quote_key]
                     base_symbol = pair['info'][base_key]
                 except KeyError:
                     continue
-            base_curr = quote_curr = None
-            ticker = pair['symbol']
 
             #CCXT is inconsistent across exchanges so we have to do this
-
+            minimum_step = pair.get('precision', {}).get('price')
             for key in self.CCXT_TICKSIZE_KEYS:
                 try:
                     minimum_step = pair['info'][key][0]
@@ -183,43 +464,90 @@ class ExchangeClient:
                             break
                         except KeyError:
                             continue
+            definitions.append({'ticker': pair['symbol'], 'base': base_symbol, 'quote': quote_symbol,
+                                'minimum_step': minimum_step, 'active': pair['active'] is not False})
+        return definitions
+
+    def get_cached_market_definitions(self):
+        """Same as get_market_definitions, but served from the disk cache when possible"""
+        if not self.use_market_cache:
+            return self.get_market_definitions()
+        return market_cache.get(self.name, self.get_market_definitions)
+
+    def get_list_of_currencies_and_pairs(self, whitelist=None, auto_register=False):
+        currencies, pairs = self._build_currencies_and_pairs(self.get_cached_market_definitions(),
+                                                             whitelist=whitelist)
+        if auto_register is True:
+            for pair in pairs:
+                self._register_pair_and_currencies(pair)
+        return currencies, pairs
+
+    def _build_currencies_and_pairs(self, definitions, whitelist=None):
+        """Creates the Currency and Pair objects of a list of market definitions (see get_market_definitions)"""
+        registry = Registry()
+        list_of_pairs = []
+        for definition in definitions:
+            if definition['active'] is False:
+                continue
+            ticker = definition['ticker']
             if whitelist is not None and ticker not in whitelist:
                 continue
-            for curr in list_of_currencies:
-                if base_symbol == curr.symbol:
-                    base_curr = curr
-                if quote_symbol == curr.symbol:
-                    quote_curr = curr
+            base_symbol, quote_symbol = definition['base'], definition['quote']
+            base_curr = registry.get_currency(base_symbol)
+            quote_curr = registry.get_currency(quote_symbol)
             if not base_curr:
-                base_curr = Currency(name=base_symbol, symbol=base_symbol,
+                base_curr = Currency(name=definition.get('base_name', base_symbol), symbol=base_symbol,
                                      exchange_client=self)
             if not quote_curr:
-                quote_curr = Currency(name=quote_symbol, symbol=quote_symbol,
+                quote_curr = Currency(name=definition.get('quote_name', quote_symbol), symbol=quote_symbol,
                                       exchange_client=self)
             pair = Pair(ticker=ticker, quote=quote_curr, base=base_curr,
-                        minimum_step=minimum_step, exchange_client=self)
+                        minimum_step=definition['minimum_step'], exchange_client=self)
             # print(f"{pair.quote.name}{pair.base.name}")
             list_of_pairs.append(pair)
-            list_of_currencies.add(quote_curr)
-            list_of_currencies.add(base_curr)
-        return list(list_of_currencies), list_of_pairs
+            registry.register_pair(pair)
+        return list(registry.currencies_by_symbol.values()), list_of_pairs
+
+    def get_book_synchronizer(self, pair):
+        """Returns the BookSynchronizer that applies the websocket diffs of a pair, creating it if needed"""
+        if pair not in self.book_synchronizers:
+            self.book_synchronizers[pair] = BookSynchronizer(pair, lambda: self.get_book_snapshot(pair))
+        return self.book_synchronizers[pair]
+
+    def get_book_snapshot(self, pair):
+        """Returns the book that a BookSynchronizer starts from. It has to include a 'sequence' key"""
+        return self.get_book(pair)
 
     def get_pair_by_ticker(self, ticker):
-        for pair in self.pairs:
-            if pair.ticker.lower() == ticker.lower():
-                return pair
+        return self.registry.get_pair(ticker)
+
+    def get_currency_by_symbol(self, symbol):
+        return self.registry.get_currency(symbol)
+
+    @property
+    def pairs_by_ticker(self):
+        """Registered pairs by lowercase ticker"""
+        return self.registry.pairs_by_ticker
+
+    @property
+    def currencies_by_symbol(self):
+        """Registered currencies by lowercase symbol"""
+        return self.registry.currencies_by_symbol
 
     def _register_pair_and_currencies(self, pair, socket_settings=None):
         self.pairs.add(pair)
         self.currencies.add(pair.quote)
         self.currencies.add(pair.base)
-        self.pairs_by_ticker.update({pair.ticker: pair})
-        self.currencies_by_symbol.update({pair.quote.symbol: pair.quote, pair.base.symbol: pair.base})
+        self.registry.register_pair(pair)
         if socket_settings:
             self.socket_functionality[pair] = socket_settings
 
-    def _launch_thread(self, thread, pair_or_currency):
-        thread = threading.Thread(target=thread, args=[pair_or_currency])
+    def _launch_thread(self, thread, pair_or_currency=None):
+        if pair_or_currency is None:
+            pair_or_currency = thread.__name__
+            thread = threading.Thread(target=thread)
+        else:
+            thread = threading.Thread(target=thread, args=[pair_or_currency])
         thread.daemon = True
         if pair_or_currency not in self.threads:
             self.threads[pair_or_currency] = []
@@ -228,12 +556,48 @@ class ExchangeClient:
 
     def __start_threads__(self, pair):
         assert pair in self.pairs
-        if not (pair in self.threads and self.threads[pair]):
+        if self.engine is not None:
+            self.engine.watch_book(pair)
+        elif not (pair in self.threads and self.threads[pair]):
             self._launch_thread(self.__update_book_daemon__, pair)
             # for currency in [pair.quote, pair.base]:
             #     if not (currency in self.threads and self.threads[currency]):
             #
 
+    def _poll_balances(self):
+        if self.engine is not None:
+            self.engine.watch_balances()
+        elif not self.threads.get(self.__update_balances_daemon__.__name__):
+            self._launch_thread(self.__update_balances_daemon__)
+
+    def _poll_global_price(self, currency):
+        if self.engine is not None:
+            self.engine.watch_global_price(currency)
+        else:
+            self._launch_thread(self.__update_global_price_daemon__, currency)
+
+    def _get_book_poll_delay(self, pair):
+        """Returns None if the book of the pair has to be polled now. Otherwise, returns how many seconds to wait
+        before checking again"""
+        if self.socket_functionality[pair]['book'] is True and self.websockets_client is not None:
+            return self._update_book_sleep_time
+        if not self.update_book_if_balance_is_empty:
+            if pair.status[BID] and not pair.status[ASK] and pair.quote.balance_is_empty():
+                return 5
+            if pair.status[ASK] and not pair.status[BID] and pair.base.balance_is_empty():
+                return 5
+            if pair.base.balance_is_empty() and pair.quote.balance_is_empty():
+                return 5
+        if pair or pair in self.pairs_to_always_update:
+            return None
+        return 5
+
+    def _update_global_price(self, currency):
+        """Updates the global price of every currency that shares the symbol of the given one"""
+        price = price_cache.refresh(currency.symbol, currency.get_global_price)
+        for currency in global_registry.group(currency.symbol):
+            currency.global_price = price
+
     def __update_book_daemon__(self, pair):
         def exit_thread():
             self.threads[pair] = None
@@ -241,47 +605,30 @@ class ExchangeClient:
 
         sleep(randint(0, self._update_book_sleep_time))
         while True:
-            while self.socket_functionality[pair]['book'] is True and self.websockets_client is not None:
-                sleep(self._update_book_sleep_time)
-            if not self.update_book_if_balance_is_empty:
-                if pair.status[BID] and not pair.status[ASK] and pair.quote.balance_is_empty():
-                    sleep(5)
-                    continue
-                if pair.status[ASK] and not pair.status[BID] and pair.base.balance_is_empty():
-                    sleep(5)
-                    continue
-                if pair.base.balance_is_empty() and pair.quote.balance_is_empty():
-                    sleep(5)
-                    continue
-            if pair or pair in self.pairs_to_always_update:
-                pair.orderbook.update(self.get_book(pair))
-                sleep(self._update_book_sleep_time)
-            else:
-                sleep(5)
+            delay = self._get_book_poll_delay(pair)
+            if delay is not None:
+                sleep(delay)
+                continue
+            change = pair.orderbook.update(self.get_book(pair))
+            sleep(self.scheduler.observe(pair, change is not None))
 
-    def __update_balance_daemon__(self, currency):
+    def __update_balances_daemon__(self):
         sleep(randint(0, self._update_balance_sleep_time))
         while True:
-            if currency.has_an_active_pair():
-                currency.update_balance()
+            if any(currency.has_an_active_pair() for currency in list(self.currencies)):
+                self.balance_refresher.refresh()
             sleep(self._update_balance_sleep_time)
 
     def __update_global_price_daemon__(self, currency):
         sleep(randint(20, 80))
         while True:
-            currencies_to_update = []
-            for all_currency in self.all_currencies:
-                if currency.symbol.lower() == all_currency.symbol.lower():
-                    currencies_to_update.append(all_currency)
             try:
-                price = currency.get_global_price()
+                self._update_global_price(currency)
             except (requests.exceptions.HTTPError, UnboundLocalError):
                 continue
             except Exception:
                 sys.exit()
                 # log this
-            for currency in currencies_to_update:
-                currency.global_price = price
             sleep(120)
 
     def __str__(self):
@@ -291,6 +638,41 @@ class ExchangeClient:
         return self.__str__()
 
 
+
+class OfflineExchangeClient(ExchangeClient):
+    """Base of the exchanges that live in the process instead of behind an API (see ReplayExchangeClient and
+    SimulatedExchange).
+
+    markets is a list of market definitions (see get_market_definitions), balances is a {symbol: (available,
+    locked)} dictionary and currencies are worth global_prices[symbol] USD, or 1 if they aren't in it. Nothing is
+    downloaded, so balances and global prices aren't polled"""
+
+    def __init__(self, markets, balances=None, global_prices=None, **kwargs):
+        self._markets = markets
+        self._balances = {symbol.lower(): balance for symbol, balance in (balances or {}).items()}
+        self._global_prices = {symbol.upper(): price for symbol, price in (global_prices or {}).items()}
+        kwargs.setdefault('read_only', False)
+        super().__init__(**kwargs)
+
+    def get_market_definitions(self):
+        return self._markets
+
+    def get_cached_market_definitions(self):
+        return self.get_market_definitions()
+
+    def _initialize_prices(self, executor=None):
+        for currency in self._initialized_currencies:
+            currency.global_price = self._global_prices.get(currency.symbol.upper(), 1)
+
+    def _poll_balances(self):
+        pass
+
+    def _poll_global_price(self, currency):
+        pass
+
+    def get_balances(self):
+        return dict(self._balances)
+
 class WebsocketsClient(object):
     def __init__(self, ws_uri, exchange_client):
         self._ws_url = ws_uri
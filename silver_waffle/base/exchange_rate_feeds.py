@@ -1,6 +1,8 @@
-from web3 import Web3
+import threading
+from time import time
 from .constants import CHAINLINK_ADDRESSES, FREE_RPC_ENDPOINTS
 import requests
+from requests.adapters import HTTPAdapter
 
 
 def get_ars_criptoya():
@@ -8,44 +10,152 @@ def get_ars_criptoya():
     return 1/float(response.json()['ccb'])
 
 
-abi = '[{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],' \
-      '"stateMutability":"view","type":"function"},{"inputs":[],"name":"description","outputs":[{' \
-      '"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},' \
-      '{"inputs":[{"internalType":"uint80","name":"_roundId","type":"uint80"}],"name":"getRoundData",' \
-      '"outputs":[{"internalType":"uint80","name":"roundId","type":"uint80"},{"internalType":"int256",' \
-      '"name":"answer","type":"int256"},{"internalType":"uint256","name":"startedAt","type":"uint256"},' \
-      '{"internalType":"uint256","name":"updatedAt","type":"uint256"},{"internalType":"uint80",' \
-      '"name":"answeredInRound","type":"uint80"}],"stateMutability":"view","type":"function"},{"inputs":[],' \
-      '"name":"latestRoundData","outputs":[{"internalType":"uint80","name":"roundId","type":"uint80"},' \
-      '{"internalType":"int256","name":"answer","type":"int256"},{"internalType":"uint256",' \
-      '"name":"startedAt","type":"uint256"},{"internalType":"uint256","name":"updatedAt","type":"uint256"},' \
-      '{"internalType":"uint80","name":"answeredInRound","type":"uint80"}],"stateMutability":"view",' \
-      '"type":"function"},{"inputs":[],"name":"version","outputs":[{"internalType":"uint256","name":"",' \
-      '"type":"uint256"}],"stateMutability":"view","type":"function"}]'
+LATEST_ROUND_DATA_SELECTOR = '0xfeaf968c'  # keccak256('latestRoundData()')[:4]
+USD_FEED_DECIMALS = 8
+ETH_FEED_DECIMALS = 18
 
-def get_chainlink_price(symbol):
-    def get_price(address):
-        contract = web3.eth.contract(address=address, abi=abi)
-        roundData = contract.functions.latestRoundData().call()
-        price = roundData[1]
-        timestamp = roundData[3]
-        return price / 1E8
-
-    for rpc in FREE_RPC_ENDPOINTS:
-        try:
-            web3 = Web3(Web3.HTTPProvider(rpc))
-            break
-        except Exception:
-            continue
-
-    key = symbol.upper() + '-USD'
-    if key not in CHAINLINK_ADDRESSES:
-        key = symbol.upper() + '-ETH'
-        if key not in CHAINLINK_ADDRESSES:
+
+class RPCEndpoint:
+    """Health of a JSON-RPC endpoint: an exponential moving average of its latency and how long it's benched for
+    after failing"""
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = 0  # Endpoints that were never used are tried first
+        self.failures = 0
+        self.disabled_until = 0
+
+    @property
+    def is_healthy(self):
+        return time() >= self.disabled_until
+
+    def record_success(self, latency):
+        self.latency = latency if self.latency == 0 else 0.7 * self.latency + 0.3 * latency
+        self.failures = 0
+        self.disabled_until = 0
+
+    def record_failure(self, max_backoff=300):
+        self.failures += 1
+        self.disabled_until = time() + min(max_backoff, 5 * 2 ** self.failures)
+
+    def __repr__(self):
+        return f'RPCEndpoint({self.url}, latency={self.latency:.3f}, failures={self.failures})'
+
+
+class ChainlinkFeedService:
+    """Reads Chainlink price feeds through a pooled HTTP session, sending all the latestRoundData calls of a lookup
+    as a single JSON-RPC batch request.
+
+    Endpoints are tried from the fastest healthy one to the slowest, and an endpoint that fails is benched with an
+    exponential backoff. Pass your own endpoints (like a local node) to use them instead of FREE_RPC_ENDPOINTS."""
+
+    def __init__(self, endpoints=FREE_RPC_ENDPOINTS, addresses=CHAINLINK_ADDRESSES, timeout=5, batch_size=50):
+        self.endpoints = [RPCEndpoint(url) for url in endpoints]
+        self.addresses = {key.upper(): address for key, address in addresses.items()}
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=10))
+        self.session.mount('https://', HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=10))
+        self._lock = threading.Lock()
+
+    def get_price(self, symbol):
+        """Returns how much 1 unit of symbol is worth in USD. Raises ValueError if Chainlink doesn't have a feed
+        for it"""
+        prices = self.get_prices([symbol])
+        if symbol.upper() not in prices:
             raise ValueError(f'{symbol} not available on chainlink')
-        coin_to_eth = get_price(CHAINLINK_ADDRESSES[key])
-        price = (coin_to_eth * get_price(CHAINLINK_ADDRESSES['ETH-USD'])) / 1E10
-    else:
-        price = get_price(CHAINLINK_ADDRESSES[key])
+        return prices[symbol.upper()]
 
-    return price
+    def get_prices(self, symbols):
+        """Returns {SYMBOL: price in USD} for every symbol that has a feed, with a single batch request. Symbols
+        without a USD feed are priced through their ETH feed"""
+        feeds = set()
+        for symbol in symbols:
+            feed = self._feed_of(symbol)
+            if feed is not None:
+                feeds.add(feed)
+                if feed.endswith('-ETH'):
+                    feeds.add('ETH-USD')
+        answers = self.get_latest_answers(sorted(feeds))
+
+        prices = {}
+        for symbol in symbols:
+            feed = self._feed_of(symbol)
+            if feed is None or feed not in answers:
+                continue
+            if feed.endswith('-ETH'):
+                if 'ETH-USD' not in answers:
+                    continue
+                prices[symbol.upper()] = answers[feed] / 10 ** ETH_FEED_DECIMALS * \
+                    answers['ETH-USD'] / 10 ** USD_FEED_DECIMALS
+            else:
+                prices[symbol.upper()] = answers[feed] / 10 ** USD_FEED_DECIMALS
+        return prices
+
+    def _feed_of(self, symbol):
+        for key in (symbol.upper() + '-USD', symbol.upper() + '-ETH'):
+            if key in self.addresses:
+                return key
+        return None
+
+    def get_latest_answers(self, feeds):
+        """Returns {feed: raw answer of latestRoundData} of the given feed names (like 'BTC-USD')"""
+        answers = {}
+        for i in range(0, len(feeds), self.batch_size):
+            chunk = feeds[i:i + self.batch_size]
+            calls = [{'jsonrpc': '2.0', 'id': j, 'method': 'eth_call',
+                      'params': [{'to': self.addresses[feed], 'data': LATEST_ROUND_DATA_SELECTOR}, 'latest']}
+                     for j, feed in enumerate(chunk)]
+            for response in self._batch_call(calls):
+                try:
+                    answers[chunk[response['id']]] = self.decode_latest_round_data(response['result'])[1]
+                except (KeyError, IndexError, TypeError, ValueError):
+                    continue  # That feed failed, the rest of the batch is still good
+        return answers
+
+    @staticmethod
+    def decode_latest_round_data(result):
+        """Decodes the (roundId, answer, startedAt, updatedAt, answeredInRound) returned by latestRoundData"""
+        data = result[2:] if result.startswith('0x') else result
+        if len(data) < 5 * 64:
+            raise ValueError(f'Unexpected latestRoundData result: {result}')
+        words = [int(data[i * 64:(i + 1) * 64], 16) for i in range(5)]
+        if words[1] >= 2 ** 255:  # answer is an int256
+            words[1] -= 2 ** 256
+        return tuple(words)
+
+    def _ranked_endpoints(self):
+        with self._lock:
+            healthy = sorted((endpoint for endpoint in self.endpoints if endpoint.is_healthy),
+                             key=lambda endpoint: endpoint.latency)
+            benched = sorted((endpoint for endpoint in self.endpoints if not endpoint.is_healthy),
+                             key=lambda endpoint: endpoint.disabled_until)
+        return healthy + benched
+
+    def _batch_call(self, calls):
+        last_error = None
+        for endpoint in self._ranked_endpoints():
+            start = time()
+            try:
+                response = self.session.post(endpoint.url, json=calls, timeout=self.timeout)
+                response.raise_for_status()
+                responses = response.json()
+                if not isinstance(responses, list):  # Some endpoints don't support batches
+                    raise ValueError(f'{endpoint.url} returned {responses}')
+            except (requests.exceptions.RequestException, ValueError) as e:
+                last_error = e
+                with self._lock:
+                    endpoint.record_failure()
+                continue
+            with self._lock:
+                endpoint.record_success(time() - start)
+            return responses
+        raise ConnectionError(f'Every RPC endpoint failed, last error: {last_error!r}')
+
+
+chainlink = ChainlinkFeedService()
+
+
+def get_chainlink_price(symbol):
+    return chainlink.get_price(symbol)
@@ -0,0 +1,76 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HttpSession:
+    """Keep-alive HTTP session used by the native adapters, so that every request to an exchange reuses one of a few
+    pooled connections instead of paying for a new TCP and TLS handshake.
+
+    At most pool_maxsize connections are opened to each host (pool_block makes extra requests wait for a free one).
+    A 429 answer raises requests.HTTPError, so that the rate_limited methods back off (see RateLimiter.back_off).
+    The latency of every request is kept in timings, and it's passed to the functions added with add_timing_hook:
+
+    session.add_timing_hook(lambda method, url, status_code, elapsed: print(url, elapsed))"""
+
+    def __init__(self, timeout=5, pool_connections=4, pool_maxsize=10, pool_block=True, max_timings=1000):
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.hooks['response'].append(self._record_timing)
+        self.timings = deque(maxlen=max_timings)  # (method, url, status_code, seconds)
+        self._timing_hooks = []
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def add_timing_hook(self, hook):
+        self._timing_hooks.append(hook)
+
+    def remove_timing_hook(self, hook):
+        self._timing_hooks.remove(hook)
+
+    def _record_timing(self, response, *args, **kwargs):
+        timing = (response.request.method, response.url, response.status_code, response.elapsed.total_seconds())
+        self.timings.append(timing)
+        for hook in self._timing_hooks:
+            try:
+                hook(*timing)
+            except Exception as e:
+                print(f'Timing hook {hook} failed: {e!r}')
+
+    def average_latency(self, last=100):
+        timings = list(self.timings)[-last:]
+        return sum(timing[3] for timing in timings) / len(timings) if timings else None
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code == 429:
+            response.raise_for_status()
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def get_many(self, urls, **kwargs):
+        """GETs every url concurrently over the pooled connections and returns the responses in the same order"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_maxsize)
+        return list(self._executor.map(lambda url: self.get(url, **kwargs), urls))
+
+    def close(self):
+        self.session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,120 @@
+import itertools
+import threading
+import weakref
+from contextlib import contextmanager
+from time import monotonic
+
+_sequence = itertools.count()
+_locks = weakref.WeakSet()
+_registry_lock = threading.Lock()
+
+
+class LockStats:
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0  # acquisitions that had to wait because another thread held the lock
+        self.total_wait = 0  # seconds spent waiting to acquire the lock
+        self.max_wait = 0
+        self.total_hold = 0  # seconds the lock was held, from the outermost acquire to its release
+        self.max_hold = 0
+
+    @property
+    def average_wait(self):
+        return self.total_wait / self.acquisitions if self.acquisitions else 0
+
+    @property
+    def average_hold(self):
+        return self.total_hold / self.acquisitions if self.acquisitions else 0
+
+    def __repr__(self):
+        return f'LockStats(acquisitions={self.acquisitions}, contended={self.contended}, ' \
+               f'average_wait={self.average_wait:.4f}, max_wait={self.max_wait:.4f}, ' \
+               f'average_hold={self.average_hold:.4f}, max_hold={self.max_hold:.4f})'
+
+
+class InstrumentedLock:
+    """Reentrant lock that measures how long threads wait for it and how long they hold it.
+
+    Every lock gets a sequence number when it's created, which is the order in which acquire_all takes several locks.
+    Since every thread takes them in the same order, two threads that need overlapping sets of locks can't deadlock.
+    Nested acquisitions by the thread that already holds the lock are free and aren't counted."""
+
+    def __init__(self, name):
+        self.name = name
+        self.sequence = next(_sequence)
+        self.stats = LockStats()
+        self._lock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+        self._acquired_at = 0
+        with _registry_lock:
+            _locks.add(self)
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._owner == threading.get_ident():
+            self._lock.acquire()
+            self._depth += 1
+            return True
+        start = monotonic()
+        contended = not self._lock.acquire(blocking=False)
+        if contended and not self._lock.acquire(blocking=blocking, timeout=timeout):
+            return False
+        now = monotonic()
+        self._owner = threading.get_ident()
+        self._depth = 1
+        self._acquired_at = now
+        stats = self.stats
+        wait = now - start
+        stats.acquisitions += 1
+        stats.contended += contended
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            hold = monotonic() - self._acquired_at
+            self._owner = None
+            self.stats.total_hold += hold
+            self.stats.max_hold = max(self.stats.max_hold, hold)
+        self._lock.release()
+
+    def locked(self):
+        return self._owner is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __repr__(self):
+        return f'InstrumentedLock({self.name}, {self.stats})'
+
+
+@contextmanager
+def acquire_all(*locks):
+    """Holds every lock in locks (duplicates and Nones are ignored) for the duration of the block. They are taken in
+    the order of their sequence numbers and released in the opposite order:
+
+    with acquire_all(pair.lock, pair.base.lock, pair.quote.lock):
+        ..."""
+    ordered = sorted({id(lock): lock for lock in locks if lock is not None}.values(), key=lambda lock: lock.sequence)
+    acquired = []
+    try:
+        for lock in ordered:
+            lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+
+def lock_stats():
+    """Returns {name: LockStats} of every lock that is alive, sorted by the total time spent waiting for it"""
+    with _registry_lock:
+        locks = list(_locks)
+    return {lock.name: lock.stats for lock in sorted(locks, key=lambda lock: lock.stats.total_wait, reverse=True)}
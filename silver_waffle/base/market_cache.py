@@ -0,0 +1,78 @@
+import json
+import os
+import re
+import threading
+from time import time
+from silver_waffle.utilities import write_json_atomically
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.silver_waffle', 'markets')
+
+
+class MarketCache:
+    """Disk cache of the market definitions of each exchange (see ExchangeClient.get_market_definitions), so that a
+    warm start can build its pairs and currencies without downloading every market again.
+
+    Definitions younger than ttl seconds are used as they are. Older ones are still used, but they get downloaded
+    again in the background so that the next start picks up the changes."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, ttl=24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _path(self, exchange_name):
+        return os.path.join(self.directory, re.sub(r'[^\w.-]', '_', str(exchange_name).lower()) + '.json')
+
+    def get(self, exchange_name, loader):
+        """Returns the market definitions of exchange_name. loader is called (without arguments) to download them
+        when they aren't cached or when they are stale"""
+        entry = self.read(exchange_name)
+        if entry is None:
+            return self.refresh(exchange_name, loader)
+        if time() - entry['timestamp'] > self.ttl:
+            self._refresh_in_background(exchange_name, loader)
+        return entry['definitions']
+
+    def read(self, exchange_name):
+        """Returns the cached {'timestamp': ..., 'definitions': [...]} of exchange_name, or None"""
+        try:
+            with open(self._path(exchange_name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def refresh(self, exchange_name, loader):
+        definitions = loader()
+        try:
+            write_json_atomically(self._path(exchange_name), {'timestamp': time(), 'definitions': definitions})
+        except OSError:
+            pass
+        return definitions
+
+    def invalidate(self, exchange_name):
+        try:
+            os.remove(self._path(exchange_name))
+        except OSError:
+            pass
+
+    def _refresh_in_background(self, exchange_name, loader):
+        with self._lock:
+            if exchange_name in self._refreshing:
+                return
+            self._refreshing.add(exchange_name)
+
+        def refresh():
+            try:
+                self.refresh(exchange_name, loader)
+            except Exception:
+                pass  # the stale definitions are still usable
+            finally:
+                with self._lock:
+                    self._refreshing.discard(exchange_name)
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+
+market_cache = MarketCache()
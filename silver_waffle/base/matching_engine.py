@@ -0,0 +1,145 @@
+from bisect import bisect_left, insort
+from collections import deque, namedtuple
+from silver_waffle.base.side import ASK, BID
+
+# side is the side of the taker order
+Fill = namedtuple('Fill', ['maker_id', 'taker_id', 'side', 'price', 'amount', 'maker_owner', 'taker_owner'])
+
+
+class _RestingOrder:
+    __slots__ = ('order_id', 'side', 'price', 'amount', 'owner')
+
+    def __init__(self, order_id, side, price, amount, owner):
+        self.order_id = order_id
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.owner = owner
+
+
+class MatchingEngine:
+    """Limit order book of a single market with price-time priority matching.
+
+    Each price level is a FIFO queue of orders, and the prices of each side are kept in a sorted list, so placing an
+    order costs O(log n) plus one insertion per new level and cancelling one is O(1): the cancelled order is only
+    marked, and it's dropped from its queue when matching reaches it."""
+
+    def __init__(self):
+        self._queues = {ASK: {}, BID: {}}  # price -> deque of _RestingOrder
+        self._totals = {ASK: {}, BID: {}}  # price -> amount resting at that price
+        self._counts = {ASK: {}, BID: {}}  # price -> number of orders resting at that price
+        self._prices = {ASK: [], BID: []}  # ascending, so the best ask is the first one and the best bid the last one
+        self._orders = {}  # order_id -> _RestingOrder
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    def best_price(self, side):
+        prices = self._prices[side]
+        if not prices:
+            return None
+        return prices[0] if side is ASK else prices[-1]
+
+    def _crosses(self, side, price, limit_price):
+        if limit_price is None:
+            return True
+        return price <= limit_price if side is BID else price >= limit_price
+
+    def cost(self, side, amount, limit_price=None):
+        """Returns (amount, total) that an order would fill right now, without placing it. total is measured in the
+        quote currency"""
+        opposite = side.get_opposite()
+        prices = self._prices[opposite] if opposite is ASK else reversed(self._prices[opposite])
+        filled = total = 0
+        for price in prices:
+            if filled >= amount or not self._crosses(side, price, limit_price):
+                break
+            take = min(amount - filled, self._totals[opposite][price])
+            filled += take
+            total += take * price
+        return filled, total
+
+    def submit(self, side, amount, limit_price=None, owner=None, order_id=None):
+        """Matches an order against the opposite side and, if it's a limit order, rests whatever wasn't filled.
+
+        Returns (order_id, fills, remaining amount). Market orders (limit_price None) never rest"""
+        if order_id is None:
+            self._next_id += 1
+            order_id = self._next_id
+        opposite = side.get_opposite()
+        prices, queues, totals, counts = (self._prices[opposite], self._queues[opposite], self._totals[opposite],
+                                          self._counts[opposite])
+        fills = []
+        remaining = amount
+        while remaining > 0 and prices:
+            price = prices[0] if opposite is ASK else prices[-1]
+            if not self._crosses(side, price, limit_price):
+                break
+            queue = queues[price]
+            while remaining > 0 and queue:
+                maker = queue[0]
+                if maker.amount <= 0:  # cancelled
+                    queue.popleft()
+                    continue
+                take = min(remaining, maker.amount)
+                maker.amount -= take
+                remaining -= take
+                totals[price] -= take
+                fills.append(Fill(maker.order_id, order_id, side, price, take, maker.owner, owner))
+                if maker.amount <= 0:
+                    queue.popleft()
+                    del self._orders[maker.order_id]
+                    counts[price] -= 1
+            if counts[price] <= 0:
+                self._remove_level(opposite, price)
+        if remaining > 0 and limit_price is not None:
+            self._rest(_RestingOrder(order_id, side, limit_price, remaining, owner))
+        return order_id, fills, remaining
+
+    def _rest(self, order):
+        queues = self._queues[order.side]
+        if order.price not in queues:
+            queues[order.price] = deque()
+            self._totals[order.side][order.price] = 0
+            self._counts[order.side][order.price] = 0
+            insort(self._prices[order.side], order.price)
+        queues[order.price].append(order)
+        self._totals[order.side][order.price] += order.amount
+        self._counts[order.side][order.price] += 1
+        self._orders[order.order_id] = order
+
+    def _remove_level(self, side, price):
+        prices = self._prices[side]
+        del prices[bisect_left(prices, price)]
+        del self._queues[side][price]
+        del self._totals[side][price]
+        del self._counts[side][price]
+
+    def cancel(self, order_id):
+        """Cancels a resting order. Returns it, or None if it isn't resting anymore"""
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        self._totals[order.side][order.price] -= order.amount
+        self._counts[order.side][order.price] -= 1
+        if self._counts[order.side][order.price] <= 0:
+            self._remove_level(order.side, order.price)
+        cancelled = _RestingOrder(order.order_id, order.side, order.price, order.amount, order.owner)
+        order.amount = 0
+        return cancelled
+
+    def get_order(self, order_id):
+        return self._orders.get(order_id)
+
+    def clear(self, owner=None):
+        """Cancels every resting order of owner"""
+        for order_id in [order.order_id for order in self._orders.values() if order.owner == owner]:
+            self.cancel(order_id)
+
+    def book(self, depth=None):
+        """Returns the aggregated levels in the format of ExchangeClient.get_book"""
+        asks = self._prices[ASK][:depth]
+        bids = self._prices[BID][::-1][:depth]
+        return {ASK: [{'price': price, 'amount': self._totals[ASK][price]} for price in asks],
+                BID: [{'price': price, 'amount': self._totals[BID][price]} for price in bids]}
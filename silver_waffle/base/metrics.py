@@ -0,0 +1,352 @@
+import re
+import threading
+import weakref
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Buckets of the request latency histograms, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Metric:
+    """A metric and its children, one per combination of label values. labels() returns the child, which is what
+    gets updated. Hot paths should keep the child instead of looking it up every time:
+
+    updates = book_updates.labels('bitso', 'btc_mxn')
+    updates.inc()"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f'{self.name} takes the labels {self.labelnames}, not {values}')
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def children(self):
+        return list(self._children.items())
+
+    def _samples(self, values, child):
+        yield self.name, _format_labels(self.labelnames, values), child.value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.type}']
+        for values, child in sorted(self.children(), key=lambda item: item[0]):
+            for name, labels, value in self._samples(values, child):
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _samples(self, values, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            yield f'{self.name}_bucket', _format_labels(self.labelnames, values, [('le', _format_value(bound))]), \
+                cumulative
+        labels = _format_labels(self.labelnames, values)
+        yield f'{self.name}_sum', labels, total
+        yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of the bot, rendered in the Prometheus text format by render().
+
+    Updating a metric only takes a dictionary lookup and a lock, so they can be left on in production. The values
+    that are already kept somewhere else (queue sizes, thread counts, listener stats) aren't updated as they change:
+    collectors are functions that copy them into gauges when the metrics are rendered. Collectors that are bound
+    methods are only weakly referenced, so they don't keep their object alive."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f'{name} is already registered as a {metric.type} with the labels '
+                                 f'{metric.labelnames}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def add_collector(self, collector):
+        """collector(registry) is called every time the metrics are rendered"""
+        reference = weakref.WeakMethod(collector) if hasattr(collector, '__self__') else lambda: collector
+        with self._lock:
+            self._collectors.append(reference)
+
+    def collect(self):
+        with self._lock:
+            collectors = list(self._collectors)
+        for reference in collectors:
+            collector = reference()
+            if collector is None:
+                with self._lock:
+                    self._collectors.remove(reference)
+                continue
+            try:
+                collector(self)
+            except Exception as e:
+                print(f'Metrics collector {getattr(collector, "__name__", collector)} failed: {e!r}')
+
+    def render(self):
+        """Returns every metric in the Prometheus text format"""
+        self.collect()
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return '\n'.join(metric.render() for metric in metrics if metric.children()) + '\n'
+
+
+metrics = MetricsRegistry()
+
+request_latency = metrics.histogram('silver_waffle_request_duration_seconds',
+                                    'Duration of the requests to the exchanges, without the rate limiter wait',
+                                    ['exchange', 'endpoint'])
+request_errors = metrics.counter('silver_waffle_request_errors_total', 'Requests to the exchanges that failed',
+                                 ['exchange', 'endpoint'])
+book_updates = metrics.counter('silver_waffle_book_updates_total', 'Updates of the orderbook of a pair',
+                               ['exchange', 'pair'])
+book_changes = metrics.counter('silver_waffle_book_changes_total',
+                               'Updates of the orderbook of a pair that changed it', ['exchange', 'pair'])
+
+
+def pair_labels(pair):
+    """(exchange, pair) label values of a pair"""
+    exchange_client = getattr(pair, 'exchange_client', None)
+    return str(getattr(exchange_client, 'name', '')) if exchange_client is not None else '', str(pair.ticker)
+
+
+def _thread_group(name):
+    # 'Thread-3 (__update_book_daemon__)' -> '__update_book_daemon__', 'event_worker_2' -> 'event_worker'
+    match = re.fullmatch(r'Thread-\d+ \((.*)\)', name)
+    if match:
+        return match.group(1)
+    return re.sub(r'[_-]?\d+$', '', name) or name
+
+
+def collect_runtime(registry):
+    """Threads, the queues of the event bus and of the trigger engine, and the lock contention"""
+    from silver_waffle.base.exchange import ee
+    from silver_waffle.base.triggers import trigger_engine
+    from silver_waffle.base.locks import lock_stats
+
+    threads = registry.gauge('silver_waffle_threads', 'Live threads, by what they run', ['group'])
+    threads.clear()
+    for thread in threading.enumerate():
+        threads.labels(_thread_group(thread.name)).inc()
+
+    emitted = registry.counter('silver_waffle_events_emitted_total', 'Events emitted on the event bus', ['event'])
+    for event, count in ee.emitted().items():
+        emitted.labels(str(event)).value = count
+    registry.gauge('silver_waffle_events_pending', 'Events waiting to be handled by a listener').set(ee.pending)
+    listener_metrics = {
+        'handled': registry.counter('silver_waffle_listener_handled_total', 'Events handled by a listener',
+                                    ['listener']),
+        'dropped': registry.counter('silver_waffle_listener_dropped_total', 'Events dropped because the queue of a '
+                                    'listener was full', ['listener']),
+        'coalesced': registry.counter('silver_waffle_listener_coalesced_total', 'Events replaced by a newer one '
+                                      'before being handled', ['listener']),
+        'errors': registry.counter('silver_waffle_listener_errors_total', 'Events whose listener raised',
+                                   ['listener']),
+        'total_latency': registry.counter('silver_waffle_listener_latency_seconds_total', 'Time from the emit to '
+                                          'the end of the listener, added up', ['listener']),
+    }
+    queued = registry.gauge('silver_waffle_listener_queue_size', 'Events queued for a listener', ['listener'])
+    for func, stats, size in ee.queue_sizes():
+        name = getattr(func, '__qualname__', repr(func))
+        queued.labels(name).set(size)
+        for attribute, counter in listener_metrics.items():
+            counter.labels(name).value = getattr(stats, attribute)
+
+    registry.gauge('silver_waffle_trigger_queue_size', 'Trigger callbacks waiting for a worker').set(
+        trigger_engine._tasks.qsize())
+    registry.gauge('silver_waffle_triggers', 'Active price triggers').set(len(trigger_engine.triggers()))
+
+    wait = registry.gauge('silver_waffle_lock_wait_seconds', 'Time spent waiting for a lock', ['lock'])
+    contended = registry.gauge('silver_waffle_lock_contended', 'Acquisitions that had to wait for a lock', ['lock'])
+    wait.clear()
+    contended.clear()
+    for name, stats in lock_stats().items():
+        if stats.contended:
+            wait.labels(name).set(stats.total_wait)
+            contended.labels(name).set(stats.contended)
+
+
+metrics.add_collector(collect_runtime)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves the metrics of registry in the Prometheus text format at http://host:port/metrics, from a daemon
+    thread. It binds to localhost by default, since the metrics aren't meant to be public:
+
+    server = MetricsServer(port=9100).start()"""
+
+    def __init__(self, registry=metrics, host='127.0.0.1', port=9100):
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics_server')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(port=9100, host='127.0.0.1', registry=metrics):
+    return MetricsServer(registry, host=host, port=port).start()
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+from bisect import insort
+from collections import OrderedDict, namedtuple
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.exchange import Order, ee
+
+# Statuses of an order update. CLOSED is used when the stream doesn't tell if the order was filled or cancelled
+OPEN, FILLED, CANCELLED, CLOSED = 'open', 'filled', 'cancelled', 'closed'
+CCXT_STATUSES = {'open': OPEN, 'closed': FILLED, 'canceled': CANCELLED, 'cancelled': CANCELLED, 'expired': CANCELLED,
+                 'rejected': CANCELLED}
+
+Trade = namedtuple('Trade', ['pair', 'order_id', 'side', 'price', 'amount', 'fee', 'timestamp'])
+
+
+class OrderTracker:
+    """Keeps Pair.orders up to date one update at a time, from the order and fill messages of a private stream, so
+    that get_active_orders doesn't have to be polled.
+
+    start(pair) loads the open orders once with get_active_orders. From then on, Pair.update_active_orders doesn't
+    poll that pair anymore, and every update changes, inserts or removes a single Order of Pair.orders (which stay
+    sorted like update_active_orders sorts them). Every update emits 'order_updated' (pair, order, status) and
+    every fill emits 'order_filled' (pair, trade).
+
+    Fills only change the amount of the orders if amounts_from_fills is True, which the exchange clients set when
+    they stream fills but not orders, since order updates already carry the remaining amount."""
+
+    def __init__(self, exchange_client):
+        self.exchange_client = exchange_client
+        self.streaming = set()  # pairs whose orders are kept up to date by a stream
+        self.amounts_from_fills = False
+        self.updates = 0
+        self.fills = 0
+        self.max_trade_ids = 10000
+        self._trade_ids = OrderedDict()  # ids of the last fills, since some streams send the same fill more than once
+        self._lock = threading.RLock()
+
+    def is_streaming(self, pair):
+        return pair in self.streaming
+
+    def start(self, pair, snapshot=True):
+        """Starts tracking pair. If snapshot is True, its open orders are loaded first with get_active_orders"""
+        if pair in self.streaming:
+            return
+        if snapshot:
+            pair.update_active_orders(force=True)
+        self.streaming.add(pair)
+
+    def stop(self, pair):
+        self.streaming.discard(pair)
+
+    @staticmethod
+    def get_order(pair, order_id):
+        for side in [ASK, BID]:
+            for order in pair.orders[side]:
+                if order.order_id == order_id:
+                    return order
+        return None
+
+    @staticmethod
+    def _remove(pair, order):
+        orders = pair.orders[order.side]
+        for i, other in enumerate(orders):
+            if other is order:
+                del orders[i]
+                return
+
+    def add(self, pair, order):
+        """Adds an order that was just created, unless the stream already added it. Returns the tracked order"""
+        with self._lock:
+            existing = self.get_order(pair, order.order_id) if order.order_id is not None else None
+            if existing is not None:
+                return existing
+            insort(pair.orders[order.side], order)
+            return order
+
+    def on_order_update(self, pair, order_id, side, price, remaining, status, known_only=False):
+        """Applies the new state of an order. remaining is the amount that is still open. If known_only is True,
+        updates of orders that aren't being tracked are ignored (for streams that also carry the orders of other
+        traders). Returns the updated Order, or None if nothing changed"""
+        remaining = float(remaining)
+        with self._lock:
+            order = self.get_order(pair, order_id)
+            if status == OPEN and remaining > 0:
+                if order is not None and order.amount == remaining:
+                    return None
+                if order is None and known_only:
+                    return None
+                if order is not None:
+                    self._remove(pair, order)
+                    side, price = order.side, order.price
+                order = Order(price, side, remaining, order_id=order_id, pair=pair)
+                insort(pair.orders[side], order)
+            elif order is not None:
+                self._remove(pair, order)
+            else:
+                return None
+            self.updates += 1
+        ee.emit('order_updated', pair, order, status)
+        return order
+
+    def on_fill(self, pair, order_id, side, price, amount, fee=0, timestamp=None, trade_id=None):
+        """Records a fill of one of the orders of the account. Returns the Trade, or None if trade_id was seen
+        already"""
+        trade = Trade(pair, order_id, side, float(price), float(amount), float(fee or 0), timestamp)
+        with self._lock:
+            if trade_id is not None:
+                if trade_id in self._trade_ids:
+                    return None
+                self._trade_ids[trade_id] = None
+                if len(self._trade_ids) > self.max_trade_ids:
+                    self._trade_ids.popitem(last=False)
+            self.fills += 1
+            order = self.get_order(pair, order_id) if self.amounts_from_fills else None
+        if order is not None:
+            remaining = order.amount - trade.amount
+            self.on_order_update(pair, order_id, order.side, order.price, remaining, OPEN if remaining > 0 else FILLED)
+        ee.emit('order_filled', pair, trade)
+        return trade
+
+    def replace(self, pair, orders):
+        """Applies a full list of the open orders of pair, like the ones some streams send on every change, as
+        individual updates. Orders that aren't in the list anymore are reported as CLOSED"""
+        with self._lock:
+            current = {order.order_id for side in [ASK, BID] for order in pair.orders[side]}
+            for order in orders:
+                self.on_order_update(pair, order.order_id, order.side, order.price, order.amount, OPEN)
+            for order_id in current - {order.order_id for order in orders}:
+                order = self.get_order(pair, order_id)
+                if order is not None:
+                    self.on_order_update(pair, order_id, order.side, order.price, 0, CLOSED)
+
+    def on_ccxt_order(self, pair, order):
+        """Applies an order in the format of ccxt (as returned by watch_orders)"""
+        status = CCXT_STATUSES.get(order.get('status'), CLOSED)
+        remaining = order.get('remaining')
+        if remaining is None:
+            remaining = order.get('amount') or 0
+        return self.on_order_update(pair, order['id'], ASK if order['side'] == 'sell' else BID, order.get('price') or 0,
+                                    remaining if status == OPEN else 0, status)
+
+    def on_ccxt_trade(self, pair, trade):
+        """Applies a trade in the format of ccxt (as returned by watch_my_trades)"""
+        fee = (trade.get('fee') or {}).get('cost')
+        timestamp = trade['timestamp'] / 1000 if trade.get('timestamp') else None
+        return self.on_fill(pair, trade.get('order'), ASK if trade['side'] == 'sell' else BID, trade['price'],
+                            trade['amount'], fee, timestamp, trade_id=trade.get('id'))
+
+
+class CcxtOrderStream:
+    """Private order and fill stream of the venues that ccxt.pro supports (watch_orders and watch_my_trades). The
+    watchers of every pair run on an event loop in a daemon thread, and feed the OrderTracker of the exchange client"""
+
+    def __init__(self, exchange_client):
+        import ccxt.pro
+        ccxt_client = exchange_client.ccxt_client
+        self.exchange_client = exchange_client
+        self.tracker = exchange_client.order_tracker
+        self.client = getattr(ccxt.pro, ccxt_client.id)({'apiKey': ccxt_client.apiKey, 'secret': ccxt_client.secret,
+                                                         'password': ccxt_client.password, 'uid': ccxt_client.uid})
+        self.retry_delay = 1
+        self._futures = {}  # pair -> [concurrent.futures.Future]
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, name=f'{exchange_client.name}_order_stream')
+        thread.daemon = True
+        thread.start()
+
+    @staticmethod
+    def is_supported(exchange_client):
+        ccxt_client_id = getattr(getattr(exchange_client, 'ccxt_client', None), 'id', None)
+        if ccxt_client_id is None:
+            return False
+        try:
+            import ccxt.pro
+        except ImportError:
+            return False
+        return hasattr(ccxt.pro, ccxt_client_id) and bool(getattr(ccxt.pro, ccxt_client_id).has.get('watchOrders'))
+
+    def watch(self, pair, orders=True, transactions=True):
+        if pair in self._futures:
+            return
+        coroutines = []
+        if orders:
+            coroutines.append(self._watch(self.client.watch_orders, self.tracker.on_ccxt_order, pair))
+        if transactions and self.client.has.get('watchMyTrades'):
+            coroutines.append(self._watch(self.client.watch_my_trades, self.tracker.on_ccxt_trade, pair))
+        self._futures[pair] = [asyncio.run_coroutine_threadsafe(coroutine, self.loop) for coroutine in coroutines]
+
+    def unwatch(self, pair):
+        for future in self._futures.pop(pair, []):
+            future.cancel()
+
+    async def _watch(self, watch, apply, pair):
+        while True:
+            try:
+                items = await watch(pair.ticker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'{self.exchange_client.name} order stream of {pair.ticker} failed: {e!r}')
+                await asyncio.sleep(self.retry_delay)
+                continue
+            for item in items:
+                apply(pair, item)
@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import threading
+from time import time
+from silver_waffle.utilities import _is_symbol_a_cryptocurrency, write_json_atomically
+
+# Where enable_persistence() saves the prices. The SILVER_WAFFLE_PRICE_CACHE environment variable overrides it, and
+# setting it to an empty string turns persistence off
+DEFAULT_PATH = os.environ.get('SILVER_WAFFLE_PRICE_CACHE',
+                              os.path.join(os.path.expanduser('~'), '.silver_waffle', 'global_prices.json'))
+
+
+class PriceCache:
+    """Process wide cache of global prices (how much 1 unit of a currency is worth in USD), shared by every Currency
+    with the same symbol regardless of its exchange.
+
+    Prices younger than ttl seconds (fiat_ttl for fiat currencies, which barely move) are served from memory. Older
+    ones are still served while they get refreshed in the background, unless they are older than max_stale seconds,
+    in which case the caller waits for the new price. If path is set, the cache is persisted there (only when a
+    price changed), so that a restart doesn't have to look up every price again before the bot is usable."""
+
+    def __init__(self, ttl=120, fiat_ttl=6 * 3600, max_stale=24 * 3600, path=None, save_interval=30):
+        self.ttl = ttl
+        self.fiat_ttl = fiat_ttl
+        self.max_stale = max_stale
+        self.path = path
+        self.save_interval = save_interval
+        self._entries = None  # SYMBOL -> (price, timestamp)
+        self._refreshing = set()
+        self._last_save = 0
+        self._dirty = False  # True when there are prices that weren't saved yet
+        self._save_at_exit = False
+        self._lock = threading.RLock()
+
+    def ttl_for(self, symbol):
+        return self.ttl if _is_symbol_a_cryptocurrency(symbol.upper()) else self.fiat_ttl
+
+    def get(self, symbol, loader):
+        """Returns the price of symbol. loader is called (without arguments) to get the price when it isn't cached or
+        when it's stale"""
+        symbol = symbol.upper()
+        entry = self.peek(symbol)
+        if entry is not None:
+            price, timestamp = entry
+            age = time() - timestamp
+            if age < self.ttl_for(symbol):
+                return price
+            if age < self.max_stale:
+                self._refresh_in_background(symbol, loader)
+                return price
+        return self.refresh(symbol, loader)
+
+    def peek(self, symbol):
+        """Returns the cached (price, timestamp) of symbol, or None if it isn't cached"""
+        with self._lock:
+            self._load()
+            return self._entries.get(symbol.upper())
+
+    def set(self, symbol, price, timestamp=None):
+        with self._lock:
+            self._load()
+            self._entries[symbol.upper()] = (price, time() if timestamp is None else timestamp)
+            self._dirty = True
+            if time() - self._last_save > self.save_interval:
+                self.save()
+
+    def refresh(self, symbol, loader):
+        """Calls loader and caches its result, whatever the age of the current price is"""
+        price = loader()
+        self.set(symbol, price)
+        return price
+
+    def _refresh_in_background(self, symbol, loader):
+        with self._lock:
+            if symbol in self._refreshing:
+                return
+            self._refreshing.add(symbol)
+
+        def refresh():
+            try:
+                self.refresh(symbol, loader)
+            except Exception:
+                pass  # we keep serving the stale price
+            finally:
+                with self._lock:
+                    self._refreshing.discard(symbol)
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    def _read(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as file:
+                return {symbol: tuple(entry) for symbol, entry in json.load(file).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = self._read()
+
+    def set_path(self, path):
+        """Persists the cache to path (None turns persistence off). The prices saved there are loaded, unless there
+        is a newer one in memory"""
+        with self._lock:
+            self.path = path
+            if self._entries is None:
+                return
+            for symbol, entry in self._read().items():
+                if symbol not in self._entries or self._entries[symbol][1] < entry[1]:
+                    self._entries[symbol] = entry
+
+    def enable_persistence(self, path=DEFAULT_PATH):
+        """Persists the cache to path, and saves it when the process exits. It does nothing if a path was already set
+        or if path is empty. The exchange clients call it when they look up the global prices"""
+        with self._lock:
+            if self.path or not path:
+                return
+            self.set_path(path)
+            if not self._save_at_exit:
+                self._save_at_exit = True
+                atexit.register(self.save)
+
+    def save(self):
+        """Writes the cache to disk if a price changed since the last save. It's done automatically every
+        save_interval seconds when prices change"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._load()
+            entries = dict(self._entries)
+            self._last_save = time()
+            self._dirty = False
+        try:
+            write_json_atomically(self.path, entries)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+price_cache = PriceCache()
@@ -0,0 +1,188 @@
+import asyncio
+import functools
+import inspect
+import threading
+from collections import deque
+from time import monotonic
+import requests
+import ccxt
+from silver_waffle.base.metrics import request_latency, request_errors
+
+# Lower numbers are served first
+PRIORITY_ORDERS = 0  # Creating and cancelling orders
+PRIORITY_ACCOUNT = 1  # Balances and open orders
+PRIORITY_MARKET_DATA = 2  # Books, markets and tickers
+
+
+class RateLimiter:
+    """Token bucket holding up to burst requests, refilled at rate requests per second.
+
+    Every request takes cost tokens, and waits until they are available. A fraction of the bucket (reserve) is
+    kept for the more important priorities. For example, market data can only be fetched while more than
+    reserve[PRIORITY_MARKET_DATA] * burst tokens are left. Requests also wait while a more important request is
+    waiting. So when the budget runs out, polling slows down without delaying order placement.
+
+    utilization() is the share of the rate that was used in the last window seconds. max_pollable_pairs() tells
+    how many books one API key can keep up to date."""
+
+    DEFAULT_RESERVE = {PRIORITY_ORDERS: 0, PRIORITY_ACCOUNT: 0.1, PRIORITY_MARKET_DATA: 0.25}
+
+    def __init__(self, rate, burst=None, reserve=None, window=60):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.reserve = dict(self.DEFAULT_RESERVE if reserve is None else reserve)
+        self.window = window
+        self.tokens = self.burst
+        self._last_refill = monotonic()
+        self._paused_until = 0
+        self._waiting = {priority: 0 for priority in self.reserve}
+        self._history = deque()  # (timestamp, cost)
+        self.requests = {priority: 0 for priority in self.reserve}
+        self.waited = {priority: 0 for priority in self.reserve}  # seconds spent waiting for tokens
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _time_until_available(self, priority, cost, now):
+        if now < self._paused_until:
+            return self._paused_until - now
+        if any(self._waiting[other] for other in self._waiting if other < priority):
+            return 1 / self.rate
+        floor = self.reserve.get(priority, 0) * self.burst
+        missing = floor + min(cost, self.burst) - self.tokens
+        return max(0, missing / self.rate)
+
+    def _take(self, priority, cost, now):
+        self.tokens -= cost
+        self.requests[priority] = self.requests.get(priority, 0) + 1
+        self._history.append((now, cost))
+        while self._history and self._history[0][0] < now - self.window:
+            self._history.popleft()
+
+    def try_acquire(self, priority=PRIORITY_MARKET_DATA, cost=1):
+        """Takes the tokens if they are available. Returns how many seconds to wait before trying again otherwise,
+        or 0 if they were taken"""
+        with self._condition:
+            now = monotonic()
+            self._refill(now)
+            delay = self._time_until_available(priority, cost, now)
+            if delay == 0:
+                self._take(priority, cost, now)
+            return delay
+
+    def acquire(self, priority=PRIORITY_MARKET_DATA, cost=1):
+        """Blocks until the tokens are available and takes them"""
+        start = monotonic()
+        with self._condition:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+            try:
+                while True:
+                    now = monotonic()
+                    self._refill(now)
+                    delay = self._time_until_available(priority, cost, now)
+                    if delay == 0:
+                        self._take(priority, cost, now)
+                        break
+                    self._condition.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+                self._condition.notify_all()
+        self.waited[priority] = self.waited.get(priority, 0) + monotonic() - start
+
+    async def async_acquire(self, priority=PRIORITY_MARKET_DATA, cost=1):
+        start = monotonic()
+        while True:
+            delay = self.try_acquire(priority, cost)
+            if delay == 0:
+                break
+            await asyncio.sleep(delay)
+        self.waited[priority] = self.waited.get(priority, 0) + monotonic() - start
+
+    def back_off(self, seconds=None):
+        """Called when the exchange answers that we went over its limits: empties the bucket and stops every request
+        for seconds (by default, the time it takes to refill the bucket)"""
+        with self._condition:
+            self.tokens = 0
+            self._last_refill = monotonic()
+            self._paused_until = self._last_refill + (seconds if seconds is not None else self.burst / self.rate)
+
+    def utilization(self):
+        """Share of the rate used in the last window seconds, from 0 to 1"""
+        with self._condition:
+            now = monotonic()
+            used = sum(cost for timestamp, cost in self._history if timestamp >= now - self.window)
+        return used / (self.rate * self.window)
+
+    def max_pollable_pairs(self, poll_interval, requests_per_poll=1):
+        """How many books can be polled every poll_interval seconds with the tokens left for market data"""
+        share = 1 - self.reserve.get(PRIORITY_MARKET_DATA, 0)
+        return int(self.rate * share * poll_interval / requests_per_poll)
+
+    def __repr__(self):
+        return f'RateLimiter(rate={self.rate}/s, burst={self.burst}, utilization={self.utilization():.0%})'
+
+
+def is_rate_limit_error(exception):
+    if isinstance(exception, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+        return True
+    response = getattr(exception, 'response', None)
+    return isinstance(exception, requests.exceptions.HTTPError) and response is not None and \
+        response.status_code == 429
+
+
+def _retry_after(exception):
+    response = getattr(exception, 'response', None)
+    try:
+        return float(response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _request_failed(exchange_client, function, exception):
+    limiter = getattr(exchange_client, 'rate_limiter', None)
+    if limiter is not None and is_rate_limit_error(exception):
+        limiter.back_off(_retry_after(exception))
+    request_errors.labels(str(getattr(exchange_client, 'name', '')), function.__name__).inc()
+
+
+def _request_finished(exchange_client, function, start):
+    request_latency.labels(str(getattr(exchange_client, 'name', '')), function.__name__).observe(monotonic() - start)
+
+
+def rate_limited(priority, cost=1):
+    """Makes an ExchangeClient method take cost tokens from self.rate_limiter before running. Put it under @retry,
+    so that every attempt waits for its tokens. The duration of every attempt, without the wait, is recorded in the
+    request_latency histogram (see metrics), labelled with the name of the exchange and of the method"""
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(self, *args, **kwargs):
+                limiter = getattr(self, 'rate_limiter', None)
+                if limiter is not None:
+                    await limiter.async_acquire(priority, cost)
+                start = monotonic()
+                try:
+                    return await function(self, *args, **kwargs)
+                except Exception as e:
+                    _request_failed(self, function, e)
+                    raise
+                finally:
+                    _request_finished(self, function, start)
+        else:
+            @functools.wraps(function)
+            def wrapper(self, *args, **kwargs):
+                limiter = getattr(self, 'rate_limiter', None)
+                if limiter is not None:
+                    limiter.acquire(priority, cost)
+                start = monotonic()
+                try:
+                    return function(self, *args, **kwargs)
+                except Exception as e:
+                    _request_failed(self, function, e)
+                    raise
+                finally:
+                    _request_finished(self, function, start)
+        return wrapper
+    return decorator
@@ -0,0 +1,316 @@
+import json
+import os
+import queue
+import re
+import threading
+from datetime import datetime, timezone
+from time import time_ns
+import numpy as np
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.utilities import write_json_atomically
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.silver_waffle', 'recordings')
+
+# Kinds of record
+BOOK_RESET = 0  # the levels of the stream are cleared, the BOOK_LEVEL records that follow rebuild them
+BOOK_LEVEL = 1
+BALANCE = 2
+ORDER_CREATED = 3
+ORDER_CANCELLED = 4
+
+SIDE_CODES = {ASK: 1, BID: -1}
+SIDES_BY_CODE = {code: side for side, code in SIDE_CODES.items()}
+NO_REFERENCE = 2 ** 32 - 1
+
+# timestamp: nanoseconds since the epoch, never decreasing within a file
+# stream: position of the pair ('pair:<ticker>') or currency ('currency:<symbol>') in the 'streams' list of the index
+# ref: version of the book for BOOK_RESET/BOOK_LEVEL, position of the order id in the 'order_ids' list of the index
+#      for orders
+# price/amount: level price and new amount (0 if the level was removed) for BOOK_LEVEL, order price and amount for
+#               orders (price is nan for market orders), available and locked balance for BALANCE
+# side: 1 for ASK, -1 for BID, 0 for balances
+RECORD_DTYPE = np.dtype([('timestamp', '<i8'), ('price', '<f8'), ('amount', '<f8'), ('stream', '<u4'),
+                         ('ref', '<u4'), ('kind', 'u1'), ('side', 'i1')], align=True)
+
+NANOSECONDS_PER_DAY = 24 * 3600 * 10 ** 9
+
+active_recorders = []  # the orderbooks, currencies and pairs hand their updates to every recorder in here
+
+
+def _file_name(name):
+    return re.sub(r'[^\w.-]', '_', str(name).lower())
+
+
+def _exchange_name(obj):
+    exchange_client = getattr(obj, 'exchange_client', None)
+    return str(exchange_client) if exchange_client is not None else 'unknown'
+
+
+def _changed_levels(old, new):
+    """Returns the prices and amounts of the levels of new that are different in old, followed by the levels of old
+    that aren't in new with an amount of 0"""
+    new_prices, new_amounts = new
+    if new_prices is None:
+        new_prices = new_amounts = np.empty(0, dtype=np.float64)
+    if old is None or old[0] is None or not len(old[0]):
+        return new_prices, new_amounts
+    old_prices, old_amounts = old
+    order = np.argsort(old_prices)
+    sorted_prices, sorted_amounts = old_prices[order], old_amounts[order]
+    positions = np.minimum(np.searchsorted(sorted_prices, new_prices), len(sorted_prices) - 1)
+    changed = (sorted_prices[positions] != new_prices) | (sorted_amounts[positions] != new_amounts)
+    removed = np.isin(old_prices, new_prices, invert=True)
+    return (np.concatenate([new_prices[changed], old_prices[removed]]),
+            np.concatenate([new_amounts[changed], np.zeros(int(removed.sum()))]))
+
+
+class _DayFile:
+    """Records of one exchange and day. The records are appended to <day>.bin and the streams and order ids they
+    reference are kept in <day>.json"""
+
+    def __init__(self, directory, day):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{day}.bin')
+        self.index_path = os.path.join(directory, f'{day}.json')
+        index = read_index(self.index_path)
+        self.streams = index['streams']
+        self.order_ids = index['order_ids']
+        self.last_timestamp = index['last_timestamp']
+        self.stream_ids = {name: i for i, name in enumerate(self.streams)}
+        self.order_id_refs = {order_id: i for i, order_id in enumerate(self.order_ids)}
+        self.books = {}  # stream id -> {ASK: (prices, amounts), BID: (prices, amounts)} as last recorded
+        self.pending = []
+        self.file = open(self.path, 'ab')
+
+    def stream_id(self, name):
+        if name not in self.stream_ids:
+            self.stream_ids[name] = len(self.streams)
+            self.streams.append(name)
+        return self.stream_ids[name]
+
+    def order_ref(self, order_id):
+        if order_id is None:
+            return NO_REFERENCE
+        order_id = str(order_id)
+        if order_id not in self.order_id_refs:
+            self.order_id_refs[order_id] = len(self.order_ids)
+            self.order_ids.append(order_id)
+        return self.order_id_refs[order_id]
+
+    def timestamp(self, timestamp):
+        self.last_timestamp = max(timestamp, self.last_timestamp)
+        return self.last_timestamp
+
+    def add(self, timestamp, stream, kind, side=0, ref=NO_REFERENCE, prices=(np.nan,), amounts=(0,)):
+        records = np.zeros(len(prices), dtype=RECORD_DTYPE)
+        records['timestamp'] = self.timestamp(timestamp)
+        records['stream'] = stream
+        records['kind'] = kind
+        records['side'] = side
+        records['ref'] = ref
+        records['price'] = prices
+        records['amount'] = amounts
+        self.pending.append(records)
+
+    def add_book(self, timestamp, stream, version, levels):
+        ref = version % NO_REFERENCE
+        previous = self.books.get(stream)
+        if previous is None:
+            # Every recording session starts its books from scratch, so a file can be read without the previous ones
+            self.add(timestamp, stream, BOOK_RESET, ref=ref, prices=(np.nan,), amounts=(0,))
+            previous = {ASK: None, BID: None}
+        for side in [ASK, BID]:
+            prices, amounts = _changed_levels(previous[side], levels[side])
+            if len(prices):
+                self.add(timestamp, stream, BOOK_LEVEL, side=SIDE_CODES[side], ref=ref, prices=prices,
+                         amounts=amounts)
+        self.books[stream] = levels
+
+    def write(self):
+        if not self.pending:
+            return 0
+        records = np.concatenate(self.pending)
+        self.pending = []
+        # The index goes first, so that the records on disk never reference a stream the index doesn't know
+        write_json_atomically(self.index_path, {'streams': self.streams, 'order_ids': self.order_ids,
+                                                'last_timestamp': self.last_timestamp})
+        self.file.write(records.tobytes())
+        self.file.flush()
+        return len(records)
+
+    def close(self):
+        self.write()
+        self.file.close()
+
+
+class Recorder:
+    """Records every orderbook update, balance update and order created or cancelled into an append-only binary
+    log, with one file per exchange and UTC day under directory/<exchange>/<day>.bin.
+
+    The threads that update the books only put the new levels in a queue; a writer thread turns them into records
+    every flush_interval seconds. Book levels are delta encoded: a BOOK_LEVEL record is only written for the levels
+    that changed since the last recorded version of the book. See RECORD_DTYPE for the layout of a record, and
+    Recording to read them back.
+
+    with Recorder():
+        ...  # everything is recorded until the block exits"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, flush_interval=0.5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self._queue = queue.SimpleQueue()
+        self._files = {}  # (exchange name, day) -> _DayFile
+        self._day = None
+        self._day_end = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self not in active_recorders:
+            active_recorders.append(self)
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.__writer_daemon__, name='recorder')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops recording, writes whatever is still queued and closes the files"""
+        if self in active_recorders:
+            active_recorders.remove(self)
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._drain()
+            for day_file in self._files.values():
+                day_file.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def record_book(self, pair, version, asks, bids):
+        """asks and bids are (prices, amounts) arrays, which are never modified in place by the orderbook"""
+        self._queue.put((BOOK_LEVEL, time_ns(), pair, version, asks, bids))
+
+    def record_balance(self, currency, available, locked):
+        self._queue.put((BALANCE, time_ns(), currency, float(available), float(locked)))
+
+    def record_order(self, kind, pair, side, price, amount, order_id=None):
+        self._queue.put((kind, time_ns(), pair, side, price, amount, order_id))
+
+    def flush(self):
+        """Writes every queued update to disk. Returns how many records were written"""
+        with self._lock:
+            return self._drain()
+
+    def _day_file(self, exchange_name, timestamp):
+        if not self._day_end - NANOSECONDS_PER_DAY <= timestamp < self._day_end:
+            self._day = datetime.fromtimestamp(timestamp / 10 ** 9, timezone.utc).strftime('%Y-%m-%d')
+            self._day_end = (timestamp // NANOSECONDS_PER_DAY + 1) * NANOSECONDS_PER_DAY
+        key = (exchange_name, self._day)
+        if key not in self._files:
+            self._files[key] = _DayFile(os.path.join(self.directory, _file_name(exchange_name)), self._day)
+        return self._files[key]
+
+    def _drain(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            kind, timestamp, obj = item[:3]
+            day_file = self._day_file(_exchange_name(obj), timestamp)
+            if kind == BOOK_LEVEL:
+                version, asks, bids = item[3:]
+                day_file.add_book(timestamp, day_file.stream_id(f'pair:{obj.ticker}'), version, {ASK: asks, BID: bids})
+            elif kind == BALANCE:
+                available, locked = item[3:]
+                day_file.add(timestamp, day_file.stream_id(f'currency:{obj.symbol}'), BALANCE,
+                             prices=(available,), amounts=(locked,))
+            else:
+                side, price, amount, order_id = item[3:]
+                day_file.add(timestamp, day_file.stream_id(f'pair:{obj.ticker}'), kind, side=SIDE_CODES[side],
+                             ref=day_file.order_ref(order_id), prices=(np.nan if price is None else price,),
+                             amounts=(amount,))
+        written = 0
+        for key, day_file in list(self._files.items()):
+            written += day_file.write()
+            if key[1] != self._day:
+                day_file.close()
+                del self._files[key]
+        self.recorded += written
+        return written
+
+    def __writer_daemon__(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Couldn't write the recording: {e!r}")
+
+
+def read_index(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {'streams': [], 'order_ids': [], 'last_timestamp': 0}
+
+
+class Recording:
+    """A day of records of an exchange, as written by Recorder. records is a read-only structured array (see
+    RECORD_DTYPE) mapped straight from the file, so nothing is copied until it's accessed, and slicing it or taking one
+    of its columns (records['price']) returns views.
+
+    recording = Recording.open('binance', '2021-05-01')
+    btc = recording.select('pair:BTC/USDT', kind=BOOK_LEVEL)"""
+
+    def __init__(self, path):
+        self.path = path
+        index = read_index(path[:-len('.bin')] + '.json')
+        self.streams = index['streams']
+        self.order_ids = index['order_ids']
+        self.stream_ids = {name: i for i, name in enumerate(self.streams)}
+        # A record might be half written if the recorder is still running
+        count = os.path.getsize(path) // RECORD_DTYPE.itemsize if os.path.exists(path) else 0
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    @classmethod
+    def open(cls, exchange_name, day, directory=DEFAULT_DIRECTORY):
+        return cls(os.path.join(directory, _file_name(exchange_name), f'{day}.bin'))
+
+    def __len__(self):
+        return len(self.records)
+
+    def between(self, start=None, end=None):
+        """Returns a view of the records with start <= timestamp < end (in nanoseconds since the epoch)"""
+        timestamps = self.records['timestamp']
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side='left'))
+        return self.records[first:last]
+
+    def select(self, stream, kind=None):
+        """Returns a copy of the records of a stream ('pair:<ticker>' or 'currency:<symbol>'), optionally only the
+        ones of the given kind"""
+        if stream not in self.stream_ids:
+            return self.records[:0]
+        mask = self.records['stream'] == self.stream_ids[stream]
+        if kind is not None:
+            mask &= self.records['kind'] == kind
+        return self.records[mask]
+
+    def order_id(self, record):
+        ref = int(record['ref'])
+        return None if ref == NO_REFERENCE else self.order_ids[ref]
@@ -0,0 +1,47 @@
+import threading
+
+
+class Registry:
+    """Case insensitive indexes of currencies by symbol and of pairs by ticker.
+
+    Each ExchangeClient has its own registry, where a symbol maps to a single currency. The global_registry groups
+    the currencies of every exchange by symbol, see group()."""
+
+    def __init__(self):
+        self.currencies_by_symbol = {}  # lowercase symbol -> first Currency registered with that symbol
+        self.pairs_by_ticker = {}  # lowercase ticker -> Pair
+        self._groups = {}  # lowercase symbol -> every Currency registered with that symbol
+        self._lock = threading.Lock()
+
+    def register_currency(self, currency):
+        """Adds a currency to the indexes. Returns False if it was already registered"""
+        symbol = currency.symbol.lower()
+        with self._lock:
+            group = self._groups.setdefault(symbol, [])
+            if any(registered is currency for registered in group):
+                return False
+            group.append(currency)
+            self.currencies_by_symbol.setdefault(symbol, currency)
+        return True
+
+    def register_pair(self, pair):
+        """Adds a pair and its currencies to the indexes"""
+        self.pairs_by_ticker[pair.ticker.lower()] = pair
+        self.register_currency(pair.base)
+        self.register_currency(pair.quote)
+
+    def get_currency(self, symbol):
+        return self.currencies_by_symbol.get(symbol.lower())
+
+    def get_pair(self, ticker):
+        return self.pairs_by_ticker.get(ticker.lower())
+
+    def group(self, symbol):
+        """Returns every currency registered with the given symbol"""
+        return list(self._groups.get(symbol.lower(), ()))
+
+    def __len__(self):
+        return len(self.currencies_by_symbol)
+
+
+global_registry = Registry()
@@ -0,0 +1,161 @@
+import itertools
+import re
+import numpy as np
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.exchange import Order, ee
+from silver_waffle.base.exchange_client import OfflineExchangeClient
+from silver_waffle.base.clock import VirtualClock, set_clock
+from silver_waffle.base.recorder import BOOK_RESET, BOOK_LEVEL, BALANCE, SIDES_BY_CODE
+
+
+def events_from_recording(recording):
+    """Turns a Recording into the events that ReplayExchangeClient replays. The records written for the same update
+    (same stream, kind, timestamp and version) become a single event"""
+    records = recording.records
+    if not len(records):
+        return
+    keys = [records[field] for field in ('timestamp', 'stream', 'kind', 'ref')]
+    boundaries = np.flatnonzero(np.logical_or.reduce([key[1:] != key[:-1] for key in keys])) + 1
+    starts = [0] + boundaries.tolist()
+    ends = boundaries.tolist() + [len(records)]
+    snapshot = None  # (name, timestamp, ref, book) of the BOOK_RESET that is being rebuilt
+    for start, end in zip(starts, ends):
+        group = records[start:end]
+        first = group[0]
+        timestamp = int(first['timestamp']) / 10 ** 9
+        kind, ref = int(first['kind']), int(first['ref'])
+        name = recording.streams[int(first['stream'])].partition(':')[2]
+        if snapshot is not None and (snapshot[:3] != (name, timestamp, ref) or kind != BOOK_LEVEL):
+            yield snapshot[1], 'book', snapshot[0], snapshot[3]
+            snapshot = None
+        if kind == BOOK_RESET:
+            snapshot = (name, timestamp, ref, {ASK: [], BID: []})
+        elif kind == BOOK_LEVEL:
+            changes = [(SIDES_BY_CODE[side], price, amount) for side, price, amount
+                       in zip(group['side'].tolist(), group['price'].tolist(), group['amount'].tolist())]
+            if snapshot is not None:
+                for side, price, amount in changes:
+                    snapshot[3][side].append({'price': price, 'amount': amount})
+            else:
+                yield timestamp, 'diff', name, changes
+        elif kind == BALANCE:
+            yield timestamp, 'balance', name, (float(group['price'][-1]), float(group['amount'][-1]))
+    if snapshot is not None:
+        yield snapshot[1], 'book', snapshot[0], snapshot[3]
+
+
+def _definition_from_ticker(ticker):
+    base, quote = re.split(r'[/_-]', ticker, maxsplit=1)
+    return {'ticker': ticker, 'base': base, 'quote': quote, 'minimum_step': 0, 'active': True}
+
+
+class ReplayExchangeClient(OfflineExchangeClient):
+    """Exchange whose books and balances come from historical data instead of a venue.
+
+    events is an iterable of (timestamp, kind, ticker or symbol, payload) tuples sorted by timestamp, in seconds:
+    - (timestamp, 'book', ticker, {ASK: [...], BID: [...]}) replaces the book of the pair
+    - (timestamp, 'diff', ticker, [(side, price, amount), ...]) applies level changes to the book of the pair
+    - (timestamp, 'balance', symbol, (available, locked)) sets the balance of a currency
+    A Recording can be passed as well. The events go through the real Pair, Orderbook and Currency objects, so the
+    usual 'book_changed' and 'updated_balance' events are emitted.
+
+    Time is kept by a VirtualClock, which replaces the global clock from the moment the client is created until
+    close() is called, so the strategies (and anything else that uses silver_waffle.base.clock) sleep in virtual
+    time, including the ones started before run():
+
+    with ReplayExchangeClient(Recording.open('binance', '2021-05-01')) as client:
+        AutoExecute(pair=client.get_pair_by_ticker('BTC/USDT'), price=50000, side=ASK)
+        client.run()
+
+    Orders are accepted and kept as active orders, but they are never filled. markets, balances and global_prices
+    are the same as in OfflineExchangeClient. By default, markets are guessed from the tickers of the events, which
+    means reading them all up front unless they come from a Recording."""
+
+    def __init__(self, events, markets=None, balances=None, global_prices=None, clock=None, **kwargs):
+        self.name = kwargs.pop('name', 'Replay')
+        tickers = None
+        if hasattr(events, 'records'):
+            tickers = [stream.partition(':')[2] for stream in events.streams if stream.startswith('pair:')]
+            events = events_from_recording(events)
+        elif markets is None:
+            events = list(events)
+            tickers = {event[2] for event in events if event[1] in ('book', 'diff')}
+        events = iter(events)
+        first = next(events, None)
+        self._events = itertools.chain([first], events) if first is not None else iter([])
+        self.clock = clock if clock is not None else VirtualClock(start=first[0] if first is not None else 0)
+        markets = markets if markets is not None else [_definition_from_ticker(ticker) for ticker in sorted(tickers)]
+        self._active_orders = {}  # order_id -> Order
+        self._order_ids = itertools.count(1)
+        self.orders_log = []  # every (timestamp, action, order) handled, see create_order and cancel_order
+        self.events_replayed = 0
+        self._previous_clock = set_clock(self.clock)
+        super().__init__(markets, balances=balances, global_prices=global_prices, **kwargs)
+
+    def close(self):
+        """Puts back the clock that was in use before the client was created"""
+        if self._previous_clock is not None:
+            set_clock(self._previous_clock)
+            self._previous_clock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __start_threads__(self, pair):
+        pass
+
+    def get_book(self, pair):
+        return {side: pair.orderbook[side]._orders or [] for side in [ASK, BID]}
+
+    def get_active_orders(self, pair):
+        result = {ASK: [], BID: []}
+        for order in self._active_orders.values():
+            if order.pair is pair:
+                result[order.side].append(order)
+        return result
+
+    def create_order(self, pair, amount, side, limit_price=None):
+        order = Order(limit_price if limit_price is not None else 0, side, amount, order_id=str(next(self._order_ids)),
+                      pair=pair)
+        self.orders_log.append((self.clock.time(), 'create', order))
+        if limit_price is not None:
+            self._active_orders[order.order_id] = order
+            return order
+
+    def cancel_order(self, order):
+        self._active_orders.pop(order.order_id, None)
+        self.orders_log.append((self.clock.time(), 'cancel', order))
+
+    def apply(self, event):
+        """Applies a single event to the pairs and currencies of the exchange"""
+        timestamp, kind, name, payload = event
+        if kind == 'balance':
+            self._balances[name.lower()] = payload
+            self.balance_refresher.apply(self._balances)
+            return
+        pair = self.get_pair_by_ticker(name)
+        if pair is None:
+            return
+        if kind == 'book':
+            pair.orderbook.update(payload)
+        elif kind == 'diff':
+            pair.orderbook.apply_changes(payload)
+
+    def run(self, until=None):
+        """Replays the events (up to the timestamp until, if given) on the virtual clock. Returns how many events were
+        replayed"""
+        for event in self._events:
+            if until is not None and event[0] > until:
+                self._events = itertools.chain([event], self._events)
+                break
+            self.clock.advance(event[0])
+            self.apply(event)
+            self.events_replayed += 1
+            # The listeners see every event before the strategies are woken up again
+            ee.flush()
+        if until is not None:
+            self.clock.advance(until)
+        return self.events_replayed
@@ -0,0 +1,74 @@
+import threading
+
+
+class PollScheduler:
+    """Decides how often the book of each pair is polled, from how often it has been changing.
+
+    Every poll reports whether the book changed (see Orderbook.update). The scheduler keeps a moving average of the
+    share of polls that found a changed book, and shortens the interval of the pair while that share is over
+    target_change_share or lengthens it while it's under, within bounds. Enabled pairs and the pairs in the
+    client's pairs_to_always_update can be polled every min_interval seconds, while any other pair can't go under
+    idle_min_interval. Nothing is polled less often than every max_interval seconds. If the exchange's rate limiter
+    is over high_utilization, the idle pairs are slowed down further."""
+
+    def __init__(self, exchange_client=None, initial_interval=1, min_interval=0.5, max_interval=10,
+                 idle_min_interval=5, target_change_share=0.5, smoothing=0.3, high_utilization=0.8):
+        self.exchange_client = exchange_client
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_min_interval = idle_min_interval
+        self.target_change_share = target_change_share
+        self.smoothing = smoothing
+        self.high_utilization = high_utilization
+        self._intervals = {}
+        self._change_shares = {}  # pair -> moving average of the share of polls that found a changed book
+        self._lock = threading.Lock()
+
+    def is_idle(self, pair):
+        if pair:
+            return False
+        return pair not in getattr(self.exchange_client, 'pairs_to_always_update', ())
+
+    def bounds(self, pair):
+        """Returns the (minimum, maximum) polling interval of the pair"""
+        if not self.is_idle(pair):
+            return self.min_interval, self.max_interval
+        return min(self.idle_min_interval, self.max_interval), self.max_interval
+
+    def observe(self, pair, changed):
+        """Records a poll of the pair and returns how many seconds to wait before the next one"""
+        with self._lock:
+            interval = self._intervals.get(pair, self.initial_interval)
+            share = self._change_shares.get(pair)
+            share = float(changed) if share is None else self.smoothing * changed + (1 - self.smoothing) * share
+            self._change_shares[pair] = share
+            # Aim for target_change_share of the polls to find a changed book: speed up when more of them do, slow
+            # down when fewer do
+            interval *= min(2, max(0.5, self.target_change_share / share)) if share > 0 else 2
+            minimum, maximum = self.bounds(pair)
+            if self.is_idle(pair) and self._utilization() > self.high_utilization:
+                minimum = min(maximum, minimum * 2)
+            interval = max(minimum, min(maximum, interval))
+            self._intervals[pair] = interval
+        return interval
+
+    def _utilization(self):
+        rate_limiter = getattr(self.exchange_client, 'rate_limiter', None)
+        return rate_limiter.utilization() if rate_limiter is not None else 0
+
+    def cadence(self, pair):
+        """Current polling interval of the pair, in seconds"""
+        return self._intervals.get(pair, self.initial_interval)
+
+    def cadences(self):
+        return dict(self._intervals)
+
+    def change_rate(self, pair):
+        """Estimate of how many times per second the book of the pair changes"""
+        return self._change_shares.get(pair, 0) / self.cadence(pair)
+
+    def forget(self, pair):
+        with self._lock:
+            for values in (self._intervals, self._change_shares):
+                values.pop(pair, None)
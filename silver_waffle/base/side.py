@@ -1,18 +1,20 @@
 class Side:
+    __slots__ = ('name', '_hash')
 
     instances = []
 
     def __init__(self, name):
         self.name = name
+        self._hash = hash(name)
         if len(self.instances) >= 2:
             raise ValueError("You shouldn't be doing this")
         self.instances.append(self)
 
     def __hash__(self):
-        return hash(self.name)
+        return self._hash
 
     def __eq__(self, other):
-        return self.name == other.name
+        return self is other or self.name == other.name
 
     def __ne__(self, other):
         return not (self == other)
@@ -0,0 +1,219 @@
+import itertools
+import threading
+from collections import deque
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.exchange import Order
+from silver_waffle.base.exchange_client import OfflineExchangeClient
+from silver_waffle.base.matching_engine import MatchingEngine
+from silver_waffle.base.order_stream import OPEN, FILLED, CANCELLED
+from silver_waffle.base.clock import sleep, time
+from silver_waffle.exceptions import not_enough_balance, amount_must_be_greater
+
+ACCOUNT = 'account'  # owner of the orders placed through the ExchangeClient methods
+
+
+class SimulatedExchange(OfflineExchangeClient):
+    """In-process exchange backed by a MatchingEngine per pair, for paper trading and load testing.
+
+    The orders placed with create_order belong to the account, and they trade against the liquidity added with
+    seed_book and submit (which belongs to nobody, so it doesn't change the account balances). Limit orders lock
+    their funds until they are filled or cancelled, and they can be partially filled. If partial_fills is False, a
+    market order that can't be filled completely is rejected. Fees are charged on what is received: maker_fee when
+    a resting order is hit, taker_fee otherwise.
+
+    If publish_balances is True, the balances of the currencies are updated (and 'updated_balance' is emitted) every
+    time the account balances change. Load tests can turn it off and read get_balances instead.
+
+    If the orders or the fills of a pair are streamed (see ExchangeClient._start_order_stream), they are pushed to
+    the OrderTracker as they happen, like a private websocket would.
+
+    Every call to the exchange waits latency seconds (or latency() seconds, if it's a function) on the
+    silver_waffle.base.clock clock, so it can run in virtual time as well.
+
+    exchange = SimulatedExchange([{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01,
+                                   'active': True}], balances={'USDT': (1000, 0)})
+    pair = exchange.get_pair_by_ticker('BTC/USDT')
+    exchange.seed_book(pair, {ASK: [{'price': 100, 'amount': 5}], BID: [{'price': 99, 'amount': 5}]})
+    pair.create_limit_order(amount=1, side=BID, limit_price=100)"""
+
+    def __init__(self, markets, balances=None, maker_fee=0.001, taker_fee=0.002, latency=0, partial_fills=True,
+                 max_fills=10000, publish_balances=True, **kwargs):
+        self.name = kwargs.pop('name', 'Simulated')
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.latency = latency
+        self.partial_fills = partial_fills
+        self.engines = {}  # pair -> MatchingEngine
+        self.fills = deque(maxlen=max_fills)  # the last fills that involved the account
+        self.orders_placed = 0
+        self.orders_cancelled = 0
+        self._account_orders = {}  # pair -> {order_id: Order}
+        self._locks = {}  # order_id -> (pair, symbol, amount locked per unit of the order)
+        self._order_ids = itertools.count(1)
+        self.publish_balances = publish_balances
+        self._lock = threading.RLock()
+        balances = {symbol: list(balance) for symbol, balance in (balances or {}).items()}
+        super().__init__(markets, balances=balances, **kwargs)
+
+    def _delay(self):
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency:
+            sleep(latency)
+
+    def get_engine(self, pair):
+        with self._lock:
+            if pair not in self.engines:
+                self.engines[pair] = MatchingEngine()
+            return self.engines[pair]
+
+    def _balance(self, symbol):
+        return self._balances.setdefault(symbol.lower(), [0, 0])
+
+    def seed_book(self, pair, book):
+        """Replaces the liquidity that doesn't belong to the account with the levels of book (in the format of
+        get_book)"""
+        engine = self.get_engine(pair)
+        with self._lock:
+            engine.clear(owner=None)
+            fills = []
+            for side in [ASK, BID]:
+                for level in book[side]:
+                    fills += self._submit(pair, side, float(level['amount']), float(level['price']), owner=None)[1]
+            self._publish_balances(fills)
+
+    def submit(self, pair, side, amount, limit_price=None):
+        """Places an order that doesn't belong to the account, like another trader would. Returns the fills"""
+        with self._lock:
+            fills = self._submit(pair, side, float(amount), limit_price, owner=None)[1]
+            self._publish_balances(fills)
+            return fills
+
+    def _submit(self, pair, side, amount, limit_price, owner, order_id=None):
+        order_id, fills, remaining = self.get_engine(pair).submit(side, amount, limit_price, owner=owner,
+                                                                  order_id=order_id)
+        for fill in fills:
+            if fill.maker_owner == ACCOUNT:
+                self._settle(pair, fill.maker_id, fill.side.get_opposite(), fill.price, fill.amount, self.maker_fee)
+            if fill.taker_owner == ACCOUNT:
+                self._settle(pair, fill.taker_id, fill.side, fill.price, fill.amount, self.taker_fee)
+            if ACCOUNT in (fill.maker_owner, fill.taker_owner):
+                self.fills.append(fill)
+        return order_id, fills, remaining
+
+    def _publish_balances(self, fills=None):
+        """Updates the balances of the currencies. If fills are given, only if one of them involved the account"""
+        if not self.publish_balances:
+            return
+        if fills is not None and not any(ACCOUNT in (fill.maker_owner, fill.taker_owner) for fill in fills):
+            return
+        self.balance_refresher.apply({symbol: tuple(balance) for symbol, balance in self._balances.items()})
+
+    def _settle(self, pair, order_id, side, price, amount, fee):
+        """Moves the funds of an account order that got amount filled at price"""
+        spent_symbol, received_symbol = (pair.quote.symbol, pair.base.symbol) if side is BID else \
+            (pair.base.symbol, pair.quote.symbol)
+        spent, received = (price * amount, amount) if side is BID else (amount, price * amount)
+        spent_balance = self._balance(spent_symbol)
+        if order_id in self._locks:
+            _, _, locked_per_unit = self._locks[order_id]
+            spent_balance[1] -= locked_per_unit * amount
+            # A bid can be filled under its limit price, what was locked over the fill price is released
+            spent_balance[0] += locked_per_unit * amount - spent
+            order = self._account_orders[pair][order_id]
+            order.amount -= amount
+            if order.amount <= 0:
+                self._forget(order_id)
+        else:
+            spent_balance[0] -= spent
+        self._balance(received_symbol)[0] += received * (1 - fee)
+        if self.order_tracker.is_streaming(pair) and self._order_stream_settings(pair)[1]:
+            self.order_tracker.on_fill(pair, order_id, side, price, amount, received * fee, timestamp=time())
+        self._stream_order(pair, order_id, side, price, FILLED)
+
+    def _stream_order(self, pair, order_id, side, price, closed_status):
+        """Pushes the state of an account order to the OrderTracker, if the orders of pair are streamed"""
+        if not (self.order_tracker.is_streaming(pair) and self._order_stream_settings(pair)[0]):
+            return
+        order = self._account_orders.get(pair, {}).get(order_id)
+        if order is not None:
+            self.order_tracker.on_order_update(pair, order_id, side, order.price, order.amount, OPEN)
+        else:
+            self.order_tracker.on_order_update(pair, order_id, side, price, 0, closed_status)
+
+    def _start_order_stream(self, pair):
+        orders, transactions = self._order_stream_settings(pair)
+        if self.read_only is not True and (orders or transactions):
+            self.order_tracker.start(pair)
+
+    def _forget(self, order_id):
+        pair, _, _ = self._locks.pop(order_id)
+        del self._account_orders[pair][order_id]
+
+    def get_book(self, pair):
+        self._delay()
+        with self._lock:
+            return self.get_engine(pair).book()
+
+    def get_balances(self):
+        self._delay()
+        with self._lock:
+            return {symbol: tuple(balance) for symbol, balance in self._balances.items()}
+
+    def get_active_orders(self, pair):
+        self._delay()
+        result = {ASK: [], BID: []}
+        with self._lock:
+            for order in self._account_orders.get(pair, {}).values():
+                result[order.side].append(Order(order.price, order.side, order.amount, order_id=order.order_id,
+                                                pair=pair))
+        return result
+
+    def create_order(self, pair, amount, side, limit_price=None):
+        self._delay()
+        amount = float(amount)
+        if amount <= 0:
+            raise amount_must_be_greater()
+        with self._lock:
+            engine = self.get_engine(pair)
+            self.orders_placed += 1
+            if limit_price is None:
+                filled, total = engine.cost(side, amount)
+                if not filled or (not self.partial_fills and filled < amount):
+                    raise not_enough_balance()  # not enough liquidity in the book
+                spent_symbol, spent = (pair.quote.symbol, total) if side is BID else (pair.base.symbol, filled)
+                if self._balance(spent_symbol)[0] < spent:
+                    raise not_enough_balance()
+                self._submit(pair, side, amount, None, owner=ACCOUNT)
+                self._publish_balances()
+                return
+            limit_price = float(limit_price)
+            locked_symbol, locked_per_unit = (pair.quote.symbol, limit_price) if side is BID else \
+                (pair.base.symbol, 1)
+            balance = self._balance(locked_symbol)
+            if balance[0] < locked_per_unit * amount:
+                raise not_enough_balance()
+            balance[0] -= locked_per_unit * amount
+            balance[1] += locked_per_unit * amount
+            order_id = f'{ACCOUNT}-{next(self._order_ids)}'
+            order = Order(limit_price, side, amount, order_id=order_id, pair=pair)
+            self._account_orders.setdefault(pair, {})[order_id] = order
+            self._locks[order_id] = (pair, locked_symbol, locked_per_unit)
+            self._submit(pair, side, amount, limit_price, owner=ACCOUNT, order_id=order_id)
+            self._stream_order(pair, order_id, side, limit_price, FILLED)
+            self._publish_balances()
+            return Order(limit_price, side, amount, order_id=order_id, pair=pair)
+
+    def cancel_order(self, order):
+        self._delay()
+        with self._lock:
+            resting = self.get_engine(order.pair).cancel(order.order_id)
+            if resting is None:
+                return
+            self.orders_cancelled += 1
+            _, symbol, locked_per_unit = self._locks[order.order_id]
+            balance = self._balance(symbol)
+            balance[0] += locked_per_unit * resting.amount
+            balance[1] -= locked_per_unit * resting.amount
+            self._forget(order.order_id)
+            self._stream_order(order.pair, order.order_id, order.side, order.price, CANCELLED)
+            self._publish_balances()
@@ -0,0 +1,276 @@
+import heapq
+import itertools
+import queue
+import threading
+from bisect import bisect_left, bisect_right
+from silver_waffle.base.exchange import ee
+from silver_waffle.base.clock import time
+
+
+class PriceTrigger:
+    """Calls callback(trigger, order) when the best order of one side of the book of pair crosses price, that is,
+    when its price is below price (relate '<') or above it (relate '>').
+
+    A trigger with once=True is removed when it fires. Otherwise it fires again, cooldown seconds after the callback
+    returns, for as long as the book stays crossed. The callback can call snooze() to wait longer than that."""
+
+    def __init__(self, pair, side, relate, price, callback, once=True, cooldown=0):
+        if relate not in ('<', '>'):
+            raise ValueError(f'relate must be < or >, not {relate}')
+        self.pair = pair
+        self.side = side
+        self.relate = relate
+        self.price = float(price)
+        self.callback = callback
+        self.once = once
+        self.cooldown = cooldown
+        self.fired = 0
+        self.active = True
+        self._running = False
+        self._snoozed_until = None
+        self._engine = None
+
+    def snooze(self, seconds):
+        """Makes the trigger wait seconds after the callback returns, instead of cooldown"""
+        self._snoozed_until = time() + seconds
+
+    def cancel(self):
+        if self._engine is not None:
+            self._engine.remove(self)
+
+    def __repr__(self):
+        return f'PriceTrigger(pair={self.pair.ticker}, side={self.side}, best {self.relate} {self.price}, ' \
+               f'fired={self.fired})'
+
+
+class _TriggerIndex:
+    """Triggers of one side and relate of a pair, sorted by price, so the ones that a price crosses are a slice"""
+
+    def __init__(self, relate):
+        self.relate = relate
+        self.prices = []
+        self.triggers = []
+
+    def add(self, trigger):
+        idx = bisect_right(self.prices, trigger.price)
+        self.prices.insert(idx, trigger.price)
+        self.triggers.insert(idx, trigger)
+
+    def remove(self, trigger):
+        idx = bisect_left(self.prices, trigger.price)
+        while idx < len(self.triggers) and self.prices[idx] == trigger.price:
+            if self.triggers[idx] is trigger:
+                del self.prices[idx]
+                del self.triggers[idx]
+                return True
+            idx += 1
+        return False
+
+    def crossed_by(self, price):
+        if self.relate == '<':
+            return self.triggers[bisect_right(self.prices, price):]
+        return self.triggers[:bisect_left(self.prices, price)]
+
+    def __len__(self):
+        return len(self.triggers)
+
+
+class TriggerEngine:
+    """Fires PriceTriggers as soon as the books change, instead of polling them.
+
+    It listens to 'book_changed' and, for every pair that changed, looks up the triggers crossed by the new best ask
+    and best bid in a sorted index, so each update costs O(log n) plus the triggers that fire. The callbacks run on a
+    pool of up to workers threads, so a slow callback (like one that places orders) doesn't delay the other triggers.
+    A repeating trigger is taken out of the index while its callback runs and while it cools down. Its cooldown is
+    waited for on a timer thread, which puts it back in the index (or fires it again if the book is still crossed),
+    so it doesn't hold a worker in the meantime.
+
+    engine = TriggerEngine()
+    engine.add(PriceTrigger(pair, ASK, '<', 50000, lambda trigger, order: print(order)))
+
+    on_balance_update(callback) runs callback on the same pool every time 'updated_balance' is emitted."""
+
+    def __init__(self, event_bus=ee, workers=8, timer_resolution=0.1):
+        self.event_bus = event_bus
+        self._indexes = {}  # pair -> {(side, relate): _TriggerIndex}
+        self._cooling = set()  # repeating triggers that are out of the index while they run or cool down
+        self._balance_callbacks = []
+        self._running_balance_callbacks = set()
+        self._lock = threading.RLock()
+        self.workers = workers
+        self._tasks = queue.Queue()
+        self._threads = []
+        # Heap of (deadline, sequence, trigger) of the cooldowns. The timer thread checks the clock at least every
+        # timer_resolution seconds, so that it also follows a VirtualClock
+        self.timer_resolution = timer_resolution
+        self._timers = []
+        self._timer_sequence = itertools.count()
+        self._timer_condition = threading.Condition()
+        self._timer_thread = None
+        self._subscribed = False
+        self.checks = 0
+
+    def _submit(self, function, *args):
+        self._tasks.put((function, args))
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self.__trigger_worker_daemon__,
+                                      name=f'trigger_worker_{len(self._threads)}')
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    def __trigger_worker_daemon__(self):
+        while True:
+            function, args = self._tasks.get()
+            function(*args)
+
+    def _schedule_release(self, trigger, delay):
+        with self._timer_condition:
+            heapq.heappush(self._timers, (time() + delay, next(self._timer_sequence), trigger))
+            self._timer_condition.notify()
+            if self._timer_thread is None:
+                self._timer_thread = threading.Thread(target=self.__trigger_timer_daemon__, name='trigger_timer')
+                self._timer_thread.daemon = True
+                self._timer_thread.start()
+
+    def __trigger_timer_daemon__(self):
+        while True:
+            with self._timer_condition:
+                while not self._timers or self._timers[0][0] > time():
+                    timeout = min(self._timers[0][0] - time(), self.timer_resolution) if self._timers else None
+                    self._timer_condition.wait(timeout)
+                _, _, trigger = heapq.heappop(self._timers)
+            self._release(trigger)
+
+    def _subscribe(self):
+        if not self._subscribed:
+            self._subscribed = True
+            self.event_bus.on('book_changed', self._on_book_changed)
+            self.event_bus.on('updated_balance', self._on_updated_balance)
+
+    def _index(self, trigger):
+        indexes = self._indexes.setdefault(trigger.pair, {})
+        key = (trigger.side, trigger.relate)
+        if key not in indexes:
+            indexes[key] = _TriggerIndex(trigger.relate)
+        return indexes[key]
+
+    def add(self, trigger):
+        """Adds trigger, and fires it right away if the book is already crossed"""
+        with self._lock:
+            self._subscribe()
+            trigger._engine = self
+            self._index(trigger).add(trigger)
+        self.check(trigger.pair)
+        return trigger
+
+    def remove(self, trigger):
+        with self._lock:
+            trigger.active = False
+            if trigger in self._cooling:
+                self._cooling.discard(trigger)
+                return True
+            index = self._indexes.get(trigger.pair, {}).get((trigger.side, trigger.relate))
+            return index.remove(trigger) if index is not None else False
+
+    def triggers(self, pair=None):
+        with self._lock:
+            pairs = [pair] if pair is not None else list(self._indexes)
+            indexed = [trigger for pair in pairs for index in self._indexes.get(pair, {}).values()
+                       for trigger in index.triggers]
+            return indexed + [trigger for trigger in self._cooling if pair is None or trigger.pair is pair]
+
+    def _on_book_changed(self, pair, change=None):
+        self.check(pair)
+
+    @staticmethod
+    def _best_order(trigger):
+        side = trigger.pair.orderbook[trigger.side].snapshot
+        return side[0] if side else None
+
+    @staticmethod
+    def _crosses(trigger, order):
+        return order.price < trigger.price if trigger.relate == '<' else order.price > trigger.price
+
+    def check(self, pair):
+        """Fires the triggers of pair that the current book crosses. Returns how many were fired"""
+        fired = 0
+        with self._lock:
+            self.checks += 1
+            for (side, _), index in self._indexes.get(pair, {}).items():
+                if not index:
+                    continue
+                book = pair.orderbook[side].snapshot
+                if not book:
+                    continue
+                order = book[0]
+                for trigger in index.crossed_by(order.price):
+                    index.remove(trigger)
+                    if trigger.once:
+                        trigger.active = False
+                    else:
+                        self._cooling.add(trigger)
+                    trigger._running = True
+                    self._submit(self._fire, trigger, order)
+                    fired += 1
+        return fired
+
+    def _fire(self, trigger, order):
+        trigger.fired += 1
+        try:
+            trigger.callback(trigger, order)
+        except Exception as e:
+            print(f'{trigger} failed: {e!r}')
+        if trigger.once:
+            trigger._running = False
+            return
+        snoozed_until, trigger._snoozed_until = trigger._snoozed_until, None
+        delay = snoozed_until - time() if snoozed_until is not None else trigger.cooldown
+        if delay > 0:
+            self._schedule_release(trigger, delay)
+        else:
+            self._release(trigger)
+
+    def _release(self, trigger):
+        """Called when a repeating trigger finished cooling down. Book updates that arrived meanwhile didn't see it,
+        so it fires again if the book is still crossed, and goes back to the index otherwise"""
+        with self._lock:
+            if not trigger.active:
+                trigger._running = False
+                return
+            order = self._best_order(trigger)
+            if order is not None and self._crosses(trigger, order):
+                self._submit(self._fire, trigger, order)
+                return
+            self._cooling.discard(trigger)
+            self._index(trigger).add(trigger)
+            trigger._running = False
+
+    def on_balance_update(self, callback):
+        with self._lock:
+            self._subscribe()
+            self._balance_callbacks.append(callback)
+
+    def remove_balance_callback(self, callback):
+        with self._lock:
+            if callback in self._balance_callbacks:
+                self._balance_callbacks.remove(callback)
+
+    def _on_updated_balance(self, *args):
+        with self._lock:
+            for callback in self._balance_callbacks:
+                if callback not in self._running_balance_callbacks:
+                    self._running_balance_callbacks.add(callback)
+                    self._submit(self._run_balance_callback, callback)
+
+    def _run_balance_callback(self, callback):
+        try:
+            callback()
+        except Exception as e:
+            print(f'Balance callback {getattr(callback, "__name__", callback)} failed: {e!r}')
+        finally:
+            with self._lock:
+                self._running_balance_callbacks.discard(callback)
+
+
+trigger_engine = TriggerEngine()
@@ -0,0 +1,190 @@
+"""Microbenchmarks of the orderbook and domain model hot paths.
+
+python -m silver_waffle.benchmark --output results.json
+python -m silver_waffle.benchmark --compare results.json  # fails if something got slower than --threshold
+
+Every case runs on synthetic books (see make_book) built from a fixed seed, so the results of two commits measured
+on the same machine can be compared."""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from types import SimpleNamespace
+import numpy as np
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.exchange import Orderbook, Order, Currency, Pair
+from silver_waffle.utilities import truncate
+
+DEPTHS = [10, 100, 1000, 5000]
+
+
+def make_levels(depth, side, mid=100.0, tick=0.01, seed=0):
+    """Returns depth levels of one side in the format of ExchangeClient.get_book. Prices move away from mid one or
+    more ticks at a time and the amounts are spread between 0.01 and 100"""
+    rng = np.random.default_rng(seed)
+    steps = np.cumsum(rng.integers(1, 4, size=depth)) * tick
+    prices = mid + tick + steps if side is ASK else mid - tick - steps
+    amounts = np.round(rng.uniform(0.01, 100, size=depth), 4)
+    return [{'price': price, 'amount': amount} for price, amount in zip(prices.tolist(), amounts.tolist())]
+
+
+def make_book(depth, mid=100.0, seed=0):
+    return {ASK: make_levels(depth, ASK, mid, seed=seed), BID: make_levels(depth, BID, mid, seed=seed + 1)}
+
+
+def make_changed_book(book, levels=1, seed=0):
+    """Copy of book where the amount of levels random levels of each side changed"""
+    rng = np.random.default_rng(seed)
+    changed = {}
+    for side in [ASK, BID]:
+        changed[side] = [dict(level) for level in book[side]]
+        for i in rng.integers(0, len(book[side]), size=levels):
+            changed[side][i]['amount'] += 1
+    return changed
+
+
+def _pair():
+    return SimpleNamespace(base=SimpleNamespace(global_price=1), orders={ASK: [], BID: []}, ticker='BENCH/USD')
+
+
+def orderbook_cases(depth):
+    """Returns {name: function} for the cases that depend on the depth of the book"""
+    book = make_book(depth)
+    changed_book = make_changed_book(book)
+    orderbook = Orderbook(_pair())
+    orderbook.update(book)
+    asks = orderbook[ASK]
+    changing = Orderbook(_pair())
+    books = [book, changed_book]
+    counter = iter(range(10 ** 12))
+    middle = book[ASK][len(book[ASK]) // 2]['price']
+    return {
+        'Orderbook.update (unchanged)': lambda: orderbook.update(book),
+        'Orderbook.update (changed)': lambda: changing.update(books[next(counter) % 2]),
+        'check_if_book_changed': lambda: asks.check_if_book_changed(changed_book[ASK]),
+        'OrderbookSide iteration': lambda: [order.price for order in asks],
+        'OrderbookSide slicing': lambda: asks[:depth // 2],
+        'get_order_above': lambda: asks.get_order_above(99),
+        'get_orders_up_until': lambda: asks.get_orders_up_until(middle),
+        'get_liquidity': lambda: orderbook.get_liquidity(),
+        'get_spread': lambda: orderbook.get_spread(10),
+    }
+
+
+def _currency(name, symbol):
+    return Currency(name=name, symbol=symbol,
+                    exchange_client=SimpleNamespace(deferred_initialization=True, read_only=True))
+
+
+def model_cases():
+    """Returns {name: function} for the cases that don't depend on a book"""
+    currency = _currency('Bitcoin', 'BTC')
+    pair = Pair(exchange_client=None, ticker='BTC/USD', quote=_currency('Dollar', 'USD'), base=currency,
+                minimum_step=0.01)
+    socket_functionality = {pair: {'book': True}}
+    return {
+        'Order construction': lambda: Order(100.123456, ASK, 1.5),
+        'truncate': lambda: truncate(150.18518384, 4),
+        'Currency._set_balance': lambda: currency._set_balance((1.5, 0.25)),
+        'Pair dictionary lookup': lambda: socket_functionality[pair],
+    }
+
+
+def materialized_orders(count, depth=5000):
+    """Materializes count Order objects from a book, the way iterating over its sides does. Returns (bytes per order,
+    seconds per order)"""
+    orderbook = Orderbook(_pair())
+    orderbook.update(make_book(depth))
+    asks = orderbook[ASK]
+    tracemalloc.start()
+    start = timeit.default_timer()
+    orders = []
+    while len(orders) < count:
+        orders += asks[:min(depth, count - len(orders))]
+    elapsed = timeit.default_timer() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return memory / count, elapsed / count
+
+
+def measure(function, repeat=5, min_time=0.2):
+    """Returns the best time per call, in seconds"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(depths=DEPTHS, repeat=5, min_time=0.2, verbose=True):
+    """Runs every case and returns {case: seconds per call}. Depth dependent cases are named 'case [depth]'"""
+    cases = dict(model_cases())
+    for depth in depths:
+        cases.update({f'{name} [{depth}]': function for name, function in orderbook_cases(depth).items()})
+    results = {}
+    for name, function in cases.items():
+        results[name] = measure(function, repeat=repeat, min_time=min_time)
+        if verbose:
+            print(f'{name:<45}{results[name] * 1e6:>14.2f} us')
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'node': platform.node()}
+
+
+def compare(results, baseline, threshold=1.2, verbose=True):
+    """Returns the cases that take more than threshold times what they took in baseline, as {case: ratio}"""
+    regressions = {}
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        if ratio > threshold:
+            regressions[name] = ratio
+        if verbose:
+            print(f'{name:<45}{baseline[name] * 1e6:>12.2f} us{seconds * 1e6:>12.2f} us{ratio:>8.2f}x'
+                  f'{"  <- slower" if ratio > threshold else ""}')
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=DEPTHS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds spent on each measurement')
+    parser.add_argument('--output', help='saves the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file saved with --output to compare against')
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--orders', type=int, default=0,
+                        help='also measures the memory and time it takes to materialize this many orders')
+    args = parser.parse_args(args)
+
+    results = run(args.depths, repeat=args.repeat, min_time=args.min_time)
+    if args.orders:
+        memory, seconds = materialized_orders(args.orders)
+        print(f'{args.orders} materialized orders: {memory:.0f} bytes and {seconds * 1e6:.2f} us per order')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print(f"\nCompared with {baseline['environment'].get('commit')}:")
+        regressions = compare(results, baseline['results'], threshold=args.threshold)
+        if regressions:
+            print(f'{len(regressions)} cases are more than {args.threshold}x slower')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+import ccxt
+from silver_waffle.base.exchange_client import ExchangeClient
+
+
+def create_client(exchange, **kwargs):
+    """Creates an ExchangeClient without initializing it. exchange can be the name of any ccxt exchange or of one of
+    the adapters in silver_waffle.exchanges"""
+    if hasattr(ccxt, exchange):
+        return ExchangeClient(exchange, auto_initialize=False, **kwargs)
+    try:
+        module = importlib.import_module(f'silver_waffle.exchanges.{exchange.lower()}')
+        return getattr(module, exchange.lower().capitalize())(auto_initialize=False, **kwargs)
+    except (ModuleNotFoundError, AttributeError):
+        raise ValueError('Exchange not found')
+
+
+class BootstrapReport:
+    """How long each initialization stage took for each exchange. print() it to get a table"""
+
+    def __init__(self):
+        self.timings = {}  # client -> {stage: seconds}
+        self.errors = {}  # client -> exception
+        self.total_time = 0
+
+    def __repr__(self):
+        stages = ExchangeClient.INITIALIZATION_STAGES
+        _format = '{:<15}' + '{:>14}' * (len(stages) + 1)
+        lines = [_format.format('exchange', *stages, 'total')]
+        for client, timings in self.timings.items():
+            row = [f'{timings[stage]:.2f}' if stage in timings else '-' for stage in stages]
+            lines.append(_format.format(str(client), *row, f'{sum(timings.values()):.2f}'))
+        for client, error in self.errors.items():
+            lines.append(f'{client} failed: {error!r}')
+        lines.append(f'Wall time: {self.total_time:.2f}s')
+        return '\n'.join(lines)
+
+
+def bootstrap(exchanges, max_workers=4, price_workers=8, verbose=True, **kwargs):
+    """Initializes several exchanges concurrently and returns the clients along with a BootstrapReport.
+
+    exchanges is a list of exchange names or of ExchangeClient instances created with auto_initialize=False. Each
+    client goes through ExchangeClient.INITIALIZATION_STAGES on its own, so a slow exchange doesn't hold back the
+    rest. At most max_workers exchanges are initialized at once, and at most price_workers global prices are looked
+    up at once. kwargs are passed to the clients created from names.
+
+    clients, report = bootstrap(['binance', 'buda', 'bitso'])
+    print(report)
+    """
+    report = BootstrapReport()
+    start = time()
+    clients = [create_client(exchange, **kwargs) if isinstance(exchange, str) else exchange for exchange in exchanges]
+
+    def initialize(client):
+        report.timings[client] = client.initialization_timings
+        for stage in ExchangeClient.INITIALIZATION_STAGES:
+            elapsed = client.run_initialization_stage(stage, executor=price_executor)
+            if verbose:
+                print(f'{client}: {stage} done in {elapsed:.2f}s')
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=price_workers) as price_executor:
+        futures = {client: executor.submit(initialize, client) for client in clients}
+        for client, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                report.errors[client] = e
+                if verbose:
+                    print(f'{client}: initialization failed: {e!r}')
+    report.total_time = time() - start
+    if verbose:
+        print(report)
+    return [client for client in clients if client not in report.errors], report
@@ -8,11 +8,14 @@ cryptomkt = Cryptomkt.Cryptomkt()  # Instantiate the client with read only capab
 cryptomkt.update_book_if_balance_is_empty = True
 
 
-# We subscribe to the 'book_changed' event that occurs whenever the orderbook gets updated
+# We subscribe to the 'book_changed' event that occurs whenever the orderbook gets updated. It receives the pair and
+# a BookChange describing what changed
 @ee.on('book_changed')
 def handle_orderbook_update(*args):
-    print("The orderbook changed!")
-    pair = args[0]
+    pair, change = args
+    if not change.top_of_book_changed:
+        return  # we only care about the best bid and the best ask
+    print(f"The orderbook changed! (version {change.version})")
     pair.orderbook.__repr__()
 
 
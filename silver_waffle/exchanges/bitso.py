@@ -3,8 +3,10 @@ from silver_waffle import base
 from silver_waffle.base.exchange import Order
 from silver_waffle.base.side import ASK, BID
 from silver_waffle.base.exchange_client import ExchangeClient, WebsocketsClient
+from silver_waffle.base.order_stream import OPEN, FILLED, CANCELLED, CLOSED
+from silver_waffle.base.http import HttpSession
+from silver_waffle.base.rate_limiter import rate_limited, PRIORITY_MARKET_DATA
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_fixed
-import requests
 from time import sleep
 from silver_waffle.utilities import truncate
 import base64
@@ -20,7 +22,7 @@ def is_not_local_exception(exception):
 
 
 class Bitso(ExchangeClient):
-    def __init__(self, public_key=None, secret_key=None):
+    def __init__(self, public_key=None, secret_key=None, **kwargs):
         self.name = 'Bitso'
         # if not read_only and (public_key is None or secret_key is None):
         #     public_key = input('Enter your public key: ')
@@ -28,32 +30,74 @@ class Bitso(ExchangeClient):
         self.base_uri = 'https://api.bitso.com/'
         self.api_type = 'REST'
         self.timeout = 5
+        self.http = HttpSession(timeout=self.timeout)
+        # 'diff-orders' only sends the orders that changed, 'orders' sends the top of the book on every change
+        self.book_channel = 'diff-orders'
 
         super().__init__(read_only=True if not (public_key and secret_key) else False,
-                         websockets_client=WebsocketsClient('wss://ws.bitso.com', self))
+                         websockets_client=WebsocketsClient('wss://ws.bitso.com', self), **kwargs)
 
     def websocket_handler(self, message):
-        if message['type'] == 'orders' and 'payload' in message:
+        pair = self.get_pair_by_ticker(message.get('book', ''))
+        if 'payload' not in message or pair is None:
+            return
+        if message['type'] == 'diff-orders':
+            changes = []
+            for order in message['payload']:
+                side = BID if int(order['t']) == 0 else ASK
+                amount = order.get('a', 0) if order.get('s', 'open') == 'open' else 0
+                changes.append((order['o'], side, order['r'], amount))
+            self.get_book_synchronizer(pair).on_order_diff(message['sequence'], changes)
+            if self.order_tracker.is_streaming(pair):
+                self._track_own_orders(pair, message['payload'])
+        elif message['type'] == 'orders':
             book = {ASK: None, BID: None}
             for side in [ASK, BID]:
                 _side = 'bids' if side is BID else 'asks'
                 book[side] = [{'amount': order['a'], 'price': order['r']} for order in message['payload'][_side]]
-            self.pairs_by_ticker[message['book']].orderbook.update(book)
+            pair.orderbook.update(book)
 
     @retry(stop=stop_after_attempt(number_of_attempts), wait=wait_fixed(0.2))
-    def get_book(self, pair):
-        # try:
-        response = requests.get(f"{self.base_uri}/v3/order_book/?book={pair.ticker}", timeout=self.timeout)
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_book(self, pair, aggregate=True):
+        """Returns the book in the same format as ExchangeClient.get_book, plus its sequence number.
+
+        If aggregate is False, the individual orders are returned as well under the 'orders' key, which is what
+        the diff-orders channel needs to be applied on top of the book."""
+        response = self.http.get(self._book_url(pair, aggregate), timeout=self.timeout)
         try:
             book = response.json()['payload']
         except KeyError:
             print(response.content)
         # except JSONDecodeError:
         #     print(response)
+        return self._parse_book(book, aggregate)
 
-        asks = [{'amount': x['amount'], 'price': x['price']} for x in book['asks']]
-        bids = [{'amount': x['amount'], 'price': x['price']} for x in book['bids']]
-        return {ASK: asks, BID: bids}
+    @retry(stop=stop_after_attempt(number_of_attempts), wait=wait_fixed(0.2))
+    @rate_limited(PRIORITY_MARKET_DATA)
+    async def async_get_book(self, pair, engine):
+        response = await engine.get_json(self._book_url(pair), timeout=self.timeout)
+        return self._parse_book(response['payload'])
+
+    def _book_url(self, pair, aggregate=True):
+        return f"{self.base_uri}/v3/order_book/?book={pair.ticker}&aggregate={'true' if aggregate else 'false'}"
+
+    @staticmethod
+    def _parse_book(book, aggregate=True):
+        result = {'sequence': int(book['sequence'])}
+        if aggregate:
+            result[ASK] = [{'amount': x['amount'], 'price': x['price']} for x in book['asks']]
+            result[BID] = [{'amount': x['amount'], 'price': x['price']} for x in book['bids']]
+        else:
+            result['orders'] = [(x['oid'], side, x['price'], x['amount'])
+                                for side, _side in [(ASK, 'asks'), (BID, 'bids')] for x in book[_side]]
+            for side, _side in [(ASK, 'asks'), (BID, 'bids')]:
+                levels = {}
+                for x in book[_side]:
+                    levels[float(x['price'])] = levels.get(float(x['price']), 0) + float(x['amount'])
+                result[side] = [{'amount': amount, 'price': price}
+                                for price, amount in sorted(levels.items(), reverse=side is BID)]
+        return result
 
     @retry(stop=stop_after_attempt(number_of_attempts))
     def get_active_orders(self, pair):
@@ -67,6 +111,10 @@ class Bitso(ExchangeClient):
     def get_balance(self, currency):
         pass
 
+    @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    def get_balances(self):
+        pass
+
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
     def create_order(self, pair, amount, side, limit_price=None):
         pass
@@ -79,49 +127,57 @@ class Bitso(ExchangeClient):
             if self.websockets_client.is_closed:
                 self.websockets_client.connect()
                 sleep(2)
-            self.websockets_client.send({'action': 'subscribe', 'book': pair.ticker, 'type': 'orders'})
+            self.websockets_client.send({'action': 'subscribe', 'book': pair.ticker, 'type': self.book_channel})
+
+    def _start_order_stream(self, pair):
+        # Bitso doesn't have private channels, but 'diff-orders' carries the id of every order of the book, including
+        # the ones of the account, so they are followed there
+        orders, transactions = self._order_stream_settings(pair)
+        if self.read_only is True or not (orders or transactions) or self.book_channel != 'diff-orders' or \
+                self.socket_functionality.get(pair, {}).get('book') is False:
+            return
+        self.order_tracker.start(pair)
+
+    def _track_own_orders(self, pair, payload):
+        """Applies the diffs of the orders of the account to the OrderTracker. The ones that lost amount are fills"""
+        tracker = self.order_tracker
+        _, transactions = self._order_stream_settings(pair)
+        for order in payload:
+            known = tracker.get_order(pair, order['o'])
+            if known is None:
+                continue
+            status = {'open': OPEN, 'completed': FILLED, 'cancelled': CANCELLED}.get(order.get('s', 'open'), CLOSED)
+            remaining = float(order.get('a', 0)) if status == OPEN else 0
+            if transactions and status != CANCELLED and remaining < known.amount:
+                tracker.on_fill(pair, known.order_id, known.side, order['r'], known.amount - remaining,
+                                timestamp=order['d'] / 1000 if 'd' in order else None)
+            tracker.on_order_update(pair, known.order_id, known.side, known.price, remaining, status, known_only=True)
 
     def unsubscribe(self, pair):
+        self._stop_order_stream(pair)
         # It has to be sent twice for it to work, no idea why
         if self.websockets_client.is_closed is not True:
-            self.websockets_client.send({'action': 'unsubscribe', 'book': pair.ticker, 'type': 'orders'})
-            self.websockets_client.send({'action': 'unsubscribe', 'book': pair.ticker, 'type': 'orders'})
+            self.websockets_client.send({'action': 'unsubscribe', 'book': pair.ticker, 'type': self.book_channel})
+            self.websockets_client.send({'action': 'unsubscribe', 'book': pair.ticker, 'type': self.book_channel})
+        self.book_synchronizers.pop(pair, None)
 
-    def get_list_of_currencies_and_pairs(self, auto_register=False):
-        response = requests.get(f"{self.base_uri}/v3/available_books/", timeout=self.timeout)
+    def get_book_snapshot(self, pair):
+        return self.get_book(pair, aggregate=False)
+
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_market_definitions(self):
+        response = self.http.get(f"{self.base_uri}/v3/available_books/", timeout=self.timeout)
 
         try:
             pairs_response = response.json()['payload']
         except KeyError:
             print(response.content)
-        list_of_currencies = set([])
-        list_of_pairs = []
+        definitions = []
         for pair in pairs_response:
             currencies_symbols = pair['book'].split('_')
-            try:
-                base_curr = quote_curr = None
-                for curr in list_of_currencies:
-                    if currencies_symbols[0] == curr.symbol:
-                        base_curr = curr
-                    if currencies_symbols[1] == curr.symbol:
-                        quote_curr = curr
-                if not base_curr:
-                    base_curr = base.exchange.Currency(name=currencies_symbols[0], symbol=currencies_symbols[0],
-                                                       exchange_client=self)
-                if not quote_curr:
-                    quote_curr = base.exchange.Currency(name=currencies_symbols[1], symbol=currencies_symbols[1],
-                                                        exchange_client=self)
-            except currency_doesnt_exist:
-                continue
-            pair = base.exchange.Pair(ticker=pair['book'], quote=quote_curr, base=base_curr,
-                                      minimum_step=pair['minimum_value'], exchange_client=self)
-            list_of_pairs.append(pair)
-            list_of_currencies.add(quote_curr)
-            list_of_currencies.add(base_curr)
-        if auto_register is True:
-            for pair in list_of_pairs:
-                self._register_pair_and_currencies(pair)
-        return list(list_of_currencies), list_of_pairs
+            definitions.append({'ticker': pair['book'], 'base': currencies_symbols[0], 'quote': currencies_symbols[1],
+                                'minimum_step': pair['minimum_value'], 'active': True})
+        return definitions
 
     def get_history(self, pair):
         pass
@@ -3,6 +3,8 @@ from silver_waffle import base
 from silver_waffle.base.exchange import Order
 from silver_waffle.base.side import ASK, BID
 from silver_waffle.base.exchange_client import ExchangeClient
+from silver_waffle.base.http import HttpSession
+from silver_waffle.base.rate_limiter import rate_limited, PRIORITY_ORDERS, PRIORITY_ACCOUNT, PRIORITY_MARKET_DATA
 from tenacity import retry, retry_if_exception, stop_after_attempt, wait_fixed
 import requests
 from silver_waffle.utilities import truncate
@@ -56,7 +58,7 @@ def is_not_local_exception(exception):
 
 
 class Buda(ExchangeClient):
-    def __init__(self, public_key=None, secret_key=None):
+    def __init__(self, public_key=None, secret_key=None, **kwargs):
         self.name = 'Buda'
         # if not read_only and (public_key is None or secret_key is None):
         #     public_key = input('Enter your public key: ')
@@ -66,27 +68,39 @@ class Buda(ExchangeClient):
         if public_key and secret_key:
             self.auth = BudaHMACAuth(public_key, secret_key)
         self.timeout = 5
-        super().__init__(read_only=True if not (public_key and secret_key) else False)
+        self.http = HttpSession(timeout=self.timeout)
+        super().__init__(read_only=True if not (public_key and secret_key) else False, **kwargs)
 
 
     @retry(stop=stop_after_attempt(number_of_attempts),wait=wait_fixed(0.2))
+    @rate_limited(PRIORITY_MARKET_DATA)
     def get_book(self, pair):
         # try:
-        response = requests.get(f"{self.base_uri}/v2/markets/{pair.ticker}/order_book", timeout=self.timeout)
-        book = response.json()['order_book']
+        response = self.http.get(f"{self.base_uri}/v2/markets/{pair.ticker}/order_book", timeout=self.timeout)
         # except JSONDecodeError:
         #     print(response)
+        return self._parse_book(response.json()['order_book'])
 
+    @retry(stop=stop_after_attempt(number_of_attempts), wait=wait_fixed(0.2))
+    @rate_limited(PRIORITY_MARKET_DATA)
+    async def async_get_book(self, pair, engine):
+        response = await engine.get_json(f"{self.base_uri}/v2/markets/{pair.ticker}/order_book",
+                                         timeout=self.timeout)
+        return self._parse_book(response['order_book'])
+
+    @staticmethod
+    def _parse_book(book):
         asks = [{'amount': x[1], 'price': x[0]} for x in book['asks']]
         bids = [{'amount': x[1], 'price': x[0]} for x in book['bids']]
         return {ASK: asks, BID: bids}
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
     def get_active_orders(self, pair):
         result = {ASK: [], BID: []}
         try:
-            response = requests.get(f"{self.base_uri}/v2/markets/{pair.ticker}/orders", auth=self.auth,
-                                    timeout=self.timeout).json()
+            response = self.http.get(f"{self.base_uri}/v2/markets/{pair.ticker}/orders", auth=self.auth,
+                                     timeout=self.timeout).json()
             orders = response['orders']
         except KeyError:
             print(response)
@@ -98,24 +112,31 @@ class Buda(ExchangeClient):
         return result
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ORDERS)
     def cancel_order(self, order):
-        requests.put(f"{self.base_uri}/v2/orders/{order.order_id}", auth=self.auth, json={'state': 'canceling'},
-                     timeout=self.timeout).json()
+        self.http.put(f"{self.base_uri}/v2/orders/{order.order_id}", auth=self.auth, json={'state': 'canceling'},
+                      timeout=self.timeout).json()
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
     def get_balance(self, currency):
+        balances = self.get_balances()
+        try:
+            return balances[currency.symbol.upper()]
+        except KeyError:
+            raise currency_doesnt_exist
+
+    @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
+    def get_balances(self):
         try:
-            response = requests.get(f"{self.base_uri}/v2/balances", auth=self.auth, timeout=self.timeout)
+            response = self.http.get(f"{self.base_uri}/v2/balances", auth=self.auth, timeout=self.timeout)
             balances = response.json()['balances']
         except KeyError:
             print(response.content)
-        try:
-            search_result = next(item for item in balances if item["id"].lower() == currency.symbol.lower())
-        except StopIteration:
-            raise currency_doesnt_exist
-        return [search_result['available_amount'][0], search_result['frozen_amount'][0]]
+        return {item['id'].upper(): [item['available_amount'][0], item['frozen_amount'][0]] for item in balances}
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ORDERS)
     def create_order(self, pair, amount, side, limit_price=None):
         body = {}
         body['price_type'] = 'LIMIT' if limit_price else 'MARKET'
@@ -123,8 +144,8 @@ class Buda(ExchangeClient):
         if limit_price:
             body['limit'] = limit_price
         body['type'] = 'Ask' if side is ASK else 'Bid'
-        response = requests.post(f"{self.base_uri}/v2/markets/{pair.ticker}/orders", json=body, auth=self.auth,
-                                 timeout=self.timeout).json()
+        response = self.http.post(f"{self.base_uri}/v2/markets/{pair.ticker}/orders", json=body, auth=self.auth,
+                                  timeout=self.timeout).json()
 
     def subscribe(self, pair):
         self._register_pair_and_currencies(pair)
@@ -135,38 +156,13 @@ class Buda(ExchangeClient):
         pass
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
-    def get_list_of_currencies_and_pairs(self, auto_register=False):
-        response = requests.get(f"{self.base_uri}/v2/markets", timeout=self.timeout).json()
-        pairs = response['markets']
-        list_of_currencies = set([])
-        list_of_pairs = []
-        for pair in pairs:
-            try:
-                base_curr = quote_curr = None
-                for curr in list_of_currencies:
-                    if pair['base_currency'] == curr.symbol:
-                        base_curr = curr
-                    if pair['quote_currency'] == curr.symbol:
-                        quote_curr = curr
-                if not base_curr:
-                    base_curr = base.exchange.Currency(name=pair['base_currency'], symbol=pair['base_currency'],
-                                                       exchange_client=self)
-                if not quote_curr:
-                    quote_curr = base.exchange.Currency(name=pair['quote_currency'], symbol=pair['quote_currency'],
-                                                        exchange_client=self)
-            except currency_doesnt_exist:
-                continue
-            pair = base.exchange.Pair(ticker=pair['id'], quote=quote_curr, base=base_curr,
-                                      minimum_step=pair['minimum_order_amount'][0], exchange_client=self)
-            list_of_pairs.append(pair)
-            list_of_currencies.add(quote_curr)
-            list_of_currencies.add(base_curr)
-        if auto_register is True:
-            for pair in list_of_pairs:
-                self._register_pair_and_currencies(pair)
-        return list(list_of_currencies), list_of_pairs
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_market_definitions(self):
+        response = self.http.get(f"{self.base_uri}/v2/markets", timeout=self.timeout).json()
+        return [{'ticker': pair['id'], 'base': pair['base_currency'], 'quote': pair['quote_currency'],
+                 'minimum_step': pair['minimum_order_amount'][0], 'active': True} for pair in response['markets']]
 
     def get_history(self, pair):
-        response = requests.get(f"{self.base_uri}/v1/trade/{pair.ticker}/", headers=self.headers,
-                                timeout=self.timeout).json()
+        response = self.http.get(f"{self.base_uri}/v1/trade/{pair.ticker}/", headers=self.headers,
+                                 timeout=self.timeout).json()
         print(response)
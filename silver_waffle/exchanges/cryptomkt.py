@@ -2,13 +2,15 @@ from silver_waffle.exceptions import *
 from silver_waffle.base.exchange import Order, ee
 from silver_waffle.base.side import ASK, BID
 from silver_waffle.base.exchange_client import ExchangeClient
+from silver_waffle.base.http import HttpSession
+from silver_waffle.base.rate_limiter import rate_limited, PRIORITY_ORDERS, PRIORITY_ACCOUNT, PRIORITY_MARKET_DATA
 from silver_waffle.base.exchange import Pair, Currency
 from tenacity import retry, retry_if_exception, stop_after_attempt
 from silver_waffle.utilities import truncate
 from decimal import Decimal
 from cryptomarket.exchange.client import Client as cryptomkt
 from cryptomarket.exchange.error import InvalidRequestError, AuthenticationError, RateLimitExceededError
-import requests
+import asyncio
 
 
 number_of_attempts = 15
@@ -20,7 +22,7 @@ def is_not_local_exception(exception):
 
 class Cryptomkt(ExchangeClient):
 
-    def __init__(self, public_key=None, secret_key=None):
+    def __init__(self, public_key=None, secret_key=None, **kwargs):
         self.name = 'Cryptomarket'
         if public_key and secret_key:
             self._base_client = cryptomkt(public_key, secret_key)
@@ -28,26 +30,64 @@ class Cryptomkt(ExchangeClient):
             self.socket.logger.disabled = True
             self.socket.on('open-book', self._handle_socket_orderbook)
             self.socket.on('balance', self._handle_socket_balance)
+            self.socket.on('open-orders', self._handle_socket_open_orders)
+            self.socket.on('operated', self._handle_socket_operated)
         self.base_uri = "https://api.cryptomkt.com/"
         self.timeout = 5
+        self.http = HttpSession(timeout=self.timeout)
 
-        super().__init__(read_only=True if not (public_key and secret_key) else False)
+        super().__init__(read_only=True if not (public_key and secret_key) else False, **kwargs)
 
     def _handle_socket_orderbook(self, data):
         for ticker, order_data in data.items():
             parsed_data = {ASK: order_data['sell'], BID: order_data['buy']}
-            self.pairs_by_ticker[ticker].orderbook.update(parsed_data)
+            self.get_pair_by_ticker(ticker).orderbook.update(parsed_data)
 
     def _handle_socket_balance(self, data):
         # pprint(data)
         for symbol, balance_data in data.items():
-            for currency in self.currencies:
-                if currency.symbol.lower() == symbol.lower():
-                    # print(balance_data)
-                    currency._set_balance([balance_data['available'], str(
-                        Decimal(balance_data['countable']) - Decimal(balance_data['available']))])
+            currency = self.get_currency_by_symbol(symbol)
+            if currency is not None:
+                # print(balance_data)
+                currency._set_balance([balance_data['available'], str(
+                    Decimal(balance_data['countable']) - Decimal(balance_data['available']))])
         ee.emit("updated_balance")
 
+    @staticmethod
+    def _parse_order(order, pair):
+        side = ASK if str(order.get('side', order.get('type'))).lower() == 'sell' else BID
+        amount = order['amount']
+        if isinstance(amount, dict):
+            amount = amount.get('remaining', amount.get('original'))
+        return Order(order['price'], side, amount, order_id=order['id'], pair=pair)
+
+    def _handle_socket_open_orders(self, data):
+        # Every message has all the open orders of the account
+        orders = {pair: [] for pair in self.pairs
+                  if self.order_tracker.is_streaming(pair) and self._order_stream_settings(pair)[0]}
+        for order in data:
+            pair = self.get_pair_by_ticker(order.get('market', ''))
+            if pair in orders:
+                orders[pair].append(self._parse_order(order, pair))
+        for pair, pair_orders in orders.items():
+            self.order_tracker.replace(pair, pair_orders)
+
+    def _handle_socket_operated(self, data):
+        for trade in data:
+            pair = self.get_pair_by_ticker(trade.get('market', ''))
+            if pair is None or not (self.order_tracker.is_streaming(pair) and self._order_stream_settings(pair)[1]):
+                continue
+            side = ASK if str(trade.get('side', trade.get('type'))).lower() == 'sell' else BID
+            self.order_tracker.on_fill(pair, trade.get('order_id', trade.get('order')), side, trade['price'],
+                                       trade['amount'], trade.get('fee'), trade_id=trade.get('id'))
+
+    def _start_order_stream(self, pair):
+        orders, transactions = self._order_stream_settings(pair)
+        if self.read_only is True or not (orders or transactions):
+            return
+        self.order_tracker.amounts_from_fills = transactions and not orders
+        self.order_tracker.start(pair)
+
     def subscribe(self, pair):
         self._register_pair_and_currencies(pair)
 
@@ -55,16 +95,18 @@ class Cryptomkt(ExchangeClient):
             self.__start_threads__(pair)
         else:
             self.socket.subscribe(pair.ticker)
+            self._start_order_stream(pair)
 
     def unsubscribe(self, pair):
+        self._stop_order_stream(pair)
         self.socket.unsubscribe(pair.ticker)
-        pass
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_MARKET_DATA, cost=2)
     def get_book(self, pair):
-        response_bid = requests.get(f"{self.base_uri}/v1/book?market={pair.ticker}&type=buy&limit=30", timeout=self.timeout)
-        response_ask = requests.get(f"{self.base_uri}/v1/book?market={pair.ticker}&type=sell&limit=30",
-                                    timeout=self.timeout)
+        # Cryptomkt serves each side of the book on its own, so both sides are fetched at the same time
+        url = f"{self.base_uri}/v1/book?market={pair.ticker}&limit=30"
+        response_bid, response_ask = self.http.get_many([f"{url}&type=buy", f"{url}&type=sell"])
         try:
             book_bid = response_bid.json()['data']
             book_ask = response_ask.json()['data']
@@ -76,6 +118,17 @@ class Cryptomkt(ExchangeClient):
         return {ASK: asks, BID: bids}
 
     @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_MARKET_DATA, cost=2)
+    async def async_get_book(self, pair, engine):
+        response_bid, response_ask = await asyncio.gather(
+            engine.get_json(f"{self.base_uri}/v1/book?market={pair.ticker}&type=buy&limit=30", timeout=self.timeout),
+            engine.get_json(f"{self.base_uri}/v1/book?market={pair.ticker}&type=sell&limit=30", timeout=self.timeout))
+        asks = [{'amount': x['amount'], 'price': x['price']} for x in response_ask['data']]
+        bids = [{'amount': x['amount'], 'price': x['price']} for x in response_bid['data']]
+        return {ASK: asks, BID: bids}
+
+    @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
     def get_active_orders(self, pair):
         result = {ASK: [], BID: []}
         orders = self._base_client.get_active_orders(market=pair.ticker)['data']
@@ -89,6 +142,7 @@ class Cryptomkt(ExchangeClient):
         return result
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ORDERS)
     def cancel_order(self, order: Order):
         try:
             order = self._base_client.cancel_order(id=order.order_id)
@@ -98,12 +152,18 @@ class Cryptomkt(ExchangeClient):
 
     @retry(stop=stop_after_attempt(number_of_attempts))
     def get_balance(self, currency):
+        return self.get_balances()[currency.symbol.lower()]
+
+    @retry(stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ACCOUNT)
+    def get_balances(self):
         balance = self._base_client.get_balance()['data']
-        search_result = next(item for item in balance if item["wallet"].lower() == currency.symbol.lower())
-        return [truncate(Decimal(search_result['available']), 3),
-                truncate(float(Decimal(search_result['balance']) - Decimal(search_result['available'])), 3)]
+        return {item['wallet'].lower(): [truncate(Decimal(item['available']), 3),
+                                         truncate(float(Decimal(item['balance']) - Decimal(item['available'])), 3)]
+                for item in balance}
 
     @retry(retry=retry_if_exception(is_not_local_exception), stop=stop_after_attempt(number_of_attempts))
+    @rate_limited(PRIORITY_ORDERS)
     def create_order(self, pair, amount, side, limit_price=None):
         try:
             if limit_price:
@@ -120,37 +180,19 @@ class Cryptomkt(ExchangeClient):
             if e.message == 'invalid_request':
                 raise server_error
 
-    def get_list_of_currencies_and_pairs(self):
+    def get_market_definitions(self):
         # Since cryptomarket doesn't have the endpoints to auto create the pairs, this has to be done manually.
-        ars = Currency(name='Argentinian Peso', symbol='ars', exchange_client=self)
-        brl = Currency(name='Brazilian Real', symbol='brl', exchange_client=self)
-        clp = Currency(name='Chilean Peso', symbol='clp', exchange_client=self)
-
-        eth = Currency(name='Ethereum', symbol='eth', exchange_client=self)
-        xlm = Currency(name='Stellar', symbol='xlm', exchange_client=self)
-        eos = Currency(name='EOS', symbol='eos', exchange_client=self)
-        btc = Currency(name='Bitcoin', symbol='btc', exchange_client=self)
-
-        ethars = Pair(exchange_client=self, ticker='ETHARS', base=eth, quote=ars, minimum_step=2)
-        xlmars = Pair(exchange_client=self, ticker='XLMARS', base=xlm, quote=ars, minimum_step=0.005)
-        eosars = Pair(exchange_client=self, ticker='EOSARS', base=eos, quote=ars, minimum_step=0.05)
-        btcars = Pair(exchange_client=self, ticker='BTCARS', base=btc, quote=ars, minimum_step=20)
-
-        ethbrl = Pair(exchange_client=self, ticker='ETHARS', base=eth, quote=brl, minimum_step=2)
-        xlmbrl = Pair(exchange_client=self, ticker='XLMARS', base=xlm, quote=brl, minimum_step=0.005)
-        eosbrl = Pair(exchange_client=self, ticker='EOSARS', base=eos, quote=brl, minimum_step=0.05)
-        btcbrl = Pair(exchange_client=self, ticker='BTCARS', base=btc, quote=brl, minimum_step=20)
-
-        ethclp = Pair(exchange_client=self, ticker='ETHARS', base=eth, quote=clp, minimum_step=2)
-        xlmclp = Pair(exchange_client=self, ticker='XLMARS', base=xlm, quote=clp, minimum_step=0.005)
-        eosclp = Pair(exchange_client=self, ticker='EOSARS', base=eos, quote=clp, minimum_step=0.05)
-        btcclp = Pair(exchange_client=self, ticker='BTCARS', base=btc, quote=clp, minimum_step=20)
-
-        list_of_pairs = [ethars, xlmars, eosars, btcars, ethbrl, xlmbrl, eosbrl, btcbrl, ethclp, xlmclp, eosclp, btcclp]
-        list_of_currencies = [ars, brl, clp, eth, xlm, eos, btc]
-
-        return list_of_currencies, list_of_pairs
-
+        names = {'ars': 'Argentinian Peso', 'brl': 'Brazilian Real', 'clp': 'Chilean Peso', 'eth': 'Ethereum',
+                 'xlm': 'Stellar', 'eos': 'EOS', 'btc': 'Bitcoin'}
+        minimum_steps = {'eth': 2, 'xlm': 0.005, 'eos': 0.05, 'btc': 20}
+
+        definitions = []
+        for quote in ['ars', 'brl', 'clp']:
+            for base, minimum_step in minimum_steps.items():
+                definitions.append({'ticker': f'{base}{quote}'.upper(), 'base': base, 'quote': quote,
+                                    'minimum_step': minimum_step, 'active': True,
+                                    'base_name': names[base], 'quote_name': names[quote]})
+        return definitions
 
     def get_history(self, pair):
         pass
\ No newline at end of file
@@ -2,6 +2,7 @@ from __future__ import annotations
 from silver_waffle.base.side import ASK, BID
 from ordered_set import OrderedSet
 import silver_waffle.base.exchange
+from silver_waffle.base.registry import Registry
 from tenacity import retry
 
 class PairManager:
@@ -15,6 +16,11 @@ class PairManager:
                 self.currencies.add(pair.quote)
                 self.currencies.add(pair.base)
             self.pairs = OrderedSet(list_of_pairs)
+        self.registry = Registry()
+        for pair in self.pairs:
+            self.registry.register_pair(pair)
+        for currency in self.currencies:
+            self.registry.register_currency(currency)
         self.currencies_in_use = dict.fromkeys(self.currencies, 0)
         self.currency_offset = dict.fromkeys(self.currencies, 0)
         self.max_amounts = {}
@@ -83,13 +89,36 @@ class PairManager:
 
 
     def cancel_orders(self, currency):
-        for pair in self.pairs:
-            if pair.quote is currency:
-                pair.update_active_orders()
-                pair.cancel_orders(ASK)
-            if pair.base is currency:
-                pair.update_active_orders()
-                pair.cancel_orders(BID)
+        """Cancels the orders of every pair that use currency. Returns an OrderResult per order"""
+        targets = [(pair, ASK) for pair in self.pairs if pair.quote is currency] + \
+                  [(pair, BID) for pair in self.pairs if pair.base is currency]
+        return self._cancel(targets)
+
+    def cancel_all_orders(self):
+        """Cancels the orders of every pair. Returns an OrderResult per order"""
+        return self._cancel([(pair, side) for pair in self.pairs for side in [ASK, BID]])
+
+    def _cancel(self, targets):
+        """Refreshes the active orders of the pairs in targets, a list of (pair, side), and cancels the orders of
+        those sides in a single batch per exchange (see ExchangeClient.cancel_orders)"""
+        targets = [(pair, side) for pair, side in targets if pair.exchange_client.read_only is not True]
+        orders_by_client = {}
+        for pair in dict.fromkeys(pair for pair, _ in targets):
+            orders_by_client.setdefault(pair.exchange_client, {})[pair] = []
+        for exchange_client, pairs in orders_by_client.items():
+            for _, error in exchange_client.map_concurrently(lambda pair: pair.update_active_orders(), pairs):
+                if error is not None:
+                    raise error
+        for pair, side in targets:
+            orders_by_client[pair.exchange_client][pair] += pair.orders[side]
+        results = []
+        for exchange_client, orders_by_pair in orders_by_client.items():
+            client_results = exchange_client.cancel_orders([order for orders in orders_by_pair.values()
+                                                            for order in orders])
+            for pair in orders_by_pair:
+                pair._forget_cancelled([result for result in client_results if result.order.pair is pair])
+            results += client_results
+        return results
 
     def _get_and_set_pair_list(self):
         currencies, pairs = self.exchange_client.get_list_of_currencies_and_pairs()
@@ -97,14 +126,10 @@ class PairManager:
         self.pairs = OrderedSet(pairs)
 
     def get_currency_by_symbol(self, symbol) -> base.exchange.Currency:
-        for curr in self.currencies:
-            if curr.symbol.lower() == symbol.lower():
-                return curr
+        return self.registry.get_currency(symbol)
 
     def get_pair_by_ticker(self, ticker) -> base.exchange.Pair:
-        for pair in self.pairs:
-            if pair.ticker.lower() == ticker.lower():
-                return pair
+        return self.registry.get_pair(ticker)
 
     def get_amount(self, pair):
         pass
@@ -0,0 +1,58 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import threading
+import time
+from silver_waffle.base.balance_refresher import BalanceRefresher
+
+
+class FakeCurrency:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.balance = None
+
+    def _set_balance(self, new_balance, currency=None):
+        self.balance = tuple(new_balance)
+
+
+class FakeExchangeClient:
+    def __init__(self, currencies):
+        self.currencies = set(currencies)
+        self.calls = 0
+
+    def get_balances(self):
+        self.calls += 1
+        time.sleep(0.2)
+        return {'BTC': (1, 0.5), 'usd': (100, 0)}
+
+
+class TestBalanceRefresher(unittest.TestCase):
+    def setUp(self):
+        self.btc, self.usd, self.eth = FakeCurrency('btc'), FakeCurrency('USD'), FakeCurrency('eth')
+        self.client = FakeExchangeClient([self.btc, self.usd, self.eth])
+        self.refresher = BalanceRefresher(self.client)
+
+    def test_fan_out(self):
+        self.refresher.refresh()
+        self.assertEqual(self.client.calls, 1)
+        self.assertEqual(self.btc.balance, (1, 0.5))
+        self.assertEqual(self.usd.balance, (100, 0))
+        self.assertEqual(self.eth.balance, (0, 0))
+
+    def test_concurrent_refreshes_are_collapsed(self):
+        threads = [threading.Thread(target=self.refresher.refresh) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.client.calls, 1)
+
+    def test_max_age(self):
+        self.refresher.refresh()
+        self.refresher.refresh(max_age=60)
+        self.assertEqual(self.client.calls, 1)
+        self.refresher.refresh()
+        self.assertEqual(self.client.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
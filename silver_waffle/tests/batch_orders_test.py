@@ -0,0 +1,79 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import time
+from types import SimpleNamespace
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.simulated_exchange import SimulatedExchange
+from silver_waffle.manager import PairManager
+
+MARKETS = [{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True},
+           {'ticker': 'ETH/USDT', 'base': 'ETH', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True}]
+
+
+class TestBatchOrders(unittest.TestCase):
+    def setUp(self):
+        self.exchange = SimulatedExchange(MARKETS, balances={'USDT': (10 ** 6, 0), 'BTC': (100, 0), 'ETH': (100, 0)},
+                                          read_only=False)
+        self.pair = self.exchange.get_pair_by_ticker('BTC/USDT')
+        self.eth = self.exchange.get_pair_by_ticker('ETH/USDT')
+
+    def place(self, pair, count):
+        results = pair.create_limit_orders([(1, BID, 50 + i) for i in range(count)] +
+                                           [(1, ASK, 200 + i) for i in range(count)])
+        self.assertTrue(all(result.ok for result in results))
+        return results
+
+    def test_create_and_cancel_concurrently(self):
+        self.exchange.latency = 0.05
+        results = self.place(self.pair, 10)
+        self.assertEqual([result.order.price for result in results[:3]], [50, 51, 52])
+        self.assertEqual(len(self.pair.orders[BID]), 10)
+        start = time.time()
+        results = self.pair.cancel_orders(BID)
+        self.assertLess(time.time() - start, 10 * 0.05)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.pair.orders[BID], [])
+        self.assertEqual(len(self.exchange.get_active_orders(self.pair)[ASK]), 10)
+
+    def test_failed_cancellations_are_reported(self):
+        self.place(self.pair, 3)
+        failing = self.pair.orders[ASK][1]
+        cancel_order = self.exchange.cancel_order
+
+        def flaky_cancel_order(order):
+            if order.order_id == failing.order_id:
+                raise ConnectionError('timeout')
+            return cancel_order(order)
+
+        self.exchange.cancel_order = flaky_cancel_order
+        results = self.pair.cancel_orders()
+        self.assertEqual([result.ok for result in results], [True, False] + [True] * 4)
+        self.assertIsInstance(results[1].error, ConnectionError)
+        self.assertEqual(self.pair.orders, {ASK: [failing], BID: []})
+
+    def test_batch_endpoints(self):
+        calls = []
+        self.exchange.ccxt_client = SimpleNamespace(
+            has={'cancelOrders': True, 'cancelAllOrders': True},
+            cancel_orders=lambda ids, symbol: calls.append(('cancel_orders', symbol, ids)),
+            cancel_all_orders=lambda symbol: calls.append(('cancel_all_orders', symbol)))
+        self.place(self.pair, 2)
+        ids = [order.order_id for order in self.pair.orders[BID]]
+        self.assertTrue(all(result.ok for result in self.pair.cancel_orders(BID)))
+        self.assertTrue(all(result.ok for result in self.pair.cancel_orders()))
+        self.assertEqual(calls, [('cancel_orders', 'BTC/USDT', ids), ('cancel_all_orders', 'BTC/USDT')])
+        self.assertEqual(self.pair.orders, {ASK: [], BID: []})
+
+    def test_pair_manager_cancels_every_pair(self):
+        self.place(self.pair, 3)
+        self.place(self.eth, 2)
+        manager = PairManager(list_of_pairs=[self.pair, self.eth])
+        self.assertEqual(len(manager.cancel_orders(self.pair.base)), 3)
+        self.assertEqual(len(manager.cancel_all_orders()), 3 + 2 * 2)
+        self.assertEqual(self.exchange.get_active_orders(self.pair), {ASK: [], BID: []})
+        self.assertEqual(self.exchange.get_active_orders(self.eth), {ASK: [], BID: []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+from silver_waffle import benchmark
+from silver_waffle.base.side import ASK, BID
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_synthetic_books_are_sorted_and_reproducible(self):
+        book = benchmark.make_book(100)
+        asks, bids = [level['price'] for level in book[ASK]], [level['price'] for level in book[BID]]
+        self.assertEqual(asks, sorted(asks))
+        self.assertEqual(bids, sorted(bids, reverse=True))
+        self.assertLess(bids[0], asks[0])
+        self.assertEqual(book, benchmark.make_book(100))
+        self.assertNotEqual(benchmark.make_changed_book(book)[ASK], book[ASK])
+
+    def test_run_and_compare(self):
+        results = benchmark.run(depths=[10], repeat=1, min_time=0.001, verbose=False)
+        self.assertIn('get_liquidity [10]', results)
+        self.assertIn('Order construction', results)
+        baseline = {name: seconds / 2 for name, seconds in results.items()}
+        self.assertEqual(set(benchmark.compare(results, baseline, verbose=False)), set(results))
+        self.assertEqual(benchmark.compare(results, results, verbose=False), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from silver_waffle.base.exchange_rate_feeds import ChainlinkFeedService, LATEST_ROUND_DATA_SELECTOR
+
+ADDRESSES = {'BTC-USD': '0x01', 'ETH-USD': '0x02', 'LINK-ETH': '0x03'}
+ANSWERS = {'0x01': 30000 * 10 ** 8, '0x02': 2000 * 10 ** 8, '0x03': 5 * 10 ** 15}
+
+
+def encode_round_data(answer):
+    return '0x' + ''.join(format(word, '064x') for word in (1, answer, 0, 1600000000, 1))
+
+
+class JSONRPCHandler(BaseHTTPRequestHandler):
+    """Answers batches of eth_call to latestRoundData like a node would"""
+
+    def do_POST(self):
+        calls = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(calls)
+        if self.server.broken:
+            self.send_response(503)
+            self.end_headers()
+            return
+        responses = []
+        for call in calls:
+            target = call['params'][0]
+            if target['data'] == LATEST_ROUND_DATA_SELECTOR and target['to'] in ANSWERS:
+                result = encode_round_data(ANSWERS[target['to']])
+                responses.append({'jsonrpc': '2.0', 'id': call['id'], 'result': result})
+            else:
+                responses.append({'jsonrpc': '2.0', 'id': call['id'], 'error': {'code': -32000, 'message': 'revert'}})
+        body = json.dumps(responses[::-1]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(broken=False):
+    server = HTTPServer(('127.0.0.1', 0), JSONRPCHandler)
+    server.broken = broken
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class TestChainlinkFeedService(unittest.TestCase):
+    def setUp(self):
+        self.server = start_server()
+        self.broken_server = start_server(broken=True)
+
+    def tearDown(self):
+        for server in (self.server, self.broken_server):
+            server.shutdown()
+            server.server_close()
+
+    def url(self, server):
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    def test_prices_are_read_with_a_single_batch(self):
+        service = ChainlinkFeedService(endpoints=[self.url(self.server)], addresses=ADDRESSES)
+        prices = service.get_prices(['btc', 'LINK', 'DOGE'])
+        self.assertEqual(prices['BTC'], 30000)
+        self.assertAlmostEqual(prices['LINK'], 0.005 * 2000)
+        self.assertNotIn('DOGE', prices)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(len(self.server.requests[0]), 3)  # BTC-USD, ETH-USD and LINK-ETH
+        with self.assertRaises(ValueError):
+            service.get_price('DOGE')
+
+    def test_failing_endpoints_are_benched(self):
+        service = ChainlinkFeedService(endpoints=[self.url(self.broken_server), self.url(self.server)],
+                                       addresses=ADDRESSES)
+        self.assertEqual(service.get_price('BTC'), 30000)
+        self.assertEqual(service.get_price('BTC'), 30000)
+        self.assertEqual(len(self.broken_server.requests), 1)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertFalse(service.endpoints[0].is_healthy)
+
+    def test_every_endpoint_failing_raises(self):
+        service = ChainlinkFeedService(endpoints=[self.url(self.broken_server)], addresses=ADDRESSES)
+        with self.assertRaises(ConnectionError):
+            service.get_price('BTC')
+
+    def test_negative_answers_are_decoded(self):
+        result = encode_round_data(2 ** 256 - 5)
+        self.assertEqual(ChainlinkFeedService.decode_latest_round_data(result)[1], -5)
+
+
+if __name__ == '__main__':
+    unittest.main()
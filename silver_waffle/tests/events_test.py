@@ -0,0 +1,116 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+from silver_waffle.base.events import EventBus
+from silver_waffle.base.exchange import BookChange
+from silver_waffle.base.side import ASK, BID
+
+
+class TestEventBus(unittest.TestCase):
+    def test_slow_listeners_dont_block_the_emitter(self):
+        bus = EventBus()
+        release = threading.Event()
+        handled = []
+
+        @bus.on('status_changed')
+        def slow(value):
+            release.wait(5)
+            handled.append(value)
+
+        start = time.monotonic()
+        for i in range(3):
+            bus.emit('status_changed', i)
+        self.assertLess(time.monotonic() - start, 0.5)
+        release.set()
+        self.assertTrue(bus.flush(timeout=5))
+        self.assertEqual(handled, [0, 1, 2])
+
+    def test_book_changed_is_coalesced_per_pair(self):
+        bus = EventBus()
+        release = threading.Event()
+        handled = []
+
+        @bus.on('book_changed')
+        def listener(pair, version):
+            release.wait(5)
+            handled.append((pair, version))
+
+        bus.emit('book_changed', 'btc/usd', 0)
+        time.sleep(0.1)  # the listener is now busy with version 0
+        for version in range(1, 5):
+            bus.emit('book_changed', 'btc/usd', version)
+            bus.emit('book_changed', 'eth/usd', version)
+        release.set()
+        bus.flush(timeout=5)
+        self.assertEqual(handled, [('btc/usd', 0), ('btc/usd', 4), ('eth/usd', 4)])
+        self.assertEqual(bus.stats()[listener].coalesced, 6)
+
+    def test_coalesced_book_changes_are_merged(self):
+        bus = EventBus()
+        release = threading.Event()
+        handled = []
+
+        @bus.on('book_changed')
+        def listener(pair, change):
+            release.wait(5)
+            handled.append(change)
+
+        pair = SimpleNamespace(ticker='btc_usd')
+        asks = (np.array([100., 101.]), np.array([1., 1.]))
+        books = [{ASK: asks, BID: (np.array([99., 98.]), np.array([1., amount]))} for amount in (1, 2)]
+        books.append({ASK: asks, BID: (np.array([99.5, 98.]), np.array([1., 2.]))})  # the best bid moves
+        books.append({ASK: asks, BID: (np.array([99.5, 98.]), np.array([1., 3.]))})
+        bus.emit('book_changed', pair, BookChange(pair, 1, books[0], books[0]))
+        time.sleep(0.1)  # the listener is now busy with version 1
+        for version in range(2, 5):
+            bus.emit('book_changed', pair, BookChange(pair, version, books[version - 2], books[version - 1]))
+        release.set()
+        bus.flush(timeout=5)
+        merged = handled[-1]
+        self.assertEqual(merged.version, 4)
+        self.assertTrue(merged.best_bid_moved)
+        self.assertEqual(sorted(merged.changed_levels), [(BID, 98., 3.), (BID, 99., 0), (BID, 99.5, 1.)])
+
+    def test_full_queues_drop_the_oldest_events(self):
+        bus = EventBus(max_queue_size=2)
+        release = threading.Event()
+        handled = []
+
+        @bus.on('updated_balance')
+        def listener(value):
+            release.wait(5)
+            handled.append(value)
+
+        for i in range(5):
+            bus.emit('updated_balance', i)
+        release.set()
+        bus.flush(timeout=5)
+        stats = bus.stats()[listener]
+        self.assertEqual(handled[-2:], [3, 4])
+        self.assertEqual(stats.dropped + stats.handled, 5)
+        self.assertGreater(stats.max_latency, 0)
+
+    def test_once_and_synchronous_mode(self):
+        bus = EventBus(synchronous=True)
+        handled = []
+        bus.once('balance_is_empty', lambda: handled.append(1))
+        bus.emit('balance_is_empty')
+        bus.emit('balance_is_empty')
+        self.assertEqual(handled, [1])
+
+    def test_listeners_expire_after_ttl_events(self):
+        bus = EventBus()
+        handled = []
+        bus.on('status_changed', handled.append, ttl=2)
+        for i in range(4):
+            bus.emit('status_changed', i)
+        self.assertTrue(bus.flush(timeout=5))
+        self.assertEqual(handled, [0, 1])
+        self.assertEqual(bus.listeners('status_changed'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 from silver_waffle.base.exchange_client import ExchangeClient
+from silver_waffle.bootstrap import bootstrap
 from silver_waffle.base.side import ASK, BID
 import random
 import time
@@ -8,12 +9,9 @@ if __name__ == '__main__':
     unittest.main()
 
 clients = ['buda', 'ripio']
-exchanges = []
-
-for client in clients:
-    print(f'creating {client}')
-    exchanges.append(ExchangeClient(client))
+exchanges, report = bootstrap(clients)
 
+assert not report.errors, report.errors
 for client in exchanges:
     assert client.pairs
 
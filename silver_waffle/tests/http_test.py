@@ -0,0 +1,63 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from silver_waffle.base.http import HttpSession
+from silver_waffle.base.rate_limiter import is_rate_limit_error
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(0.2)
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(429 if self.path == '/limited' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSession(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_many_is_concurrent_and_timed(self):
+        session = HttpSession()
+        timings = []
+        session.add_timing_hook(lambda *timing: timings.append(timing))
+        start = time.time()
+        responses = session.get_many([f'{self.url}/buy', f'{self.url}/sell'])
+        self.assertLess(time.time() - start, 0.35)
+        self.assertEqual([response.json()['path'] for response in responses], ['/buy', '/sell'])
+        self.assertEqual(len(timings), 2)
+        # The requests run concurrently, so their timings can arrive in any order
+        self.assertEqual(sorted(timing[:3] for timing in timings),
+                         [('GET', f'{self.url}/buy', 200), ('GET', f'{self.url}/sell', 200)])
+        self.assertGreater(session.average_latency(), 0.15)
+        session.close()
+
+    def test_too_many_requests_raises(self):
+        session = HttpSession()
+        with self.assertRaises(requests.HTTPError) as context:
+            session.get(f'{self.url}/limited')
+        self.assertTrue(is_rate_limit_error(context.exception))
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
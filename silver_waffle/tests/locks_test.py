@@ -0,0 +1,81 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import threading
+import time
+from types import SimpleNamespace
+from silver_waffle.base.locks import InstrumentedLock, acquire_all, lock_stats
+from silver_waffle.base.exchange import Currency, Pair
+
+
+def make_currency(symbol, exchange):
+    return Currency(name=symbol, symbol=symbol, exchange_client=SimpleNamespace(name=exchange,
+                                                                                 deferred_initialization=True))
+
+
+class TestInstrumentedLock(unittest.TestCase):
+    def test_wait_and_hold_times(self):
+        lock = InstrumentedLock('test')
+        holding = threading.Event()
+
+        def hold():
+            with lock:
+                holding.set()
+                time.sleep(0.1)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait()
+        with lock:
+            with lock:  # reentrant
+                pass
+        thread.join()
+        self.assertEqual((lock.stats.acquisitions, lock.stats.contended), (2, 1))
+        self.assertGreater(lock.stats.max_wait, 0.05)
+        self.assertGreater(lock.stats.max_hold, 0.05)
+        self.assertFalse(lock.locked())
+        self.assertIs(lock_stats()['test'], lock.stats)
+
+    def test_acquire_all_does_not_deadlock(self):
+        locks = [InstrumentedLock(f'lock {i}') for i in range(3)]
+
+        def work(order):
+            for _ in range(200):
+                with acquire_all(*order):
+                    pass
+
+        threads = [threading.Thread(target=work, args=[order]) for order in [locks, locks[::-1], locks[1:] + locks]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(sum(lock.stats.acquisitions for lock in locks), 3 * 200 * 3)
+
+    def test_unrelated_pairs_trade_concurrently(self):
+        usdt = make_currency('USDT', 'binance')
+        btc_usdt = Pair(exchange_client=None, ticker='BTC/USDT', quote=usdt, base=make_currency('BTC', 'binance'),
+                        minimum_step=0.01)
+        eth_usdt = Pair(exchange_client=None, ticker='ETH/USDT', quote=usdt, base=make_currency('ETH', 'binance'),
+                        minimum_step=0.01)
+        btc_ars = Pair(exchange_client=None, ticker='BTC/ARS', quote=make_currency('ARS', 'bitso'),
+                       base=make_currency('BTC', 'bitso'), minimum_step=0.01)
+        with btc_usdt.trading_lock():
+            self.assertTrue(self.can_trade(btc_ars))
+            self.assertFalse(self.can_trade(eth_usdt))  # they share the USDT balance
+        self.assertTrue(self.can_trade(eth_usdt))
+
+    @staticmethod
+    def can_trade(pair, timeout=0.2):
+        """Returns True if another thread can take the trading lock of pair within timeout seconds"""
+        acquired = threading.Event()
+
+        def trade():
+            with pair.trading_lock():
+                acquired.set()
+
+        threading.Thread(target=trade, daemon=True).start()
+        return acquired.wait(timeout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import tempfile
+import time
+from silver_waffle.base.market_cache import MarketCache
+
+DEFINITIONS = [{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True}]
+
+
+class TestMarketCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = MarketCache(directory=self.directory.name, ttl=60)
+        self.downloads = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def loader(self):
+        self.downloads += 1
+        return DEFINITIONS
+
+    def test_warm_start_doesnt_download(self):
+        self.assertEqual(self.cache.get('binance', self.loader), DEFINITIONS)
+        self.assertEqual(MarketCache(directory=self.directory.name).get('binance', self.loader), DEFINITIONS)
+        self.assertEqual(self.downloads, 1)
+
+    def test_stale_definitions_are_refreshed_in_background(self):
+        self.cache.get('binance', self.loader)
+        self.cache.ttl = 0
+        time.sleep(0.01)
+        self.assertEqual(self.cache.get('binance', self.loader), DEFINITIONS)
+        for _ in range(100):
+            if self.downloads == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.downloads, 2)
+
+    def test_invalidate(self):
+        self.cache.get('Bitso', self.loader)
+        self.cache.invalidate('Bitso')
+        self.assertIsNone(self.cache.read('Bitso'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import urllib.request
+from types import SimpleNamespace
+from silver_waffle.base.metrics import MetricsRegistry, MetricsServer, metrics, request_latency, request_errors, \
+    book_updates, book_changes
+from silver_waffle.base.rate_limiter import rate_limited, PRIORITY_MARKET_DATA
+from silver_waffle.base.exchange import Orderbook, ee
+from silver_waffle.base.side import ASK, BID
+
+
+class FakeClient:
+    name = 'fake'
+    rate_limiter = None
+
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_book(self, pair):
+        return {ASK: [], BID: []}
+
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def create_order(self, pair, amount, side, limit_price=None):
+        raise ValueError('rejected')
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_render(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('requests_total', 'Requests', ['exchange'])
+        counter.labels('bitso').inc()
+        counter.labels('bitso').inc(2)
+        counter.labels('say "hi"').inc()
+        registry.gauge('queue_size', 'Queue').set(4)
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=[0.1, 1])
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(value)
+        registry.gauge('unused', 'Has no samples', ['label'])
+        text = registry.render()
+        self.assertIn('# TYPE requests_total counter\nrequests_total{exchange="bitso"} 3\n', text)
+        self.assertIn('requests_total{exchange="say \\"hi\\""} 1', text)
+        self.assertIn('queue_size 4', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1\nlatency_seconds_bucket{le="1"} 2\n'
+                      'latency_seconds_bucket{le="+Inf"} 3\nlatency_seconds_sum 5.55\nlatency_seconds_count 3', text)
+        self.assertNotIn('unused', text)
+
+    def test_registration(self):
+        registry = MetricsRegistry()
+        self.assertIs(registry.counter('a', 'A', ['x']), registry.counter('a', 'A', ['x']))
+        with self.assertRaises(ValueError):
+            registry.gauge('a', 'A', ['x'])
+        with self.assertRaises(ValueError):
+            registry.counter('a', 'A', ['x']).labels('1', '2')
+
+    def test_collectors_are_weakly_referenced_when_bound(self):
+        registry = MetricsRegistry()
+
+        class Source:
+            def collect(self, registry):
+                registry.gauge('collected', 'Collected').set(7)
+
+        source = Source()
+        registry.add_collector(source.collect)
+        self.assertIn('collected 7', registry.render())
+        del source
+        registry.collect()
+        self.assertEqual(registry._collectors, [])
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_requests(self):
+        client = FakeClient()
+        count = request_latency.labels('fake', 'get_book').count
+        client.get_book(None)
+        self.assertEqual(request_latency.labels('fake', 'get_book').count, count + 1)
+        with self.assertRaises(ValueError):
+            client.create_order(None, 1, ASK)
+        self.assertEqual(request_errors.labels('fake', 'create_order').value, 1)
+
+    def test_book_updates(self):
+        pair = SimpleNamespace(exchange_client=SimpleNamespace(name='metrics_test'), ticker='BTC/USD',
+                               base=SimpleNamespace(global_price=1), orders={ASK: [], BID: []})
+        orderbook = Orderbook(pair)
+        book = {ASK: [{'price': 101, 'amount': 1}], BID: [{'price': 99, 'amount': 1}]}
+        orderbook.update(book)
+        orderbook.update(book)
+        orderbook.apply_changes([(ASK, 102, 1)])
+        self.assertEqual(book_updates.labels('metrics_test', 'BTC/USD').value, 3)
+        self.assertEqual(book_changes.labels('metrics_test', 'BTC/USD').value, 2)
+
+    def test_runtime_metrics(self):
+        ee.emit('metrics_test_event')
+        ee.emit('metrics_test_event')
+        ee.flush(timeout=5)
+        text = metrics.render()
+        self.assertIn('silver_waffle_events_emitted_total{event="metrics_test_event"} 2', text)
+        self.assertIn('silver_waffle_threads{group="MainThread"} 1', text)
+        self.assertIn('silver_waffle_events_pending', text)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def test_serves_the_prometheus_text_format(self):
+        registry = MetricsRegistry()
+        registry.counter('served_total', 'Served').inc()
+        server = MetricsServer(registry, port=0).start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics', timeout=5) as response:
+                self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+                self.assertIn('served_total 1', response.read().decode())
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f'http://127.0.0.1:{server.port}/other', timeout=5)
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+from silver_waffle.base.exchange import ee
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.order_stream import OPEN, FILLED, CANCELLED
+from silver_waffle.base.simulated_exchange import SimulatedExchange
+
+MARKETS = [{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True}]
+
+
+class OrderStreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.exchange = SimulatedExchange(MARKETS, balances={'USDT': (10 ** 6, 0), 'BTC': (100, 0)}, read_only=False)
+        self.pair = self.exchange.get_pair_by_ticker('BTC/USDT')
+        self.tracker = self.exchange.order_tracker
+        self.events = []
+        ee.on('order_updated', self.on_order_updated)
+        ee.on('order_filled', self.on_order_filled)
+
+    def tearDown(self):
+        ee.off('order_updated', self.on_order_updated)
+        ee.off('order_filled', self.on_order_filled)
+
+    def on_order_updated(self, pair, order, status):
+        self.events.append(('updated', order.order_id, status))
+
+    def on_order_filled(self, pair, trade):
+        self.events.append(('filled', trade.order_id, trade.amount))
+
+    def prices(self, side):
+        return [order.price for order in self.pair.orders[side]]
+
+
+class TestOrderTracker(OrderStreamTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tracker.start(self.pair)
+
+    def test_order_updates(self):
+        for order_id, price in [('a', 100), ('b', 102), ('c', 101)]:
+            self.tracker.on_order_update(self.pair, order_id, ASK, price, 1, OPEN)
+        self.assertEqual(self.prices(ASK), [102, 101, 100])  # sorted like update_active_orders sorts them
+        self.tracker.on_order_update(self.pair, 'c', ASK, 101, 0.4, OPEN)
+        self.assertEqual([order.amount for order in self.pair.orders[ASK]], [1, 0.4, 1])
+        self.assertIsNone(self.tracker.on_order_update(self.pair, 'c', ASK, 101, 0.4, OPEN))
+        self.tracker.on_order_update(self.pair, 'b', ASK, 102, 0, CANCELLED)
+        self.assertIsNone(self.tracker.on_order_update(self.pair, 'z', ASK, 99, 1, OPEN, known_only=True))
+        self.assertEqual(self.prices(ASK), [101, 100])
+        ee.flush()
+        self.assertEqual(self.events[-1], ('updated', 'b', CANCELLED))
+        self.assertEqual(self.tracker.updates, 5)
+
+    def test_fills(self):
+        self.tracker.on_order_update(self.pair, 'a', BID, 99, 2, OPEN)
+        self.tracker.on_fill(self.pair, 'a', BID, 99, 0.5, trade_id=1)
+        self.assertEqual(self.pair.orders[BID][0].amount, 2)  # order updates carry the amount
+        self.tracker.amounts_from_fills = True
+        self.tracker.on_fill(self.pair, 'a', BID, 99, 0.5, trade_id=2)
+        self.assertIsNone(self.tracker.on_fill(self.pair, 'a', BID, 99, 0.5, trade_id=2))
+        self.assertEqual(self.pair.orders[BID][0].amount, 1.5)
+        self.tracker.on_fill(self.pair, 'a', BID, 99, 1.5, trade_id=3)
+        self.assertEqual(self.pair.orders[BID], [])
+        self.assertEqual(self.tracker.fills, 3)
+
+    def test_ccxt_format_and_full_lists(self):
+        self.tracker.on_ccxt_order(self.pair, {'id': '1', 'side': 'sell', 'price': 100, 'amount': 2, 'remaining': 1.5,
+                                               'status': 'open'})
+        self.tracker.on_ccxt_order(self.pair, {'id': '2', 'side': 'buy', 'price': 90, 'amount': 1, 'remaining': None,
+                                               'status': 'open'})
+        self.assertEqual((self.pair.orders[ASK][0].amount, self.pair.orders[BID][0].amount), (1.5, 1))
+        trade = self.tracker.on_ccxt_trade(self.pair, {'id': 't', 'order': '1', 'side': 'sell', 'price': 100,
+                                                       'amount': 0.5, 'fee': {'cost': 0.1}, 'timestamp': 1000})
+        self.assertEqual((trade.fee, trade.timestamp), (0.1, 1))
+        self.tracker.on_ccxt_order(self.pair, {'id': '1', 'side': 'sell', 'price': 100, 'status': 'closed'})
+        self.assertEqual(self.pair.orders[ASK], [])
+        new = self.pair.orders[BID][0].__class__(95, BID, 3, order_id='3', pair=self.pair)
+        self.tracker.replace(self.pair, [new])
+        self.assertEqual([order.order_id for order in self.pair.orders[BID]], ['3'])
+
+
+class TestSimulatedStream(OrderStreamTestCase):
+    def test_orders_are_kept_up_to_date_without_polling(self):
+        self.exchange._start_order_stream(self.pair)
+        self.assertTrue(self.tracker.is_streaming(self.pair))
+
+        def no_polling(pair):
+            raise AssertionError('get_active_orders was polled')
+
+        self.exchange.get_active_orders = no_polling
+        self.pair.update_active_orders()
+        order = self.pair.create_limit_order(amount=2, side=BID, limit_price=100)
+        self.assertEqual(len(self.pair.orders[BID]), 1)
+        self.exchange.submit(self.pair, ASK, 0.5, 100)
+        self.assertEqual(self.pair.orders[BID][0].amount, 1.5)
+        self.exchange.submit(self.pair, ASK, 1.5, 99)
+        self.assertEqual(self.pair.orders[BID], [])
+        ee.flush()
+        self.assertEqual([event for event in self.events if event[0] == 'filled'],
+                         [('filled', order.order_id, 0.5), ('filled', order.order_id, 1.5)])
+        self.assertEqual(self.events[-1], ('updated', order.order_id, FILLED))
+
+    def test_cancellations(self):
+        self.exchange._start_order_stream(self.pair)
+        order = self.pair.create_limit_order(amount=1, side=ASK, limit_price=150)
+        self.exchange.cancel_order(order)
+        self.assertEqual(self.pair.orders[ASK], [])
+        ee.flush()
+        self.assertEqual(self.events[-1], ('updated', order.order_id, CANCELLED))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+from types import SimpleNamespace
+from silver_waffle.base.exchange import Orderbook, OrderbookSide, Order, ee
+from silver_waffle.base.book_sync import BookSynchronizer
+from silver_waffle.base.side import ASK, BID
+
+
+def make_pair(global_price=1):
+    return SimpleNamespace(base=SimpleNamespace(global_price=global_price), orders={ASK: [], BID: []}, ticker='btc_usd')
+
+
+def make_book():
+    asks = [{'price': str(100 + i), 'amount': str(1 + i)} for i in range(10)]
+    bids = [{'price': str(99 - i), 'amount': str(1 + i)} for i in range(10)]
+    return {ASK: asks, BID: bids}
+
+
+class TestOrderbookSide(unittest.TestCase):
+    def setUp(self):
+        self.pair = make_pair()
+        self.orderbook = Orderbook(self.pair)
+        self.orderbook.update(make_book())
+
+    def test_indexing_and_iteration(self):
+        asks = self.orderbook[ASK]
+        self.assertEqual(len(asks), 10)
+        self.assertEqual(asks[0], Order(100, ASK, 1))
+        self.assertEqual(asks[-1].price, 109)
+        self.assertEqual([order.price for order in asks[2:4]], [102, 103])
+        self.assertEqual([order.price for order in asks], [100 + i for i in range(10)])
+        with self.assertRaises(IndexError):
+            asks[10]
+
+    def test_get_order_above(self):
+        self.assertEqual(self.orderbook[ASK].get_order_above(3).price, 102)
+        self.assertEqual(self.orderbook[BID].get_order_above(3).price, 97)
+        self.assertIsNone(self.orderbook[BID].get_order_above(1000))
+        self.pair.orders[ASK] = [Order(102, ASK, 1)]
+        self.assertEqual(self.orderbook[ASK].get_order_above(3).price, 103)
+
+    def test_get_orders_up_until(self):
+        self.assertEqual([order.price for order in self.orderbook[ASK].get_orders_up_until(102.5)], [100, 101, 102])
+        self.assertEqual([order.price for order in self.orderbook[BID].get_orders_up_until(97)], [99, 98])
+        self.assertEqual(self.orderbook[ASK].get_amount_up_until(102.5), 6)
+        self.assertEqual(self.orderbook[BID].get_amount_up_until(97), 3)
+        self.assertEqual(self.orderbook[ASK].get_amount_up_until(50), 0)
+
+    def test_depth_for_amount(self):
+        self.assertEqual(self.orderbook[ASK].get_depth_for_amount(1), 1)
+        self.assertEqual(self.orderbook[ASK].get_depth_for_amount(4), 3)
+        self.assertEqual(self.orderbook[ASK].get_depth_for_amount(10 ** 6), 10)
+
+    def test_spread_and_liquidity(self):
+        self.assertAlmostEqual(self.orderbook.get_spread(), 1 / 100)
+        self.pair.base.global_price = 100
+        liquidity = self.orderbook.get_liquidity(0.02)
+        self.assertEqual(liquidity[ASK], 1 + 2)
+        self.assertEqual(liquidity[BID], 1 + 2)
+
+    def test_check_if_book_changed(self):
+        side = OrderbookSide(ASK, self.pair)
+        self.assertTrue(side.check_if_book_changed(make_book()[ASK]))
+        side.set_orders(make_book()[ASK])
+        self.assertFalse(side.check_if_book_changed(make_book()[ASK]))
+        self.assertTrue(side.check_if_book_changed(make_book()[ASK][:5]))
+
+    def test_set_level(self):
+        asks, bids = self.orderbook[ASK], self.orderbook[BID]
+        self.assertTrue(asks.set_level(100.5, 3))
+        self.assertEqual([order.price for order in asks[:3]], [100, 100.5, 101])
+        self.assertTrue(asks.set_level(100, 0))
+        self.assertEqual(asks[0].price, 100.5)
+        self.assertFalse(asks.set_level(100.5, 3))
+        self.assertFalse(asks.set_level(50, 0))
+        self.assertTrue(bids.set_level(98.5, 2))
+        self.assertEqual([order.price for order in bids[:3]], [99, 98.5, 98])
+        self.assertTrue(bids.set_level(98, 7))
+        self.assertEqual(bids[2].amount, 7)
+        self.assertEqual(bids.get_amount_up_until(97.5), 1 + 2 + 7)
+
+    def test_snapshots_are_immutable(self):
+        asks = self.orderbook[ASK]
+        snapshot = asks.snapshot
+        version = snapshot.version
+        self.assertIsNotNone(snapshot.timestamp)
+        asks.set_level(100, 0)
+        self.assertEqual(snapshot[0].price, 100)
+        self.assertEqual(asks.snapshot.version, version + 1)
+        self.assertEqual(asks[0].price, 101)
+        with self.assertRaises(ValueError):
+            asks.snapshot.amounts[0] = 5
+
+    def test_iteration_is_not_affected_by_updates(self):
+        asks = self.orderbook[ASK]
+        prices = []
+        for order in asks:
+            prices.append(order.price)
+            asks.set_level(order.price + 0.5, 1)  # would be iterated over if the side was modified in place
+        self.assertEqual(prices, [100 + i for i in range(10)])
+        # Iterations don't share a cursor
+        self.assertEqual(sum(1 for _ in asks for _ in asks), 20 ** 2)
+
+    def test_book_snapshot_has_both_sides_of_the_same_update(self):
+        before = self.orderbook.snapshot
+        self.orderbook.apply_changes([(ASK, 100, 0), (BID, 99, 0)])
+        after = self.orderbook.snapshot
+        self.assertEqual((before['version'] + 1, after['version']), (after['version'], self.orderbook.version))
+        self.assertEqual((before[ASK][0].price, before[BID][0].price), (100, 99))
+        self.assertEqual((after[ASK][0].price, after[BID][0].price), (101, 98))
+
+
+class TestBookChange(unittest.TestCase):
+    def setUp(self):
+        self.pair = make_pair()
+        self.orderbook = Orderbook(self.pair)
+        self.changes = []
+        ee.on('book_changed', self.on_book_changed)
+
+    def tearDown(self):
+        ee.off('book_changed', self.on_book_changed)
+
+    def on_book_changed(self, pair, change):
+        self.changes.append(change)
+
+    def test_version_and_diff(self):
+        first = self.orderbook.update(make_book())
+        self.assertEqual(first.version, 1)
+        self.assertTrue(first.best_ask_moved and first.best_bid_moved)
+        self.assertIsNone(self.orderbook.update(make_book()))
+
+        book = make_book()
+        book[ASK][3]['amount'] = '50'
+        change = self.orderbook.update(book)
+        self.assertEqual(change.version, 2)
+        self.assertFalse(change.best_ask_moved or change.best_bid_moved or change.top_of_book_changed)
+        self.assertEqual(change.changed_levels, [(ASK, 103, 50)])
+
+        book[BID] = book[BID][1:]
+        change = self.orderbook.update(book)
+        self.assertTrue(change.best_bid_moved)
+        self.assertEqual(change.changed_levels, [(BID, 99, 0)])
+        ee.flush(timeout=5)
+        # Pending book_changed events of a pair are coalesced, so the listener may skip versions but ends on the last
+        versions = [change.version for change in self.changes]
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(versions[-1], 3)
+
+    def test_unchanged_book_keeps_its_fingerprint(self):
+        self.orderbook.update(make_book())
+        asks = self.orderbook[ASK]
+        prices, fingerprint = asks.prices, asks.fingerprint()
+        self.assertIsNone(self.orderbook.update(make_book()))
+        self.assertIs(asks.prices, prices)
+        self.assertEqual(asks.snapshot._fingerprints, {None: fingerprint})
+
+    def test_change_detection_depth(self):
+        self.orderbook.change_detection_depth = 3
+        self.orderbook.update(make_book())
+        book = make_book()
+        book[ASK][5]['amount'] = '50'
+        self.assertIsNone(self.orderbook.update(book))
+        self.assertEqual(self.orderbook[ASK][5].amount, 50)
+        book[ASK][0]['amount'] = '2'
+        change = self.orderbook.update(book)
+        self.assertTrue(change.top_of_book_changed)
+        self.assertEqual(change.changed_levels, [(ASK, 100, 2)])
+
+    def test_apply_changes(self):
+        self.orderbook.update(make_book())
+        change = self.orderbook.apply_changes([(ASK, 99.5, 1), (BID, 50, 0)])
+        self.assertTrue(change.best_ask_moved)
+        self.assertFalse(change.best_bid_moved)
+        self.assertEqual(change.changed_levels, [(ASK, 99.5, 1)])
+        self.assertIsNone(self.orderbook.apply_changes([(BID, 50, 0)]))
+
+
+class TestOrder(unittest.TestCase):
+    def test_total_is_computed_lazily(self):
+        order = Order(100.123456, ASK, 1.5)
+        self.assertIsNone(order._total)
+        self.assertEqual(order.total, 150.1851)
+        with self.assertRaises(AttributeError):
+            order.extra = 1  # slotted
+
+
+class TestBookSynchronizer(unittest.TestCase):
+    def setUp(self):
+        self.pair = make_pair()
+        self.pair.orderbook = Orderbook(self.pair)
+        self.snapshots = []
+        self.synchronizer = BookSynchronizer(self.pair, self.snapshots.pop)
+
+    def snapshot(self, sequence, orders):
+        book = {ASK: [], BID: [], 'sequence': sequence, 'orders': orders}
+        for order_id, side, price, amount in orders:
+            book[side].append({'price': price, 'amount': amount})
+        self.snapshots.append(book)
+
+    def test_order_diffs(self):
+        self.snapshot(10, [('a', ASK, 101, 1), ('b', BID, 99, 2)])
+        self.synchronizer.on_order_diff(11, [('c', ASK, 101, 3), ('d', BID, 98, 1)])
+        self.assertEqual(self.synchronizer.resyncs, 1)
+        self.assertEqual(self.pair.orderbook[ASK][0].amount, 4)
+        self.assertEqual(len(self.pair.orderbook[BID]), 2)
+        self.synchronizer.on_order_diff(12, [('a', ASK, 101, 0), ('b', BID, 99, 0)])
+        self.assertEqual(self.pair.orderbook[ASK][0].amount, 3)
+        self.assertEqual(self.pair.orderbook[BID][0].price, 98)
+        self.synchronizer.on_order_diff(12, [('c', ASK, 101, 0)])  # already applied
+        self.assertEqual(self.pair.orderbook[ASK][0].amount, 3)
+
+    def test_gap_triggers_resync(self):
+        self.snapshot(10, [('a', ASK, 101, 1)])
+        self.synchronizer.on_order_diff(11, [('b', ASK, 102, 1)])
+        self.snapshot(20, [('a', ASK, 101, 1), ('c', ASK, 103, 5)])
+        self.synchronizer.on_order_diff(21, [('a', ASK, 101, 0)])
+        self.assertEqual(self.synchronizer.resyncs, 2)
+        self.assertEqual(self.synchronizer.sequence, 21)
+        self.assertEqual([order.price for order in self.pair.orderbook[ASK]], [103])
+
+
+if __name__ == '__main__':
+    unittest.main()
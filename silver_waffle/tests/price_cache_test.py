@@ -0,0 +1,79 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import tempfile
+import time
+from silver_waffle.base.price_cache import PriceCache
+
+
+class TestPriceCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'prices.json')
+        self.cache = PriceCache(ttl=60, fiat_ttl=3600, max_stale=600, path=self.path)
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def loader(self, price):
+        def load():
+            self.calls.append(price)
+            return price
+        return load
+
+    def test_fresh_prices_are_cached(self):
+        self.assertEqual(self.cache.get('btc', self.loader(100)), 100)
+        self.assertEqual(self.cache.get('BTC', self.loader(200)), 100)
+        self.assertEqual(self.calls, [100])
+
+    def test_stale_prices_are_served_while_revalidating(self):
+        self.cache.set('BTC', 100, timestamp=time.time() - 120)
+        self.assertEqual(self.cache.get('BTC', self.loader(200)), 100)
+        for _ in range(100):
+            if self.cache.peek('BTC')[0] == 200:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get('BTC', self.loader(300)), 200)
+
+    def test_too_stale_prices_are_reloaded(self):
+        self.cache.set('BTC', 100, timestamp=time.time() - 6000)
+        self.assertEqual(self.cache.get('BTC', self.loader(200)), 200)
+
+    def test_fiat_ttl(self):
+        self.cache.set('ARS', 0.001, timestamp=time.time() - 120)
+        self.assertEqual(self.cache.get('ars', self.loader(0.002)), 0.001)
+        self.assertEqual(self.calls, [])
+
+    def test_persistence(self):
+        self.cache.set('ETH', 10)
+        self.cache.save()
+        cache = PriceCache(path=self.path)
+        self.assertEqual(cache.get('eth', self.loader(20)), 10)
+        self.assertEqual(self.calls, [])
+
+    def test_unchanged_cache_isnt_written(self):
+        self.cache.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.cache.set('ETH', 10)
+        self.cache.save()
+        modified = os.stat(self.path).st_mtime_ns
+        os.utime(self.path, ns=(0, 0))
+        self.cache.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+        self.assertNotEqual(modified, 0)
+
+    def test_persistence_is_off_by_default(self):
+        cache = PriceCache()
+        cache.set('ETH', 10)
+        cache.save()
+        self.assertIsNone(cache.path)
+        self.cache.set('BTC', 100)
+        self.cache.save()
+        cache.enable_persistence(self.path)
+        self.assertEqual((cache.peek('eth')[0], cache.peek('btc')[0]), (10, 100))
+        cache.enable_persistence(os.path.join(self.directory.name, 'other.json'))
+        self.assertEqual(cache.path, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
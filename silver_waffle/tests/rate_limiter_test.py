@@ -0,0 +1,76 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import threading
+import time
+import ccxt
+from silver_waffle.base.rate_limiter import RateLimiter, rate_limited, PRIORITY_ORDERS, PRIORITY_MARKET_DATA
+
+
+class FakeClient:
+    def __init__(self, limiter):
+        self.rate_limiter = limiter
+        self.calls = 0
+
+    @rate_limited(PRIORITY_MARKET_DATA)
+    def get_book(self):
+        self.calls += 1
+        return self.calls
+
+    @rate_limited(PRIORITY_ORDERS)
+    def create_order(self):
+        raise ccxt.RateLimitExceeded('429')
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_market_data_leaves_the_reserve_for_orders(self):
+        limiter = RateLimiter(rate=1, burst=4, reserve={PRIORITY_ORDERS: 0, PRIORITY_MARKET_DATA: 0.5})
+        self.assertEqual(limiter.try_acquire(PRIORITY_MARKET_DATA), 0)
+        self.assertEqual(limiter.try_acquire(PRIORITY_MARKET_DATA), 0)
+        self.assertGreater(limiter.try_acquire(PRIORITY_MARKET_DATA), 0)
+        self.assertEqual(limiter.try_acquire(PRIORITY_ORDERS), 0)
+        self.assertEqual(limiter.try_acquire(PRIORITY_ORDERS), 0)
+        self.assertEqual(limiter.requests[PRIORITY_MARKET_DATA], 2)
+
+    def test_acquire_waits_for_the_refill(self):
+        limiter = RateLimiter(rate=20, burst=1, reserve={PRIORITY_MARKET_DATA: 0})
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire(PRIORITY_MARKET_DATA)
+        self.assertGreater(time.monotonic() - start, 0.08)
+
+    def test_orders_go_before_waiting_market_data(self):
+        limiter = RateLimiter(rate=10, burst=1, reserve={PRIORITY_ORDERS: 0, PRIORITY_MARKET_DATA: 0})
+        limiter.acquire(PRIORITY_MARKET_DATA)
+        served = []
+
+        def request(priority):
+            limiter.acquire(priority)
+            served.append(priority)
+        threads = [threading.Thread(target=request, args=[PRIORITY_MARKET_DATA]) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.02)
+        order_thread = threading.Thread(target=request, args=[PRIORITY_ORDERS])
+        order_thread.start()
+        for thread in threads + [order_thread]:
+            thread.join()
+        self.assertLessEqual(served.index(PRIORITY_ORDERS), 1)
+
+    def test_decorator_backs_off_on_rate_limit_errors(self):
+        limiter = RateLimiter(rate=100, burst=10)
+        client = FakeClient(limiter)
+        self.assertEqual(client.get_book(), 1)
+        with self.assertRaises(ccxt.RateLimitExceeded):
+            client.create_order()
+        self.assertGreater(limiter.try_acquire(PRIORITY_ORDERS), 0)
+
+    def test_utilization_and_capacity(self):
+        limiter = RateLimiter(rate=2, burst=10, reserve={PRIORITY_MARKET_DATA: 0.25}, window=5)
+        for _ in range(5):
+            limiter.acquire(PRIORITY_MARKET_DATA)
+        self.assertAlmostEqual(limiter.utilization(), 0.5)
+        self.assertEqual(limiter.max_pollable_pairs(poll_interval=2), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import tempfile
+from types import SimpleNamespace
+import numpy as np
+from silver_waffle.base.exchange import Orderbook, Order
+from silver_waffle.base.recorder import Recorder, Recording, BOOK_RESET, BOOK_LEVEL, BALANCE, ORDER_CREATED
+from silver_waffle.base.side import ASK, BID
+
+
+def make_book(best_ask=100, amount=1):
+    return {ASK: [{'price': best_ask + i, 'amount': amount} for i in range(3)],
+            BID: [{'price': 99 - i, 'amount': amount} for i in range(3)]}
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recorder = Recorder(directory=self.directory.name, flush_interval=60)
+        self.pair = SimpleNamespace(ticker='BTC/USD', exchange_client='binance', base=SimpleNamespace(global_price=1),
+                                    orders={ASK: [], BID: []})
+
+    def tearDown(self):
+        self.recorder.stop()
+        self.directory.cleanup()
+
+    def read(self):
+        path = os.path.join(self.directory.name, 'binance')
+        day = sorted(name for name in os.listdir(path) if name.endswith('.bin'))[0]
+        return Recording(os.path.join(path, day))
+
+    def test_book_levels_are_delta_encoded(self):
+        orderbook = Orderbook(self.pair)
+        with self.recorder:
+            orderbook.update(make_book())
+            orderbook.update(make_book())  # nothing changed, nothing is recorded
+            orderbook.apply_changes([(ASK, 100, 5), (BID, 99, 0)])
+        recording = self.read()
+        records = recording.select('pair:BTC/USD')
+        self.assertEqual(records['kind'].tolist(), [BOOK_RESET] + [BOOK_LEVEL] * 8)
+        last = records[-2:]
+        self.assertEqual(last['price'].tolist(), [100, 99])
+        self.assertEqual(last['amount'].tolist(), [5, 0])
+        self.assertEqual(last['side'].tolist(), [1, -1])
+        self.assertEqual(last['ref'].tolist(), [2, 2])
+        self.assertTrue(np.all(np.diff(recording.records['timestamp']) >= 0))
+
+    def test_balances_and_orders(self):
+        currency = SimpleNamespace(symbol='BTC', exchange_client='binance')
+        with self.recorder:
+            self.recorder.record_balance(currency, 1.5, 0.5)
+            order = Order(100, ASK, 2, order_id='abc', pair=self.pair)
+            self.recorder.record_order(ORDER_CREATED, self.pair, order.side, order.price, order.amount, order.order_id)
+        recording = self.read()
+        balance = recording.select('currency:BTC', kind=BALANCE)
+        self.assertEqual((balance['price'][0], balance['amount'][0]), (1.5, 0.5))
+        order_record = recording.select('pair:BTC/USD', kind=ORDER_CREATED)[0]
+        self.assertEqual(recording.order_id(order_record), 'abc')
+        self.assertEqual(order_record['price'], 100)
+
+    def test_reading_is_zero_copy(self):
+        with self.recorder:
+            Orderbook(self.pair).update(make_book())
+        recording = self.read()
+        self.assertIsInstance(recording.records, np.memmap)
+        prices = recording.between(start=0)['price']
+        self.assertTrue(np.shares_memory(prices, recording.records))
+        self.assertEqual(len(recording.between(end=0)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
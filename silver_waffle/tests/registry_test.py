@@ -0,0 +1,39 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+from silver_waffle.base.registry import Registry
+
+
+class FakeCurrency:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+
+class FakePair:
+    def __init__(self, base, quote):
+        self.base = base
+        self.quote = quote
+        self.ticker = f'{base.symbol}/{quote.symbol}'
+
+
+class TestRegistry(unittest.TestCase):
+    def test_lookups_are_case_insensitive(self):
+        registry = Registry()
+        pair = FakePair(FakeCurrency('BTC'), FakeCurrency('USDT'))
+        registry.register_pair(pair)
+        self.assertIs(registry.get_pair('btc/usdt'), pair)
+        self.assertIs(registry.get_currency('Btc'), pair.base)
+        self.assertIsNone(registry.get_pair('eth/usdt'))
+        self.assertEqual(len(registry), 2)
+
+    def test_groups_keep_every_currency_with_the_same_symbol(self):
+        registry = Registry()
+        first, second = FakeCurrency('BTC'), FakeCurrency('btc')
+        self.assertTrue(registry.register_currency(first))
+        self.assertTrue(registry.register_currency(second))
+        self.assertFalse(registry.register_currency(first))
+        self.assertEqual(registry.group('BTC'), [first, second])
+        self.assertIs(registry.get_currency('btc'), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from silver_waffle.base.clock import VirtualClock, sleep, get_clock
+from silver_waffle.base.exchange import Orderbook, ee
+from silver_waffle.base.recorder import Recorder, Recording
+from silver_waffle.base.replay import ReplayExchangeClient
+from silver_waffle.base.side import ASK, BID
+
+
+def make_book(best_ask):
+    return {ASK: [{'price': best_ask, 'amount': 1}], BID: [{'price': best_ask - 1, 'amount': 1}]}
+
+
+class TestVirtualClock(unittest.TestCase):
+    def test_sleepers_wake_up_in_order_of_deadline(self):
+        clock = VirtualClock(start=0)
+        woken = []
+
+        def sleeper(name, seconds):
+            clock.sleep(seconds)
+            woken.append((name, clock.time()))
+            clock.sleep(1000)
+
+        for name, seconds in [('b', 20), ('a', 10)]:
+            threading.Thread(target=sleeper, args=[name, seconds], daemon=True).start()
+        while clock.sleepers < 2:
+            time.sleep(0.01)
+        clock.advance(15)
+        self.assertEqual(woken, [('a', 10)])
+        clock.advance(30)
+        self.assertEqual(woken, [('a', 10), ('b', 20)])
+        self.assertEqual(clock.time(), 30)
+
+
+class TestReplayExchangeClient(unittest.TestCase):
+    def test_replays_a_day_in_virtual_time(self):
+        events = [(1000 + i * 60, 'book', 'BTC/USD', make_book(100 + i)) for i in range(100)]
+        events.append((1000, 'balance', 'BTC', (2, 0)))
+        events.sort(key=lambda event: event[0])
+        client = ReplayExchangeClient(events)
+        self.addCleanup(client.close)
+        pair = client.get_pair_by_ticker('BTC/USD')
+        seen = []
+
+        def strategy():
+            # Polls the best ask every 5 minutes, like the strategies do
+            while True:
+                sleep(300)
+                seen.append((get_clock().time(), pair.orderbook[ASK][0].price))
+
+        threading.Thread(target=strategy, daemon=True).start()
+        while client.clock.sleepers < 1:
+            time.sleep(0.01)
+        start = time.time()
+        self.assertEqual(client.run(until=1000 + 99 * 60), 101)
+        self.assertLess(time.time() - start, 5)  # 99 minutes
+        self.assertEqual(seen[0], (1300, 104))  # woken before the book of 1300 is applied
+        self.assertEqual(len(seen), 19)
+        self.assertEqual(pair.base.balance['available_balance'].amount, 2)
+        self.assertIs(get_clock(), client.clock)
+        client.close()
+        self.assertIsNot(get_clock(), client.clock)
+
+    def test_replays_a_recording(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recorded_pair = SimpleNamespace(ticker='ETH/USD', exchange_client='binance')
+        orderbook = Orderbook(recorded_pair)
+        with Recorder(directory=directory.name, flush_interval=60):
+            orderbook.update(make_book(10))
+            orderbook.apply_changes([(ASK, 11, 3)])
+        day = os.listdir(os.path.join(directory.name, 'binance'))[0].split('.')[0]
+        with ReplayExchangeClient(Recording.open('binance', day, directory=directory.name)) as client:
+            pair = client.get_pair_by_ticker('ETH/USD')
+            client.run()
+        ee.flush()
+        self.assertEqual([(order.price, order.amount) for order in pair.orderbook[ASK]], [(10, 1), (11, 3)])
+        self.assertEqual(pair.orderbook[BID][0].price, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
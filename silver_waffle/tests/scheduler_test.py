@@ -0,0 +1,49 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+from types import SimpleNamespace
+from silver_waffle.base.scheduler import PollScheduler
+
+
+class FakePair:
+    def __init__(self, enabled):
+        self.enabled = enabled
+
+    def __bool__(self):
+        return self.enabled
+
+
+class TestPollScheduler(unittest.TestCase):
+    def test_busy_books_are_polled_faster(self):
+        scheduler = PollScheduler(initial_interval=1, min_interval=0.25, max_interval=10)
+        pair = FakePair(enabled=True)
+        for _ in range(10):
+            scheduler.observe(pair, True)
+        self.assertEqual(scheduler.cadence(pair), 0.25)
+        self.assertGreater(scheduler.change_rate(pair), 1)
+
+    def test_quiet_books_are_polled_slower(self):
+        scheduler = PollScheduler(initial_interval=1, min_interval=0.25, max_interval=10)
+        pair = FakePair(enabled=True)
+        for _ in range(10):
+            scheduler.observe(pair, False)
+        self.assertEqual(scheduler.cadence(pair), 10)
+
+    def test_idle_pairs_have_a_higher_floor(self):
+        scheduler = PollScheduler(initial_interval=1, min_interval=0.25, max_interval=10, idle_min_interval=5)
+        enabled, idle = FakePair(enabled=True), FakePair(enabled=False)
+        for _ in range(10):
+            scheduler.observe(enabled, True)
+            scheduler.observe(idle, True)
+        self.assertEqual(scheduler.cadences(), {enabled: 0.25, idle: 5})
+
+    def test_pairs_to_always_update_arent_idle(self):
+        pinned = FakePair(enabled=False)
+        scheduler = PollScheduler(SimpleNamespace(pairs_to_always_update={pinned}), initial_interval=1,
+                                  min_interval=0.25, max_interval=10, idle_min_interval=5)
+        for _ in range(10):
+            scheduler.observe(pinned, True)
+        self.assertEqual(scheduler.cadence(pinned), 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
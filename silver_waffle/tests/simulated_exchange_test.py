@@ -0,0 +1,94 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import time
+from silver_waffle.base.matching_engine import MatchingEngine
+from silver_waffle.base.simulated_exchange import SimulatedExchange
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.exceptions import not_enough_balance
+
+MARKETS = [{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True}]
+
+
+class TestMatchingEngine(unittest.TestCase):
+    def test_price_time_priority(self):
+        engine = MatchingEngine()
+        first, _, _ = engine.submit(ASK, 1, 101)
+        second, _, _ = engine.submit(ASK, 1, 100)
+        third, _, _ = engine.submit(ASK, 1, 100)
+        _, fills, remaining = engine.submit(BID, 2.5, 101)
+        self.assertEqual([(fill.maker_id, fill.price, fill.amount) for fill in fills],
+                         [(second, 100, 1), (third, 100, 1), (first, 101, 0.5)])
+        self.assertEqual(remaining, 0)
+        self.assertEqual(engine.book(), {ASK: [{'price': 101, 'amount': 0.5}], BID: []})
+
+    def test_limit_orders_rest_and_cancel(self):
+        engine = MatchingEngine()
+        engine.submit(ASK, 1, 100)
+        order_id, fills, remaining = engine.submit(BID, 3, 100)
+        self.assertEqual((len(fills), remaining), (1, 2))
+        self.assertEqual(engine.best_price(BID), 100)
+        self.assertEqual(engine.cancel(order_id).amount, 2)
+        self.assertIsNone(engine.cancel(order_id))
+        self.assertIsNone(engine.best_price(BID))
+        self.assertEqual(engine.submit(BID, 1)[2], 1)  # market orders never rest
+        self.assertEqual(len(engine), 0)
+
+    def test_many_orders(self):
+        engine = MatchingEngine()
+        start = time.time()
+        ids = [engine.submit(ASK, 1, 100 + i % 50)[0] for i in range(100000)]
+        for order_id in ids[::2]:
+            engine.cancel(order_id)
+        _, fills, _ = engine.submit(BID, 10000)
+        self.assertEqual(len(fills), 10000)
+        self.assertEqual(len(engine), 40000)
+        self.assertLess(time.time() - start, 10)
+
+
+class TestSimulatedExchange(unittest.TestCase):
+    def setUp(self):
+        self.exchange = SimulatedExchange(MARKETS, balances={'USDT': (1000, 0), 'BTC': (1, 0)}, maker_fee=0.001,
+                                          taker_fee=0.002)
+        self.pair = self.exchange.get_pair_by_ticker('BTC/USDT')
+        self.exchange.seed_book(self.pair, {ASK: [{'price': 100, 'amount': 2}, {'price': 101, 'amount': 2}],
+                                            BID: [{'price': 99, 'amount': 2}]})
+
+    def test_taker_fill_with_fees(self):
+        order = self.pair.create_limit_order(amount=3, side=BID, limit_price=101)
+        balances = self.exchange.get_balances()
+        self.assertAlmostEqual(balances['btc'][0], 1 + 3 * 0.998)
+        self.assertAlmostEqual(balances['usdt'][0], 1000 - 301)
+        self.assertEqual(self.exchange.get_active_orders(self.pair), {ASK: [], BID: []})
+        self.assertEqual(order.order_id, self.exchange.fills[-1].taker_id)
+        self.assertAlmostEqual(self.pair.base.balance['available_balance'].amount, 1 + 3 * 0.998)
+
+    def test_partial_fill_then_maker_fill(self):
+        order = self.exchange.create_order(self.pair, 3, BID, limit_price=100)
+        self.assertEqual(self.exchange.get_active_orders(self.pair)[BID][0].amount, 1)
+        self.assertAlmostEqual(self.exchange.get_balances()['usdt'][1], 100)
+        self.exchange.submit(self.pair, ASK, 1, 100)
+        self.assertEqual(self.exchange.get_active_orders(self.pair)[BID], [])
+        balances = self.exchange.get_balances()
+        self.assertAlmostEqual(balances['usdt'], (700, 0))
+        self.assertAlmostEqual(balances['btc'][0], 1 + 2 * 0.998 + 0.999)
+        self.assertIsNone(self.exchange.cancel_order(order))
+
+    def test_cancel_releases_the_funds(self):
+        order = self.exchange.create_order(self.pair, 0.5, ASK, limit_price=150)
+        self.assertEqual(self.exchange.get_balances()['btc'], (0.5, 0.5))
+        self.pair.cancel_order(order)
+        self.assertEqual(self.exchange.get_balances()['btc'], (1, 0))
+        self.assertEqual(self.exchange.get_book(self.pair)[ASK][-1]['price'], 101)
+
+    def test_not_enough_balance(self):
+        with self.assertRaises(not_enough_balance):
+            self.exchange.create_order(self.pair, 20, BID, limit_price=100)
+        self.exchange.partial_fills = False
+        with self.assertRaises(not_enough_balance):
+            self.exchange.create_order(self.pair, 5, ASK)  # only 2 BTC of bids
+        self.exchange.create_order(self.pair, 1, ASK)
+        self.assertAlmostEqual(self.exchange.get_balances()['usdt'][0], 1000 + 99 * 0.998)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os, sys; sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import unittest
+import time
+from silver_waffle.base.exchange import ee
+from silver_waffle.base.side import ASK, BID
+from silver_waffle.base.simulated_exchange import SimulatedExchange
+from silver_waffle.base.triggers import PriceTrigger, TriggerEngine
+from silver_waffle.strategies import AutoExecute
+
+MARKETS = [{'ticker': 'BTC/USDT', 'base': 'BTC', 'quote': 'USDT', 'minimum_step': 0.01, 'active': True}]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        ee.flush(timeout=0.1)
+        time.sleep(0.005)
+    return True
+
+
+class TestTriggerEngine(unittest.TestCase):
+    def setUp(self):
+        self.exchange = SimulatedExchange(MARKETS, balances={'USDT': (10000, 0), 'BTC': (10, 0)})
+        self.pair = self.exchange.get_pair_by_ticker('BTC/USDT')
+        self.engine = TriggerEngine()
+        self.fired = []
+
+    def seed(self, best_ask, best_bid):
+        self.exchange.seed_book(self.pair, {ASK: [{'price': best_ask, 'amount': 1}],
+                                            BID: [{'price': best_bid, 'amount': 1}]})
+        self.pair.orderbook.update(self.exchange.get_book(self.pair))
+
+    def record(self, trigger, order):
+        self.fired.append((trigger.price, order.price))
+
+    def test_only_crossed_triggers_fire(self):
+        self.seed(100, 99)
+        for price in range(50, 100):
+            self.engine.add(PriceTrigger(self.pair, ASK, '<', price, self.record))
+        for price in range(101, 150):
+            self.engine.add(PriceTrigger(self.pair, BID, '>', price, self.record))
+        self.assertEqual(self.fired, [])
+        self.seed(96.5, 95)
+        self.assertTrue(wait_for(lambda: len(self.fired) == 3))
+        self.assertEqual(sorted(self.fired), [(97, 96.5), (98, 96.5), (99, 96.5)])
+        self.assertEqual(len(self.engine.triggers(self.pair)), 99 - 3)
+        self.seed(103, 102.5)
+        self.assertTrue(wait_for(lambda: len(self.fired) == 5))
+        self.assertEqual(sorted(self.fired[3:]), [(101, 102.5), (102, 102.5)])
+
+    def test_added_trigger_fires_if_the_book_is_already_crossed(self):
+        self.seed(100, 99)
+        trigger = self.engine.add(PriceTrigger(self.pair, BID, '>', 98, self.record))
+        self.assertTrue(wait_for(lambda: trigger.fired == 1))
+        self.assertFalse(trigger.active)
+
+    def test_repeating_trigger_fires_while_the_book_stays_crossed(self):
+        self.seed(100, 99)
+        calls = []
+
+        def callback(trigger, order):
+            calls.append(order.price)
+            if len(calls) == 3:
+                self.seed(105, 99)
+
+        trigger = self.engine.add(PriceTrigger(self.pair, ASK, '<', 101, callback, once=False))
+        self.assertTrue(wait_for(lambda: len(calls) == 3 and not trigger._running))
+        self.assertEqual(calls, [100, 100, 100])
+        self.seed(100.5, 99)
+        self.assertTrue(wait_for(lambda: len(calls) >= 4))
+        trigger.cancel()
+        self.assertTrue(wait_for(lambda: not trigger._running))
+        self.assertEqual(self.engine.triggers(), [])
+
+    def test_cooling_down_triggers_dont_delay_the_others(self):
+        self.seed(100, 99)
+        repeating = [self.engine.add(PriceTrigger(self.pair, ASK, '<', 101, self.record, once=False, cooldown=3))
+                     for _ in range(self.engine.workers)]
+        self.assertTrue(wait_for(lambda: all(trigger.fired == 1 for trigger in repeating)))
+        # They wait for their cooldown out of the index, so book updates don't walk over them
+        self.assertEqual(len(self.engine._indexes[self.pair][(ASK, '<')]), 0)
+        self.assertEqual(len(self.engine.triggers(self.pair)), len(repeating))
+        start = time.monotonic()
+        trigger = self.engine.add(PriceTrigger(self.pair, BID, '>', 98, self.record))
+        self.assertTrue(wait_for(lambda: trigger.fired == 1))
+        self.assertLess(time.monotonic() - start, 1)
+        for trigger in repeating:
+            trigger.cancel()
+        self.assertEqual(self.engine.triggers(), [])
+
+    def test_cooled_down_trigger_goes_back_to_the_index(self):
+        self.seed(100, 99)
+        trigger = self.engine.add(PriceTrigger(self.pair, ASK, '<', 101, self.record, once=False, cooldown=0.2))
+        self.assertTrue(wait_for(lambda: trigger.fired == 1))
+        self.seed(105, 99)
+        self.assertTrue(wait_for(lambda: not trigger._running))
+        self.assertEqual(self.engine._indexes[self.pair][(ASK, '<')].triggers, [trigger])
+        self.assertEqual(trigger.fired, 1)
+        self.seed(100, 99)
+        self.assertTrue(wait_for(lambda: trigger.fired == 2))
+        trigger.cancel()
+
+    def test_auto_execute(self):
+        self.seed(100, 99)
+        strategy = AutoExecute(pair=self.pair, price=101, side=ASK, engine=self.engine)
+        self.assertTrue(wait_for(lambda: self.exchange.fills))
+        strategy.stop()
+        self.assertEqual(self.exchange.fills[0].price, 100)
+        self.assertEqual(self.exchange.fills[0].side, BID)
+
+
+if __name__ == '__main__':
+    unittest.main()
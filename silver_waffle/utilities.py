@@ -1,7 +1,8 @@
 import operator
 import exceptions
-import base
 import ctypes
+import json
+import threading
 import sys, os
 from trading_bot.base.constants import FIAT_SYMBOLS
 
@@ -47,7 +48,7 @@ def market_order(pair, amount, side):
     else:
         amount = float(amount)
     try:
-        with base.thread_lock:
+        with pair.trading_lock():
             pair.cancel_orders(side)
             pair.create_market_order(amount=amount, side=side)
     except exceptions.not_enough_balance:
@@ -76,6 +77,14 @@ def terminate_thread(thread):
 def _is_symbol_a_cryptocurrency(symbol: str):
     return False if symbol in FIAT_SYMBOLS else True
 
+def write_json_atomically(path, data):
+    """Dumps data to path through a temporary file, so that readers never see a half written file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(data, file)
+    os.replace(temporary_path, path)
+
 # Disable
 def block_print():
     sys.stdout = open(os.devnull, 'w')